@@ -0,0 +1,266 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from get_llm import get_llm_response
+from main import run_agent
+from response_cache import ResponseCache
+from tools.qa_verify import verify_file
+from trace_log import format_summary, summarize_trace
+
+
+def load_manifest(manifest_path):
+    """
+    读取任务清单（JSONL），每行一个会话
+
+    每行字段：csv_file（必填）、user_input、output、max_rounds、provider、session_id、plan_mode
+
+    Args:
+        manifest_path: 清单文件路径
+
+    Returns:
+        list: 会话配置列表
+    """
+    sessions = []
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"清单第 {line_no} 行不是合法的JSON: {e}")
+            if not isinstance(item, dict) or not item.get("csv_file"):
+                raise ValueError(f"清单第 {line_no} 行缺少 csv_file 字段")
+            sessions.append(item)
+    return sessions
+
+
+class ProviderLimiter:
+    """按 provider 限制同时在途的LLM请求数"""
+
+    def __init__(self, max_concurrency):
+        self.max_concurrency = max_concurrency
+        self._lock = threading.Lock()
+        self._semaphores = {}
+
+    def _semaphore(self, provider):
+        with self._lock:
+            if provider not in self._semaphores:
+                self._semaphores[provider] = threading.Semaphore(self.max_concurrency)
+            return self._semaphores[provider]
+
+    def wrap(self, llm_call):
+        """包装LLM调用函数，调用期间占用该 provider 的一个名额"""
+        def limited_call(messages, provider=None, *args, **kwargs):
+            with self._semaphore(provider):
+                return llm_call(messages, provider, *args, **kwargs)
+        return limited_call
+
+
+def _write_trace(trace_dir, session_id, record):
+    path = os.path.join(trace_dir, f"{session_id}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(record, f, ensure_ascii=False, indent=2, default=str)
+    return path
+
+
+def run_session(session, defaults, llm_call, trace_dir, resume=False):
+    """
+    运行单个会话并写出会话轨迹
+
+    Args:
+        session: 清单中的会话配置
+        defaults: 命令行给出的默认参数
+        llm_call: 带并发限制的LLM调用函数
+        trace_dir: 轨迹输出目录
+        resume: 从该会话的检查点继续
+
+    Returns:
+        tuple: (会话摘要, 会话轨迹)
+    """
+    session_id = session["session_id"]
+    config = {
+        "csv_file": session["csv_file"],
+        "user_input": session.get("user_input") or defaults["user_input"],
+        "max_rounds": int(session.get("max_rounds") or defaults["max_rounds"]),
+        "provider": session.get("provider") or defaults["provider"],
+        "output_file": session.get("output") or defaults["output"],
+        "plan_mode": bool(session.get("plan_mode", defaults.get("plan_mode", False)))
+    }
+    started_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    start = time.perf_counter()
+    work_trace = []
+    error = None
+
+    try:
+        if not os.path.exists(config["csv_file"]):
+            raise FileNotFoundError(f"CSV文件 '{config['csv_file']}' 不存在")
+        work_trace = run_agent(
+            user_input=config["user_input"],
+            csv_file=config["csv_file"],
+            max_rounds=config["max_rounds"],
+            provider=config["provider"],
+            api_key=defaults["api_key"],
+            output_file=config["output_file"],
+            llm_call=llm_call,
+            checkpoint_path=os.path.join(trace_dir, f"{session_id}.ckpt.jsonl"),
+            resume=resume,
+            trace_log_path=os.path.join(trace_dir, f"{session_id}.trace.jsonl"),
+            session_id=session_id,
+            plan_mode=config["plan_mode"]
+        )
+    except Exception as e:
+        error = str(e)
+
+    elapsed = time.perf_counter() - start
+    finished = any(
+        isinstance(call.get("result"), dict) and call["result"].get("task_finished")
+        for t in work_trace
+        for call in t.get("calls", [])
+    )
+    summary = {
+        "session_id": session_id,
+        "csv_file": config["csv_file"],
+        "output_file": config["output_file"],
+        "provider": config["provider"],
+        "status": "error" if error else ("completed" if finished else "incomplete"),
+        "rounds": len(work_trace),
+        "tool_calls": sum(len(t.get("calls", [])) for t in work_trace),
+        "elapsed_seconds": round(elapsed, 3),
+        "error": error,
+        "metrics": summarize_trace(work_trace)
+    }
+    summary["trace_file"] = _write_trace(trace_dir, session_id, {
+        **summary,
+        "config": config,
+        "started_at": started_at,
+        "work_trace": work_trace
+    })
+    return summary, work_trace
+
+
+def run_batch(sessions, defaults, workers=4, provider_concurrency=4, trace_dir="traces", response_cache=None,
+              resume=False):
+    """
+    用线程池并发运行多个会话；同一进程内的会话共享表格缓存
+
+    Args:
+        sessions: 会话配置列表
+        defaults: 默认参数（user_input, max_rounds, provider, api_key, output）
+        workers: 并发会话数
+        provider_concurrency: 每个 provider 同时在途的LLM请求上限
+        trace_dir: 轨迹输出目录
+        response_cache: 本地响应缓存目录（可选），重跑时已完成的轮次直接命中
+        resume: 各会话从 trace_dir 下的检查点继续，已完成的会话直接跳过
+
+    Returns:
+        tuple: (各会话摘要列表（按清单顺序）, 全部会话的汇总性能统计)
+    """
+    os.makedirs(trace_dir, exist_ok=True)
+    llm_call = ProviderLimiter(provider_concurrency).wrap(get_llm_response)
+    if response_cache:
+        # 缓存在限流之外，命中时不占用并发名额
+        llm_call = ResponseCache(response_cache).wrap(llm_call)
+    summaries = [None] * len(sessions)
+    all_rounds = []
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for i, session in enumerate(sessions):
+            # 会话ID需要在重跑之间保持稳定，才能找到对应的检查点
+            session = {**session, "session_id": session.get("session_id") or f"session_{i:04d}"}
+            futures[executor.submit(run_session, session, defaults, llm_call, trace_dir, resume)] = i
+        for future in as_completed(futures):
+            i = futures[future]
+            summaries[i], work_trace = future.result()
+            all_rounds.extend(work_trace)
+            print(f"[{summaries[i]['status']}] {summaries[i]['session_id']} "
+                  f"{summaries[i]['csv_file']} ({summaries[i]['elapsed_seconds']}s)")
+
+    return summaries, summarize_trace(all_rounds)
+
+
+def main():
+    """批量生成入口"""
+    parser = argparse.ArgumentParser(description='CSV处理Agent批量运行')
+    parser.add_argument('manifest', help='任务清单（JSONL），每行包含 csv_file 等字段')
+    parser.add_argument('--workers', type=int, default=4, help='并发会话数 (默认: 4)')
+    parser.add_argument('--provider-concurrency', type=int, default=4,
+                        help='每个模型同时在途的请求上限 (默认: 4)')
+    parser.add_argument('--user-input', default='开始工作', help='清单未指定时使用的用户需求')
+    parser.add_argument('--output', help='清单未指定时使用的输出CSV文件路径')
+    parser.add_argument('--max-rounds', type=int, default=10, help='清单未指定时的最大工作轮次 (默认: 10)')
+    parser.add_argument('--provider', help='清单未指定时使用的LLM模型名称')
+    parser.add_argument('--api-key', help='API密钥（也可通过环境变量设置）')
+    parser.add_argument('--trace-dir', default='traces', help='会话轨迹输出目录 (默认: traces)')
+    parser.add_argument('--response-cache', help='本地LLM响应缓存目录，重跑时复用已完成轮次的响应')
+    parser.add_argument('--resume', action='store_true', help='从 --trace-dir 中各会话的检查点继续')
+    parser.add_argument('--plan-mode', action='store_true', help='清单未指定时使用计划模式（一次提交全部问题的计划）')
+
+    args = parser.parse_args()
+
+    try:
+        sessions = load_manifest(args.manifest)
+    except (OSError, ValueError) as e:
+        print(f"错误: {e}")
+        sys.exit(1)
+
+    if any(not (s.get("provider") or args.provider) for s in sessions):
+        print("错误: 清单中存在未指定模型的会话，请使用 --provider 参数")
+        sys.exit(1)
+
+    defaults = {
+        "user_input": args.user_input,
+        "max_rounds": args.max_rounds,
+        "provider": args.provider,
+        "api_key": args.api_key,
+        "output": args.output,
+        "plan_mode": args.plan_mode
+    }
+
+    start = time.perf_counter()
+    summaries, batch_metrics = run_batch(sessions, defaults, args.workers, args.provider_concurrency, args.trace_dir,
+                          args.response_cache, args.resume)
+    elapsed = time.perf_counter() - start
+
+    # 按记录的筛选条件批量校验各输出文件中的答案（不需要额外的LLM轮次）
+    verification = {}
+    for output_file in sorted({s["output_file"] for s in summaries if s.get("output_file")}):
+        if os.path.exists(output_file):
+            file_report = verify_file(output_file)
+            file_report.pop("results")
+            verification[output_file] = file_report
+
+    report = {
+        "sessions": len(summaries),
+        "completed": sum(1 for s in summaries if s["status"] == "completed"),
+        "incomplete": sum(1 for s in summaries if s["status"] == "incomplete"),
+        "errors": sum(1 for s in summaries if s["status"] == "error"),
+        "elapsed_seconds": round(elapsed, 3),
+        "metrics": batch_metrics,
+        "verification": verification,
+        "results": summaries
+    }
+    report_path = os.path.join(args.trace_dir, "batch_summary.json")
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(f"\n批量运行完成：{report['completed']}/{report['sessions']} 个会话完成，"
+          f"{report['errors']} 个出错，耗时 {report['elapsed_seconds']}s")
+    print(format_summary(batch_metrics))
+    for output_file, file_report in verification.items():
+        print(f"答案校验 {output_file}：校验{file_report['verified']}/{file_report['total']}条，"
+              f"完全一致{file_report['exact']}条，平均精确率 {file_report['mean_precision']}，"
+              f"平均召回率 {file_report['mean_recall']}")
+    print(f"汇总报告: {report_path}")
+
+
+if __name__ == "__main__":
+    main()
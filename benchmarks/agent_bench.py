@@ -0,0 +1,223 @@
+"""
+端到端基准：用脚本化提供方驱动完整的 run_agent 循环（不访问网络），
+在不同规模的合成表格上统计每秒轮次、各工具耗时分位数和峰值内存
+
+用法:
+    python -m benchmarks.agent_bench --rows 10000 1000000 10000000 --output bench_agent.json
+    python -m benchmarks.agent_bench --rows 10000 --plan-mode   # 计划模式：一次提交5个问题的计划
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from .synthetic import synthetic_csv
+
+DEFAULT_ROWS = [10000, 1000000, 10000000]
+DEFAULT_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+
+def _call(name, **arguments):
+    return {"type": "function", "function": {"name": name, "arguments": arguments}}
+
+
+def build_script(csv_file, output_file):
+    """
+    一次典型的出题会话：查看表结构、多种筛选（含翻页和并行调用）、计算、写入、结束
+
+    Args:
+        csv_file: 合成表格路径
+        output_file: 问答写入的文件
+
+    Returns:
+        list: ScriptedProvider 使用的逐轮响应
+    """
+    usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    return [
+        {"content": "查看表结构", "tool_calls": [_call("read_csv_info", file_path=csv_file)], "usage": usage},
+        {"content": "按类别筛选并统计", "usage": usage, "tool_calls": [
+            _call("filter_csv_data", file_path=csv_file,
+                  conditions=[{"column": "类别", "operator": "=", "value": "物理"},
+                              {"column": "年份", "operator": "between", "value": [1950, 1960]}]),
+            _call("calculate_csv_data", file_path=csv_file, column="金额", operation="avg",
+                  filter_column="类别", filter_value="物理")
+        ]},
+        {"content": "翻页", "usage": usage, "tool_calls": [
+            _call("filter_csv_data", file_path=csv_file,
+                  conditions=[{"column": "类别", "operator": "=", "value": "物理"},
+                              {"column": "年份", "operator": "between", "value": [1950, 1960]}],
+                  offset=100)
+        ]},
+        {"content": "组合条件", "usage": usage, "tool_calls": [
+            _call("filter_csv_data", file_path=csv_file, columns=["姓名", "城市", "金额"],
+                  conditions=[{"any": [{"column": "国家", "operator": "=", "value": "瑞士"},
+                                       {"column": "国家", "operator": "=", "value": "瑞典"}]},
+                              {"column": "金额", "operator": ">=", "value": 9990}]),
+            _call("filter_csv_data", file_path=csv_file, count_only=True,
+                  conditions=[{"column": "城市", "operator": "in", "value": ["城市1", "城市2", "城市3"]}])
+        ]},
+        {"content": "模糊匹配", "usage": usage, "tool_calls": [
+            _call("filter_csv_data", file_path=csv_file, column="姓名", operator="contains", value="name_99999")
+        ]},
+        {"content": "写入", "usage": usage, "tool_calls": [
+            _call("write_to_csv", file_path=output_file, query="1950至1960年间物理类别有哪些？",
+                  answer="| 姓名 | 年份 |\n| --- | --- |\n| name_1 | 1955 |")
+        ]},
+        {"content": "完成", "usage": usage, "tool_calls": [_call("task_done", message="基准会话完成")]}
+    ]
+
+
+def build_plan_script(csv_file, output_file):
+    """
+    计划模式的出题会话：查看表结构和画像，一次提交5个问题的计划，结束
+
+    Args:
+        csv_file: 合成表格路径
+        output_file: 问答写入的文件
+
+    Returns:
+        list: ScriptedProvider 使用的逐轮响应
+    """
+    usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    plans = [
+        {"query": "1950至1960年间物理类别金额最高的20条记录？",
+         "conditions": [{"column": "类别", "operator": "=", "value": "物理"},
+                        {"column": "年份", "operator": "between", "value": [1950, 1960]}],
+         "columns": ["姓名", "年份", "金额"], "sort_by": ["金额"], "ascending": False, "limit": 20},
+        {"query": "瑞士或瑞典金额不低于9900的记录？",
+         "conditions": [{"any": [{"column": "国家", "operator": "=", "value": "瑞士"},
+                                 {"column": "国家", "operator": "=", "value": "瑞典"}]},
+                        {"column": "金额", "operator": ">=", "value": 9900}],
+         "columns": ["姓名", "国家", "城市", "金额"], "rename": {"姓名": "名字"}, "limit": 20},
+        {"query": "城市1至城市3中化学类别最早的20条记录？",
+         "conditions": [{"column": "城市", "operator": "in", "value": ["城市1", "城市2", "城市3"]},
+                        {"column": "类别", "operator": "=", "value": "化学"}],
+         "columns": ["姓名", "年份"], "sort_by": ["年份"], "limit": 20},
+        {"query": "法国医药类别金额最低的20条记录？",
+         "conditions": [{"column": "国家", "operator": "=", "value": "法国"},
+                        {"column": "类别", "operator": "=", "value": "医药"}],
+         "columns": ["姓名", "国家", "类别", "金额"], "value_map": {"国家": {"法国": "France"}},
+         "sort_by": ["金额"], "limit": 20},
+        {"query": "姓名包含name_99的前20条记录？",
+         "conditions": [{"column": "姓名", "operator": "contains", "value": "name_99"}],
+         "columns": ["姓名", "城市"], "limit": 20}
+    ]
+    return [
+        {"content": "查看表结构和画像", "usage": usage, "tool_calls": [
+            _call("read_csv_info", file_path=csv_file),
+            _call("profile_csv_table", file_path=csv_file, columns=["类别", "国家", "年份"])
+        ]},
+        {"content": "提交计划", "usage": usage, "tool_calls": [
+            _call("execute_qa_plan", file_path=csv_file, output_file=output_file, plans=plans)
+        ]},
+        {"content": "完成", "usage": usage, "tool_calls": [_call("task_done", message="基准会话完成")]}
+    ]
+
+
+def peak_rss_mb():
+    """当前进程的峰值常驻内存（MB），不支持的平台返回 None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为KB，macOS 为字节
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def bench_size(rows, sessions, data_dir, plan_mode=False):
+    """
+    在一张合成表格上运行若干个脚本化会话（在独立子进程中调用，峰值内存互不干扰）
+
+    Returns:
+        dict: 该规模的基准结果
+    """
+    from main import run_agent
+    from trace_log import summarize_trace
+
+    csv_file = synthetic_csv(data_dir, rows)
+    session_seconds = []
+    all_rounds = []
+    with tempfile.TemporaryDirectory(prefix="agent_bench_") as work_dir, \
+            open(os.devnull, 'w', encoding='utf-8') as devnull, contextlib.redirect_stdout(devnull):
+        for n in range(sessions):
+            # 每个会话写入各自的问答文件，相同的问答不会被去重索引拒绝
+            script_path = os.path.join(work_dir, f"script_{n}.json")
+            output_file = os.path.join(work_dir, f"qa_{n}.csv")
+            with open(script_path, 'w', encoding='utf-8') as f:
+                script = build_plan_script if plan_mode else build_script
+                json.dump(script(csv_file, output_file), f, ensure_ascii=False)
+            start = time.perf_counter()
+            work_trace = run_agent("基准测试", csv_file, max_rounds=20, provider=f"scripted:{script_path}",
+                                   output_file=output_file, plan_mode=plan_mode)
+            session_seconds.append(time.perf_counter() - start)
+            all_rounds.extend(work_trace)
+
+    summary = summarize_trace(all_rounds)
+    total_seconds = sum(session_seconds)
+    return {
+        "rows": rows,
+        "csv_bytes": os.path.getsize(csv_file),
+        "sessions": sessions,
+        "rounds": summary["rounds"],
+        "tool_calls": summary["tool_calls"],
+        "first_session_seconds": round(session_seconds[0], 4),
+        "warm_session_seconds": round(min(session_seconds[1:]), 4) if sessions > 1 else None,
+        "rounds_per_second": round(summary["rounds"] / total_seconds, 2) if total_seconds else None,
+        "tool_seconds": summary["tool_seconds"],
+        "tools": summary["tools"],
+        "payload_bytes": summary["payload_bytes"],
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+
+def run_benchmarks(rows_list, sessions=3, data_dir=DEFAULT_DATA_DIR, plan_mode=False):
+    """
+    依次在每个规模上运行基准，每个规模一个新的子进程
+
+    Returns:
+        dict: 全部规模的结果
+    """
+    results = []
+    ctx = multiprocessing.get_context("spawn")
+    for rows in rows_list:
+        with ctx.Pool(1) as pool:
+            results.append(pool.apply(bench_size, (rows, sessions, data_dir, plan_mode)))
+    return {
+        "benchmark": "agent_loop_plan" if plan_mode else "agent_loop",
+        "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": sys.version.split()[0],
+        "results": results
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='端到端基准：脚本化提供方驱动完整的agent循环')
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS, help='合成表格的行数（可多个）')
+    parser.add_argument('--sessions', type=int, default=3, help='每个规模运行的会话数（第一个为冷启动）')
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR, help='合成表格目录（已生成的表格会复用）')
+    parser.add_argument('--output', help='结果JSON写入路径')
+    parser.add_argument('--plan-mode', action='store_true', help='使用计划模式的脚本')
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.rows, args.sessions, args.data_dir, args.plan_mode)
+    for result in report["results"]:
+        print(f"{result['rows']:>10} 行: {result['rounds']} 轮，{result['rounds_per_second']} 轮/秒，"
+              f"首个会话 {result['first_session_seconds']}s，热会话 {result['warm_session_seconds']}s，"
+              f"工具耗时 p50 {result['tool_seconds']['p50']}s / p95 {result['tool_seconds']['p95']}s，"
+              f"峰值内存 {result['peak_rss_mb']} MB")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
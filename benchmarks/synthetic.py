@@ -0,0 +1,110 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# 分块生成，避免一次性在内存中构造千万行
+CHUNK_ROWS = 500000
+
+CATEGORIES = ["物理", "化学", "医药", "文学", "和平", "经济", "数学", "天文", "地理", "历史"]
+COUNTRIES = ["中国", "美国", "德国", "法国", "英国", "日本", "瑞士", "瑞典", "意大利", "荷兰",
+             "俄罗斯", "奥地利", "丹麦", "挪威", "加拿大", "澳大利亚", "西班牙", "比利时", "波兰", "印度"]
+
+
+def _chunk(rng, start, rows):
+    ids = np.arange(start, start + rows)
+    years = rng.integers(1900, 2021, rows)
+    days = rng.integers(0, 365, rows)
+    return pd.DataFrame({
+        "编号": ids,
+        "类别": np.array(CATEGORIES)[rng.integers(0, len(CATEGORIES), rows)],
+        "国家": np.array(COUNTRIES)[rng.integers(0, len(COUNTRIES), rows)],
+        "城市": np.char.add("城市", rng.integers(0, 2000, rows).astype(str)),
+        "姓名": np.char.add("name_", ids.astype(str)),
+        "金额": np.round(rng.random(rows) * 10000, 2),
+        "年份": years,
+        "日期": (pd.to_datetime(years.astype(str), format="%Y") + pd.to_timedelta(days, unit="D")).strftime("%Y-%m-%d")
+    })
+
+
+def synthetic_csv(data_dir, rows, seed=0):
+    """
+    生成（或复用已生成的）合成表格：低基数类别、中基数城市、唯一姓名、数值和日期列
+
+    Args:
+        data_dir: 数据目录
+        rows: 行数
+        seed: 随机种子
+
+    Returns:
+        str: CSV文件路径
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f"synthetic_{rows}_{seed}.csv")
+    if os.path.exists(path):
+        return path
+
+    rng = np.random.default_rng(seed)
+    tmp_path = path + ".tmp"
+    for start in range(0, rows, CHUNK_ROWS):
+        chunk = _chunk(rng, start, min(CHUNK_ROWS, rows - start))
+        chunk.to_csv(tmp_path, mode='w' if start == 0 else 'a', header=start == 0, index=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+WORDS = np.array([
+    "数据", "分析", "表格", "搜索", "诺贝尔", "物理", "化学", "实验", "理论", "研究", "大学", "学院", "获奖",
+    "贡献", "发现", "方法", "系统", "模型", "结构", "过程", "the", "quick", "brown", "fox", "jumps", "over",
+    "lazy", "dog", "alpha", "beta", "gamma", "delta", "search", "table", "value", "index", "query", "result"
+])
+TAGS = ["Gold", "Silver", "Bronze", "无"]
+
+
+def _mixed_chunk(rng, start, rows, text_words):
+    ids = np.arange(start, start + rows)
+    text = WORDS[rng.integers(0, len(WORDS), rows)]
+    for _ in range(text_words - 1):
+        text = np.char.add(np.char.add(text, " "), WORDS[rng.integers(0, len(WORDS), rows)])
+    price = np.round(rng.random(rows) * 1000, 2)
+    price[rng.random(rows) < 0.05] = np.nan
+    dates = pd.Timestamp("2000-01-01") + pd.to_timedelta(rng.integers(0, 9000, rows), unit="D")
+    times = pd.Timestamp("2020-01-01") + pd.to_timedelta(rng.integers(0, 86400 * 365, rows), unit="s")
+    return pd.DataFrame({
+        "编号": ids,
+        "描述": text,
+        "用户名": np.char.add("user_", np.char.mod("%016x", rng.integers(0, 2 ** 62, rows))),
+        "标签": np.array(TAGS)[rng.integers(0, len(TAGS), rows)],
+        "数量": rng.integers(0, 100000, rows),
+        "价格": price,
+        "日期": dates.strftime("%Y-%m-%d"),
+        "时间": times.strftime("%Y-%m-%d %H:%M:%S")
+    })
+
+
+def mixed_csv(data_dir, rows, seed=0, text_words=30):
+    """
+    生成（或复用已生成的）混合类型表格：宽文本列、高基数字符串、低基数标签、
+    整数、带缺失值的浮点数、日期和时间列
+
+    Args:
+        data_dir: 数据目录
+        rows: 行数
+        seed: 随机种子
+        text_words: 宽文本列每行的词数
+
+    Returns:
+        str: CSV文件路径
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f"mixed_{rows}_{seed}_{text_words}.csv")
+    if os.path.exists(path):
+        return path
+
+    rng = np.random.default_rng(seed)
+    tmp_path = path + ".tmp"
+    for start in range(0, rows, CHUNK_ROWS):
+        chunk = _mixed_chunk(rng, start, min(CHUNK_ROWS, rows - start), text_words)
+        chunk.to_csv(tmp_path, mode='w' if start == 0 else 'a', header=start == 0, index=False)
+    os.replace(tmp_path, path)
+    return path
@@ -0,0 +1,258 @@
+"""
+工具微基准：在不同规模的混合类型表格上测量 read_csv_info、filter_csv_data（每种操作符）、
+calculate_csv_data、render_answer 和 write_to_csv 的耗时与内存，输出可对比的JSON基线
+
+用法:
+    python -m benchmarks.tool_bench --rows 10000 100000 1000000 --output baseline.json
+    python -m benchmarks.tool_bench --rows 100000 --compare baseline.json
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from tools import calculate_csv_data, clear_table_cache, filter_csv_data, read_csv_info, render_answer, write_to_csv
+from tools import table_cache, table_index
+from tools.table_schema import SCHEMA_SUFFIX, clear_schema_cache
+
+from .agent_bench import peak_rss_mb
+from .synthetic import mixed_csv
+
+DEFAULT_ROWS = [10000, 100000, 1000000]
+DEFAULT_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+# 中位数变慢超过该比例视为性能回退
+DEFAULT_THRESHOLD = 1.2
+# 绝对差值小于该值（秒）的变化视为噪声，不算回退
+MIN_DELTA_SECONDS = 0.001
+
+
+def filter_cases():
+    """每种操作符至少一个用例，覆盖低基数、高基数、宽文本、数值和日期列"""
+    return {
+        "filter_eq_tag": [{"column": "标签", "operator": "=", "value": "Gold"}],
+        "filter_ne_tag": [{"column": "标签", "operator": "!=", "value": "Gold"}],
+        "filter_eq_high_cardinality": [{"column": "用户名", "operator": "=", "value": "user_0000000000000000"}],
+        "filter_gt_price": [{"column": "价格", "operator": ">", "value": 990}],
+        "filter_lt_price": [{"column": "价格", "operator": "<", "value": 10}],
+        "filter_ge_quantity": [{"column": "数量", "operator": ">=", "value": 99000}],
+        "filter_le_quantity": [{"column": "数量", "operator": "<=", "value": 1000}],
+        "filter_in_tag": [{"column": "标签", "operator": "in", "value": ["Silver", "Bronze"]}],
+        "filter_between_price": [{"column": "价格", "operator": "between", "value": [100, 200]}],
+        "filter_eq_date": [{"column": "日期", "operator": "=", "value": "2010-06-01"}],
+        "filter_contains_date": [{"column": "日期", "operator": "contains", "value": "2010-06"}],
+        "filter_contains_text": [{"column": "描述", "operator": "contains", "value": "诺贝尔 物理"}],
+        "filter_contains_high_cardinality": [{"column": "用户名", "operator": "contains", "value": "abc"}],
+        "filter_contains_case": [{"column": "描述", "operator": "contains", "value": "Search", "case": True}],
+        "filter_startswith_high_cardinality": [{"column": "用户名", "operator": "startswith", "value": "user_00"}],
+        "filter_multi": [{"column": "标签", "operator": "=", "value": "Gold"},
+                         {"column": "价格", "operator": "between", "value": [100, 200]},
+                         {"column": "时间", "operator": "contains", "value": "2020-05"}],
+        "filter_any_group": [{"any": [{"column": "标签", "operator": "=", "value": "Gold"},
+                                      {"column": "数量", "operator": "<", "value": 100}]}]
+    }
+
+
+def _measure(func, repeat):
+    """
+    计时：第一次调用单独记录（包含索引等派生结构的构建），之后 repeat 次取中位数和最小值；
+    再在 tracemalloc 下额外调用一次记录峰值分配
+    """
+    start = time.perf_counter()
+    result = func()
+    first = time.perf_counter() - start
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return result, {
+        "first_seconds": round(first, 6),
+        "median_seconds": round(statistics.median(times), 6) if times else round(first, 6),
+        "min_seconds": round(min(times), 6) if times else round(first, 6),
+        "peak_alloc_mb": round(peak / (1024 * 1024), 3)
+    }
+
+
+def _check(result):
+    if not isinstance(result, dict) or result.get("status") == "error":
+        raise RuntimeError(f"基准用例执行失败: {result}")
+    return result
+
+
+def bench_table(rows, repeat=5, data_dir=DEFAULT_DATA_DIR, write_rows=200):
+    """
+    在一张混合类型表格上测量全部用例
+
+    Returns:
+        dict: 用例名 -> 耗时与内存
+    """
+    csv_file = mixed_csv(data_dir, rows)
+    operations = {}
+
+    # 冷加载：每次先清空进程内缓存和文件旁的schema
+    def cold_read():
+        clear_table_cache()
+        clear_schema_cache()
+        if os.path.exists(csv_file + SCHEMA_SUFFIX):
+            os.remove(csv_file + SCHEMA_SUFFIX)
+        return read_csv_info(csv_file)
+
+    clear_table_cache()
+    result, operations["read_csv_info_cold"] = _measure(cold_read, max(1, repeat // 2))
+    _check(result)
+    result, operations["read_csv_info_warm"] = _measure(lambda: read_csv_info(csv_file), repeat)
+
+    for name, conditions in filter_cases().items():
+        result, stats = _measure(lambda: filter_csv_data(csv_file, conditions=conditions), repeat)
+        stats["filtered_rows"] = _check(result)["filtered_rows"]
+        operations[name] = stats
+
+    for operation in ["sum", "avg", "count", "min", "max"]:
+        result, operations[f"calculate_{operation}"] = _measure(
+            lambda: calculate_csv_data(csv_file, "价格", operation), repeat)
+        _check(result)
+        result, operations[f"calculate_{operation}_filtered"] = _measure(
+            lambda: calculate_csv_data(csv_file, "价格", operation, "标签", "Gold"), repeat)
+        _check(result)
+
+    result, operations["calculate_grouped"] = _measure(
+        lambda: calculate_csv_data(csv_file, metrics=[{"column": "价格", "operation": "avg"},
+                                                      {"column": "数量", "operation": "max"},
+                                                      {"column": "价格", "operation": "count"}],
+                                   group_by=["标签", "日期"], conditions=[{"column": "价格", "operator": ">", "value": 500}]),
+        repeat)
+    _check(result)
+
+    # 答案渲染：由结果句柄取行、改写取值、排序后生成markdown（只预览，不写入）
+    result_id = _check(filter_csv_data(csv_file, conditions=filter_cases()["filter_multi"], count_only=True))["result_id"]
+    result, operations["render_answer"] = _measure(
+        lambda: render_answer(result_id, columns=["用户名", "标签", "价格"], rename={"价格": "单价"},
+                              value_map={"标签": {"Gold": "金牌"}}, sort_by=["价格"], ascending=False, limit=50),
+        repeat)
+    _check(result)
+
+    # 写入：追加 write_rows 条问答，记录单次追加的耗时分布
+    with tempfile.TemporaryDirectory(prefix="tool_bench_") as work_dir:
+        output_file = os.path.join(work_dir, "qa.csv")
+        times = []
+        for i in range(write_rows):
+            # 每条问答的答案不同，避免被去重索引拒绝写入
+            answer = "| 用户名 | 价格 |\n| --- | --- |\n" + "\n".join(
+                f"| user_{i * 20 + j:016x} | {j}.5 |" for j in range(20))
+            start = time.perf_counter()
+            _check(write_to_csv(output_file, f"问题{i}", answer))
+            times.append(time.perf_counter() - start)
+        operations["write_to_csv"] = {
+            "first_seconds": round(times[0], 6),
+            "median_seconds": round(statistics.median(times), 6),
+            "min_seconds": round(min(times), 6),
+            "last_seconds": round(times[-1], 6),
+            "appends": write_rows
+        }
+
+    clear_table_cache()
+    return {
+        "rows": rows,
+        "csv_bytes": os.path.getsize(csv_file),
+        "operations": operations
+    }
+
+
+def run_benchmarks(rows_list, repeat=5, data_dir=DEFAULT_DATA_DIR):
+    """
+    依次测量每个规模
+
+    Returns:
+        dict: 基线报告（含环境与配置，便于判断两份基线是否可比）
+    """
+    import pandas as pd
+
+    return {
+        "benchmark": "tools",
+        "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": sys.version.split()[0],
+        "pandas": pd.__version__,
+        "config": {
+            "repeat": repeat,
+            "index_persist": table_index.PERSIST_INDEX,
+            "sidecar_auto": table_cache.AUTO_SIDECAR
+        },
+        "results": [bench_table(rows, repeat, data_dir) for rows in rows_list],
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+
+def compare_reports(report, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    与基线对比中位数耗时，变慢超过阈值且绝对差值超过 MIN_DELTA_SECONDS 的用例视为回退
+
+    Returns:
+        list: (行数, 用例名, 基线耗时, 当前耗时, 比值, 是否回退)，只包含两边都有的用例
+    """
+    baseline_by_rows = {result["rows"]: result["operations"] for result in baseline.get("results", [])}
+    rows = []
+    for result in report["results"]:
+        base_ops = baseline_by_rows.get(result["rows"])
+        if not base_ops:
+            continue
+        for name, stats in result["operations"].items():
+            base = base_ops.get(name)
+            if not base or not base.get("median_seconds"):
+                continue
+            ratio = stats["median_seconds"] / base["median_seconds"]
+            rows.append((result["rows"], name, base["median_seconds"], stats["median_seconds"],
+                         round(ratio, 3),
+                         ratio > threshold and stats["median_seconds"] - base["median_seconds"] > MIN_DELTA_SECONDS))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='工具微基准：测量各工具在不同规模和类型的表格上的耗时与内存')
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS, help='表格行数（可多个）')
+    parser.add_argument('--repeat', type=int, default=5, help='每个用例的重复次数（取中位数）')
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR, help='合成表格目录（已生成的表格会复用）')
+    parser.add_argument('--output', help='结果JSON写入路径')
+    parser.add_argument('--compare', help='对比的基线JSON，中位数变慢超过阈值时以非零状态退出')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='回退阈值（当前/基线）')
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.rows, args.repeat, args.data_dir)
+    for result in report["results"]:
+        print(f"{result['rows']} 行（{result['csv_bytes']} 字节）:")
+        for name, stats in result["operations"].items():
+            print(f"  {name:<36} 首次 {stats['first_seconds']:.6f}s  中位数 {stats['median_seconds']:.6f}s"
+                  + (f"  峰值分配 {stats['peak_alloc_mb']} MB" if "peak_alloc_mb" in stats else ""))
+    print(f"峰值内存: {report['peak_rss_mb']} MB")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入: {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = 0
+        print(f"与基线 {args.compare} 对比（阈值 {args.threshold}）:")
+        for rows, name, base, current, ratio, regressed in compare_reports(report, baseline, args.threshold):
+            regressions += regressed
+            print(f"  {rows:>8} {name:<36} {base:.6f}s -> {current:.6f}s  x{ratio}" + ("  回退" if regressed else ""))
+        if regressions:
+            print(f"共 {regressions} 个用例回退")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import json
+import os
+from datetime import datetime
+
+
+class SessionCheckpoint:
+    """
+    会话检查点（JSONL）：第一行为会话头，之后每完成一轮追加一行，
+    包含该轮新增的消息和轨迹条目。每行写入后立即 fsync，进程中断也不会丢失已完成的轮次
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def exists(self):
+        return os.path.exists(self.path) and os.path.getsize(self.path) > 0
+
+    def _append(self, record):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def start(self, config, head_messages):
+        """
+        新建检查点（覆盖同名旧文件）
+
+        Args:
+            config: 会话配置（用户需求、CSV路径等）
+            head_messages: 会话开头的消息（系统提示词和用户需求）
+        """
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, 'w', encoding='utf-8'):
+            pass
+        self._append({
+            "type": "session",
+            "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "config": config,
+            "messages": head_messages
+        })
+
+    def append_round(self, round_num, messages, trace_entry):
+        """
+        记录一个已完成的轮次
+
+        Args:
+            round_num: 轮次编号（从1开始）
+            messages: 该轮新增的消息（assistant 消息及其全部工具结果）
+            trace_entry: 该轮的轨迹条目
+        """
+        self._append({
+            "type": "round",
+            "round": round_num,
+            "messages": messages,
+            "trace": trace_entry
+        })
+
+    def load(self):
+        """
+        从检查点重建会话状态；末尾写了一半的行（进程在写入时中断）会被忽略
+
+        Returns:
+            dict: config, messages, work_trace, completed_rounds
+        """
+        config = {}
+        messages = []
+        work_trace = []
+        completed_rounds = 0
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if record.get("type") == "session":
+                    config = record.get("config", {})
+                    messages = list(record.get("messages", []))
+                elif record.get("type") == "round":
+                    messages.extend(record.get("messages", []))
+                    work_trace.append(record.get("trace", {}))
+                    completed_rounds = record.get("round", completed_rounds + 1)
+        return {
+            "config": config,
+            "messages": messages,
+            "work_trace": work_trace,
+            "completed_rounds": completed_rounds
+        }
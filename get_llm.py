@@ -1,120 +1,583 @@
+import abc
+import asyncio
+import json
 import os
+import random
+import threading
+import uuid
+from collections import OrderedDict
+
 import openai
 
-def call_doubao_api(messages, api_key=None, model=None, tools=None, reasoning_effort="low"):
+DOUBAO_BASE_URL = os.getenv("DOUBAO_BASE_URL", "https://ark.cn-beijing.volces.com/api/v3")
+
+# 超时与重试配置，可通过环境变量覆盖
+DEFAULT_TIMEOUT = float(os.getenv("DOUBAO_TIMEOUT", "120"))
+MAX_RETRIES = int(os.getenv("DOUBAO_MAX_RETRIES", "4"))
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 30.0
+
+# 采样温度（响应缓存的键也包含它）
+DEFAULT_TEMPERATURE = 0.7
+
+# 长连接客户端池：按 (事件循环, API密钥, 超时) 复用，避免每轮重建连接池和TLS握手
+_clients = {}
+_clients_lock = threading.Lock()
+
+# 同步包装使用的后台事件循环
+_sync_loop = None
+_sync_loop_lock = threading.Lock()
+
+
+def _get_async_client(api_key, timeout):
+    """获取（必要时创建）当前事件循环上的长连接客户端"""
+    key = (asyncio.get_running_loop(), api_key, timeout)
+    with _clients_lock:
+        # 清理已关闭事件循环上的客户端（例如多次 asyncio.run 留下的）
+        for stale in [k for k in _clients if k[0].is_closed()]:
+            del _clients[stale]
+        client = _clients.get(key)
+        if client is None:
+            # 重试由本模块统一处理（带抖动的指数退避），关闭SDK内置重试
+            client = openai.AsyncOpenAI(
+                base_url=DOUBAO_BASE_URL,
+                api_key=api_key,
+                timeout=timeout,
+                max_retries=0
+            )
+            _clients[key] = client
+        return client
+
+
+def _get_sync_loop():
+    """启动（仅一次）后台事件循环线程，供同步包装提交协程"""
+    global _sync_loop
+    with _sync_loop_lock:
+        if _sync_loop is None:
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name="llm-event-loop", daemon=True)
+            thread.start()
+            _sync_loop = loop
+        return _sync_loop
+
+
+def _run_sync(coro):
+    """在后台事件循环上执行协程并阻塞等待结果"""
+    return asyncio.run_coroutine_threadsafe(coro, _get_sync_loop()).result()
+
+
+def _is_retryable(error):
+    """429、5xx、连接错误和超时可重试"""
+    if isinstance(error, (openai.RateLimitError, openai.APIConnectionError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code >= 500
+    return False
+
+
+def _backoff_delay(attempt, error=None):
+    """指数退避 + 抖动；服务端给出 Retry-After 时优先采用"""
+    response = getattr(error, "response", None)
+    if response is not None:
+        retry_after = response.headers.get("retry-after")
+        try:
+            if retry_after is not None:
+                return min(float(retry_after), BACKOFF_MAX)
+        except ValueError:
+            pass
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt))
+    return random.uniform(delay / 2, delay)
+
+
+def _usage_to_dict(usage):
+    if usage is None:
+        return {}
+    if hasattr(usage, "model_dump"):
+        return usage.model_dump()
+    return dict(usage) if isinstance(usage, dict) else {}
+
+
+def _parse_completion(completion, model):
+    """将 completion 转换为统一的响应字典"""
+    message = completion.choices[0].message
+
+    reasoning_content = ""
+
+    if hasattr(message, 'reasoning_content'):
+        reasoning_content = message.reasoning_content
+    elif hasattr(completion, 'model_extra') and isinstance(completion.model_extra, dict):
+        reasoning_content = completion.model_extra.get('reasoning_content', '')
+    elif hasattr(completion, 'choices') and completion.choices and len(completion.choices) > 0:
+        if hasattr(completion.choices[0], 'model_extra') and isinstance(completion.choices[0].model_extra, dict):
+            reasoning_content = completion.choices[0].model_extra.get('reasoning_content', '')
+
+    response_data = {
+        "status": "success",
+        "content": message.content or '',
+        "reasoning_content": reasoning_content,
+        "model": model,
+        "usage": _usage_to_dict(getattr(completion, 'usage', None))
+    }
+
+    if hasattr(message, 'tool_calls') and message.tool_calls:
+        response_data["tool_calls"] = [
+            {
+                "id": tool_call.id,
+                "type": "function",
+                "function": {
+                    "name": tool_call.function.name,
+                    "arguments": tool_call.function.arguments
+                }
+            }
+            for tool_call in message.tool_calls
+        ]
+
+    return response_data
+
+
+class _StreamAssembler:
+    """流式响应拼装：逐块累积内容、思考过程和工具调用参数"""
+
+    def __init__(self, on_tool_call=None, on_reasoning=None):
+        self.on_tool_call = on_tool_call
+        self.on_reasoning = on_reasoning
+        self.content_parts = []
+        self.reasoning_parts = []
+        self.calls = {}
+        self.usage = None
+        self.emitted = False
+
+    def _maybe_dispatch(self, call):
+        """工具调用的参数JSON一旦完整即回调，不等整个响应结束"""
+        if call["dispatched"] or not call["name"] or self.on_tool_call is None:
+            return
+        arguments = call["arguments"].strip()
+        if not arguments.endswith("}"):
+            return
+        try:
+            json.loads(arguments)
+        except ValueError:
+            return
+        call["dispatched"] = True
+        self.emitted = True
+        self.on_tool_call(self._as_tool_call(call))
+
+    @staticmethod
+    def _as_tool_call(call):
+        return {
+            "id": call["id"],
+            "type": "function",
+            "function": {
+                "name": call["name"],
+                "arguments": call["arguments"]
+            }
+        }
+
+    def feed(self, chunk):
+        if getattr(chunk, "usage", None):
+            self.usage = chunk.usage
+        if not chunk.choices:
+            return
+        delta = chunk.choices[0].delta
+
+        reasoning = getattr(delta, "reasoning_content", None)
+        if reasoning is None and isinstance(getattr(delta, "model_extra", None), dict):
+            reasoning = delta.model_extra.get("reasoning_content")
+        if reasoning:
+            self.reasoning_parts.append(reasoning)
+            if self.on_reasoning is not None:
+                self.emitted = True
+                self.on_reasoning(reasoning)
+
+        if delta.content:
+            self.content_parts.append(delta.content)
+
+        for tool_delta in delta.tool_calls or []:
+            call = self.calls.get(tool_delta.index)
+            if call is None:
+                # 首次出现即确定 id（服务端未给出时生成一个），提前回调和最终解析使用同一个 id，工具不会被执行两次
+                call = self.calls[tool_delta.index] = {
+                    "id": tool_delta.id or "call_" + uuid.uuid4().hex,
+                    "name": "", "arguments": "", "dispatched": False
+                }
+            elif tool_delta.id and not call["dispatched"]:
+                call["id"] = tool_delta.id
+            if tool_delta.function is not None:
+                if tool_delta.function.name:
+                    call["name"] += tool_delta.function.name
+                if tool_delta.function.arguments:
+                    call["arguments"] += tool_delta.function.arguments
+            self._maybe_dispatch(call)
+
+    def finish(self, model):
+        # 流结束时补发参数不完整（或为空）的调用，交由调用方处理解析错误
+        for index in sorted(self.calls):
+            call = self.calls[index]
+            if not call["dispatched"] and call["name"] and self.on_tool_call is not None:
+                call["dispatched"] = True
+                self.on_tool_call(self._as_tool_call(call))
+
+        response_data = {
+            "status": "success",
+            "content": "".join(self.content_parts),
+            "reasoning_content": "".join(self.reasoning_parts),
+            "model": model,
+            "usage": _usage_to_dict(self.usage),
+            "streamed": True
+        }
+        if self.calls:
+            response_data["tool_calls"] = [self._as_tool_call(self.calls[i]) for i in sorted(self.calls)]
+        return response_data
+
+
+async def _astream_completion(client, request_params, model, on_tool_call, on_reasoning, assembler_box):
+    assembler = _StreamAssembler(on_tool_call, on_reasoning)
+    assembler_box.append(assembler)
+    stream = await client.chat.completions.create(
+        **request_params,
+        stream=True,
+        stream_options={"include_usage": True}
+    )
+    async for chunk in stream:
+        assembler.feed(chunk)
+    return assembler.finish(model)
+
+
+async def acall_doubao_api(messages, api_key=None, model=None, tools=None, reasoning_effort="low",
+                           timeout=None, stream=False, on_tool_call=None, on_reasoning=None):
     """
+    异步调用豆包API，复用长连接客户端，429/5xx 按指数退避重试
+
     Args:
         messages: 消息列表
         api_key: API密钥（可选，如果未提供会从环境变量读取）
         model: 模型名称(ep名字)
         tools: 工具描述列表（用于函数调用）
         reasoning_effort: 推理努力程度（"low", "medium", "high"）
-        
+        timeout: 单次请求超时秒数（默认 DOUBAO_TIMEOUT）
+        stream: 是否流式接收响应
+        on_tool_call: 流式模式下，某个工具调用的参数JSON完整时立即回调（参数为工具调用字典）
+        on_reasoning: 流式模式下，每收到一段思考内容即回调（参数为文本片段）
+
     Returns:
         dict: API响应结果
     """
     if not api_key:
         api_key = os.getenv("DOUBAO_API_KEY")
-    
+
     if not api_key:
         return {
             "status": "error",
             "message": "未提供豆包API密钥"
         }
-    
-    try:
-        client = openai.OpenAI(
-            base_url="https://ark.cn-beijing.volces.com/api/v3",
-            api_key=api_key
-        )
-        
-        request_params = {
-            "model": model,
-            "messages": messages,
-            "temperature": 0.7,
-            "reasoning_effort": reasoning_effort
-        }
-        
-   
-        if tools:
-            request_params["tools"] = tools
-            request_params["tool_choice"] = "auto"  
-        
-   
-        completion = client.chat.completions.create(**request_params)
-        
-    
-        message = completion.choices[0].message
-        
-     
-        reasoning_content = ""
-        
-   
-        if hasattr(message, 'reasoning_content'):
-            reasoning_content = message.reasoning_content
-        elif hasattr(completion, 'model_extra') and isinstance(completion.model_extra, dict):
-            reasoning_content = completion.model_extra.get('reasoning_content', '')
-        elif hasattr(completion, 'choices') and completion.choices and len(completion.choices) > 0:
-            if hasattr(completion.choices[0], 'model_extra') and isinstance(completion.choices[0].model_extra, dict):
-                reasoning_content = completion.choices[0].model_extra.get('reasoning_content', '')
-        
+
+    request_params = {
+        "model": model,
+        "messages": messages,
+        "temperature": DEFAULT_TEMPERATURE,
+        "reasoning_effort": reasoning_effort
+    }
+
+    if tools:
+        request_params["tools"] = tools
+        request_params["tool_choice"] = "auto"
+
+    attempt = 0
+    while True:
+        assembler_box = []
+        try:
+            client = _get_async_client(api_key, timeout or DEFAULT_TIMEOUT)
+            if stream:
+                return await _astream_completion(client, request_params, model, on_tool_call, on_reasoning,
+                                                 assembler_box)
+            completion = await client.chat.completions.create(**request_params)
+            return _parse_completion(completion, model)
+
+        except Exception as e:
+            # 流式响应已经向调用方输出过内容时不能重试，否则会重复回调
+            emitted = bool(assembler_box) and assembler_box[0].emitted
+            if attempt < MAX_RETRIES and _is_retryable(e) and not emitted:
+                await asyncio.sleep(_backoff_delay(attempt, e))
+                attempt += 1
+                continue
+            return {
+                "status": "error",
+                "message": f"豆包API调用失败: {str(e)}"
+            }
+
+
+def call_doubao_api(messages, api_key=None, model=None, tools=None, reasoning_effort="low", timeout=None,
+                    stream=False, on_tool_call=None, on_reasoning=None):
+    """
+    同步调用豆包API（在后台事件循环上执行 acall_doubao_api）
+
+    Args:
+        messages: 消息列表
+        api_key: API密钥（可选，如果未提供会从环境变量读取）
+        model: 模型名称(ep名字)
+        tools: 工具描述列表（用于函数调用）
+        reasoning_effort: 推理努力程度（"low", "medium", "high"）
+        timeout: 单次请求超时秒数（默认 DOUBAO_TIMEOUT）
+        stream: 是否流式接收响应
+        on_tool_call: 流式模式下工具调用参数完整时的回调（在后台事件循环线程中调用，应尽快返回）
+        on_reasoning: 流式模式下思考内容片段的回调
+
+    Returns:
+        dict: API响应结果
+    """
+    return _run_sync(acall_doubao_api(messages, api_key, model, tools, reasoning_effort, timeout,
+                                      stream, on_tool_call, on_reasoning))
+
+
+class LLMProvider(abc.ABC):
+    """
+    LLM提供方接口：子类必须实现 complete，返回与 call_doubao_api 相同格式的响应字典，
+    acomplete 默认在线程中执行 complete
+    """
+
+    @abc.abstractmethod
+    def complete(self, messages, model=None, tools=None, reasoning_effort="low", timeout=None,
+                 stream=False, on_tool_call=None, on_reasoning=None):
+        """同步获取一次响应"""
+
+    async def acomplete(self, messages, model=None, tools=None, reasoning_effort="low", timeout=None,
+                        stream=False, on_tool_call=None, on_reasoning=None):
+        return await asyncio.to_thread(self.complete, messages, model, tools, reasoning_effort, timeout,
+                                       stream, on_tool_call, on_reasoning)
+
+
+class DoubaoProvider(LLMProvider):
+    """豆包API（默认提供方），model 为 ep 名字"""
+
+    def __init__(self, api_key=None):
+        self.api_key = api_key
+
+    def complete(self, messages, model=None, tools=None, reasoning_effort="low", timeout=None,
+                 stream=False, on_tool_call=None, on_reasoning=None):
+        return call_doubao_api(messages, self.api_key, model, tools, reasoning_effort, timeout,
+                               stream, on_tool_call, on_reasoning)
+
+    async def acomplete(self, messages, model=None, tools=None, reasoning_effort="low", timeout=None,
+                        stream=False, on_tool_call=None, on_reasoning=None):
+        return await acall_doubao_api(messages, self.api_key, model, tools, reasoning_effort, timeout,
+                                      stream, on_tool_call, on_reasoning)
+
+
+def _load_script(path):
+    """
+    读取脚本文件，支持两种格式：
+    - JSON 数组：每个元素是一轮的响应（content、tool_calls 等字段）
+    - 会话检查点（JSONL）：按轮次取出其中的 assistant 消息，用于离线重放已录制的会话
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    if text.lstrip().startswith("["):
+        return json.loads(text)
+    script = []
+    for line in text.splitlines():
+        try:
+            record = json.loads(line)
+        except ValueError:
+            break
+        if record.get("type") != "round":
+            continue
+        for message in record.get("messages", []):
+            if message.get("role") == "assistant":
+                script.append(message)
+                break
+    return script
+
+
+class ScriptedProvider(LLMProvider):
+    """
+    脚本化提供方：按轮次返回预先录制的响应，不访问网络
+
+    轮次计数保存在提供方上，按消息列表区分会话（历史压缩丢弃旧轮次不影响计数），
+    因此同一实例可被多个会话并发使用；首次见到某个会话时按其中已有的 assistant 消息数
+    确定起始轮次，恢复的会话也从正确的轮次继续。脚本用完后返回不带工具调用的空响应
+    """
+
+    # 最多跟踪的会话数，超出后按LRU淘汰
+    MAX_SESSIONS = 256
+
+    def __init__(self, script):
+        """
+        Args:
+            script: 响应列表，每项为含 content、tool_calls（OpenAI格式，arguments 可为字典）、
+                reasoning_content、usage 的字典
+        """
+        self.script = list(script)
+        self._rounds = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path):
+        return cls(_load_script(path))
+
+    def _next_round(self, messages):
+        """返回该会话本次请求的轮次序号并计数（会话由消息列表对象区分）"""
+        with self._lock:
+            entry = self._rounds.get(id(messages))
+            if entry is None or entry[0] is not messages:
+                entry = [messages, sum(1 for message in messages if message.get("role") == "assistant")]
+                self._rounds[id(messages)] = entry
+            self._rounds.move_to_end(id(messages))
+            while len(self._rounds) > self.MAX_SESSIONS:
+                self._rounds.popitem(last=False)
+            round_index = entry[1]
+            entry[1] += 1
+            return round_index
+
+    def complete(self, messages, model=None, tools=None, reasoning_effort="low", timeout=None,
+                 stream=False, on_tool_call=None, on_reasoning=None):
+        round_index = self._next_round(messages)
+        step = self.script[round_index] if round_index < len(self.script) else {}
+
+        tool_calls = []
+        for i, call in enumerate(step.get("tool_calls") or []):
+            function = call.get("function", {})
+            arguments = function.get("arguments", {})
+            if not isinstance(arguments, str):
+                arguments = json.dumps(arguments, ensure_ascii=False)
+            tool_calls.append({
+                "id": call.get("id") or f"call_{round_index}_{i}",
+                "type": "function",
+                "function": {"name": function.get("name"), "arguments": arguments}
+            })
+
         response_data = {
             "status": "success",
-            "content": message.content or '',
-            "reasoning_content": reasoning_content,
+            "content": step.get("content") or "",
+            "reasoning_content": step.get("reasoning_content") or "",
             "model": model,
-            "usage": completion.usage if hasattr(completion, 'usage') else {}
+            "usage": step.get("usage") or {}
         }
-        
-      
-        if hasattr(message, 'tool_calls') and message.tool_calls:
-            response_data["tool_calls"] = [
-                {
-                    "id": tool_call.id,
-                    "type": "function",
-                    "function": {
-                        "name": tool_call.function.name,
-                        "arguments": tool_call.function.arguments
-                    }
-                }
-                for tool_call in message.tool_calls
-            ]
-        
+        if tool_calls:
+            response_data["tool_calls"] = tool_calls
+        if stream:
+            if on_reasoning is not None and response_data["reasoning_content"]:
+                on_reasoning(response_data["reasoning_content"])
+            if on_tool_call is not None:
+                for call in tool_calls:
+                    on_tool_call(call)
+            response_data["streamed"] = True
         return response_data
-        
-    except Exception as e:
+
+
+# 提供方注册表：名称 -> 工厂函数(参数字符串, api_key)
+_provider_factories = {
+    "scripted": lambda arg, api_key: ScriptedProvider.from_file(arg),
+    "replay": lambda arg, api_key: ScriptedProvider.from_file(arg)
+}
+_provider_instances = {}
+_provider_lock = threading.Lock()
+
+
+def register_provider(name, factory):
+    """
+    注册提供方，之后 provider 参数写成 "<name>:<参数>" 即使用该提供方
+
+    Args:
+        name: 提供方名称
+        factory: 工厂函数，接收 (参数字符串, api_key)，返回 LLMProvider 实例
+    """
+    with _provider_lock:
+        _provider_factories[name] = factory
+        for key in [k for k in _provider_instances if k[0] == name]:
+            del _provider_instances[key]
+
+
+def resolve_provider(provider, api_key=None):
+    """
+    解析 provider 参数
+
+    "<已注册名称>:<参数>"（例如 "replay:session.ckpt.jsonl"）使用对应的提供方，
+    其他值视为豆包模型的ep名字
+
+    Returns:
+        tuple: (LLMProvider 实例, 模型名称)
+    """
+    name, sep, arg = provider.partition(":")
+    with _provider_lock:
+        factory = _provider_factories.get(name) if sep else None
+        if factory is None:
+            return DoubaoProvider(api_key), provider
+        key = (name, arg, api_key)
+        instance = _provider_instances.get(key)
+        if instance is None:
+            instance = factory(arg, api_key)
+            _provider_instances[key] = instance
+        return instance, provider
+
+
+async def aget_llm_response(messages, provider=None, api_key=None, tools=None, reasoning_effort="low",
+                            timeout=None, stream=False, on_tool_call=None, on_reasoning=None):
+    """
+    获取模型响应的异步接口，适合在同一进程内并发运行大量会话
+
+    Args:
+        messages: 消息列表
+        provider: 豆包模型的ep名字，或 "<提供方>:<参数>"（如 "replay:session.ckpt.jsonl"）（必填）
+        api_key: API密钥
+        tools: 工具描述列表（用于函数调用）
+        reasoning_effort: 推理努力程度（"low", "medium", "high"）
+        timeout: 单次请求超时秒数
+        stream: 是否流式接收响应
+        on_tool_call: 流式模式下工具调用参数完整时的回调
+        on_reasoning: 流式模式下思考内容片段的回调
+
+    Returns:
+        dict: LLM响应结果
+    """
+    if not provider:
         return {
             "status": "error",
-            "message": f"豆包API调用失败: {str(e)}"
+            "message": "provider参数为必填，需要提供豆包模型的ep名字"
         }
 
-def get_llm_response(messages, provider=None, api_key=None, tools=None, reasoning_effort="low"):
+    try:
+        llm_provider, model = resolve_provider(provider, api_key)
+    except (OSError, ValueError) as e:
+        return {"status": "error", "message": f"加载提供方 '{provider}' 失败: {str(e)}"}
+    return await llm_provider.acomplete(messages, model, tools, reasoning_effort, timeout,
+                                        stream, on_tool_call, on_reasoning)
+
+
+def get_llm_response(messages, provider=None, api_key=None, tools=None, reasoning_effort="low", timeout=None,
+                     stream=False, on_tool_call=None, on_reasoning=None):
     """
-    获取豆包模型响应的接口
-    
+    获取模型响应的接口
+
     Args:
         messages: 消息列表
-        provider: 豆包模型的ep名字（必填）
+        provider: 豆包模型的ep名字，或 "<提供方>:<参数>"（如 "replay:session.ckpt.jsonl"）（必填）
         api_key: API密钥
         tools: 工具描述列表（用于函数调用）
         reasoning_effort: 推理努力程度（"low", "medium", "high"）
-        
+        timeout: 单次请求超时秒数
+        stream: 是否流式接收响应
+        on_tool_call: 流式模式下工具调用参数完整时的回调
+        on_reasoning: 流式模式下思考内容片段的回调
+
     Returns:
         dict: LLM响应结果
     """
-    # provider直接作为模型名称(ep名字)使用
     if not provider:
         return {
             "status": "error",
             "message": "provider参数为必填，需要提供豆包模型的ep名字"
         }
-    
-    # 直接调用豆包API
-    return call_doubao_api(messages, api_key, provider, tools, reasoning_effort)
+
+    try:
+        llm_provider, model = resolve_provider(provider, api_key)
+    except (OSError, ValueError) as e:
+        return {"status": "error", "message": f"加载提供方 '{provider}' 失败: {str(e)}"}
+    return llm_provider.complete(messages, model, tools, reasoning_effort, timeout,
+                                 stream, on_tool_call, on_reasoning)
 
 # 工具信息
 tool_info = {
     "name": "get_llm_response",
     "description": "豆包模型API调用接口，provider参数需要传入具体的ep名字",
     "function": get_llm_response
-}
\ No newline at end of file
+}
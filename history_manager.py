@@ -0,0 +1,154 @@
+import json
+
+# 旧消息中字符串字段保留的最大长度
+PREVIEW_CHARS = 200
+
+
+def encode_tool_result(result):
+    """工具结果的紧凑JSON编码（不缩进、不加多余空格）"""
+    return json.dumps(result, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def estimate_tokens(text):
+    """
+    粗略估计token数：非ASCII字符（主要是中文）约1个token，ASCII字符约4个一token
+
+    Args:
+        text: 文本
+
+    Returns:
+        int: 估计的token数
+    """
+    if not text:
+        return 0
+    ascii_chars = len(text.encode("ascii", "ignore"))
+    return (len(text) - ascii_chars) + (ascii_chars + 3) // 4
+
+
+def estimate_messages_tokens(messages):
+    """估计整段消息历史的token数"""
+    total = 0
+    for message in messages:
+        total += 4 + estimate_tokens(message.get("content") or "")
+        for call in message.get("tool_calls") or []:
+            total += estimate_tokens(call.get("function", {}).get("arguments") or "")
+    return total
+
+
+def _preview(value):
+    if isinstance(value, str) and len(value) > PREVIEW_CHARS:
+        return value[:PREVIEW_CHARS] + "…"
+    return value
+
+
+def summarize_tool_result(result):
+    """
+    将旧的工具结果压缩为摘要：保留状态、行数、句柄等标量字段，省略数据列表
+
+    Args:
+        result: 工具结果字典
+
+    Returns:
+        dict: 摘要
+    """
+    summary = {"compacted": True}
+    for key, value in result.items():
+        if isinstance(value, list):
+            summary[key] = f"<已省略{len(value)}项>"
+        elif isinstance(value, dict):
+            summary[key] = f"<已省略{len(value)}个字段>"
+        else:
+            summary[key] = _preview(value)
+    if result.get("result_id"):
+        summary["hint"] = "数据已从历史中省略，如需查看请用 result_id 翻页重新获取"
+    return summary
+
+
+def _compact_tool_message(message):
+    content = message.get("content") or ""
+    try:
+        result = json.loads(content)
+    except ValueError:
+        message["content"] = _preview(content)
+        return
+    if isinstance(result, dict) and not result.get("compacted"):
+        message["content"] = encode_tool_result(summarize_tool_result(result))
+
+
+def _compact_assistant_message(message):
+    message["content"] = _preview(message.get("content") or "")
+    for call in message.get("tool_calls") or []:
+        function = call.get("function", {})
+        try:
+            args = json.loads(function.get("arguments") or "{}")
+        except ValueError:
+            continue
+        if isinstance(args, dict):
+            # 写入工具的长答案等字段只保留预览，参数仍是合法JSON
+            function["arguments"] = json.dumps({k: _preview(v) for k, v in args.items()},
+                                               ensure_ascii=False, separators=(",", ":"))
+
+
+class HistoryManager:
+    """
+    消息历史管理：最近若干轮保持原样，更早的工具结果替换为摘要，
+    仍超出token预算时从最早的轮次开始整轮丢弃
+    """
+
+    def __init__(self, keep_rounds=3, token_budget=60000, preserve_head=2):
+        """
+        Args:
+            keep_rounds: 原样保留的最近轮次数
+            token_budget: 每次请求的消息token预算
+            preserve_head: 始终保留的开头消息数（系统提示词和用户需求）
+        """
+        self.keep_rounds = keep_rounds
+        self.token_budget = token_budget
+        self.preserve_head = preserve_head
+
+    def _round_starts(self, messages):
+        return [i for i in range(self.preserve_head, len(messages)) if messages[i].get("role") == "assistant"]
+
+    def compact(self, messages):
+        """
+        原地压缩消息历史
+
+        Args:
+            messages: 消息列表（会被原地修改）
+
+        Returns:
+            dict: 压缩前后的token估计、节省的token数和丢弃的轮次数
+        """
+        before = estimate_messages_tokens(messages)
+
+        round_starts = self._round_starts(messages)
+        if self.keep_rounds <= 0:
+            boundary = len(messages)
+        elif len(round_starts) > self.keep_rounds:
+            boundary = round_starts[-self.keep_rounds]
+        else:
+            boundary = self.preserve_head
+
+        for message in messages[self.preserve_head:boundary]:
+            if message.get("role") == "tool":
+                _compact_tool_message(message)
+            elif message.get("role") == "assistant":
+                _compact_assistant_message(message)
+
+        after = estimate_messages_tokens(messages)
+        dropped = 0
+        # 整轮丢弃（assistant 及其工具结果一起删除），保证 tool_call_id 配对完整
+        while after > self.token_budget:
+            round_starts = self._round_starts(messages)
+            if len(round_starts) <= max(self.keep_rounds, 1):
+                break
+            del messages[round_starts[0]:round_starts[1]]
+            dropped += 1
+            after = estimate_messages_tokens(messages)
+
+        return {
+            "tokens_before": before,
+            "tokens_after": after,
+            "tokens_saved": before - after,
+            "dropped_rounds": dropped
+        }
@@ -1,22 +1,50 @@
 import uuid
 from tools import tools_info
 import argparse
+import functools
+import hashlib
 import json
 import os
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 from get_llm import get_llm_response
+from history_manager import HistoryManager, encode_tool_result
+from response_cache import ResponseCache
+from checkpoint import SessionCheckpoint
+from trace_log import TraceLogger, format_summary, result_row_counts, summarize_trace
 from tools import get_tool_function
 
-def load_system_prompt():
-    """加载系统提示词"""
+# 各模式下不提供给模型的工具：计划模式只通过 execute_qa_plan 写入问答
+MODE_EXCLUDED_TOOLS = {
+    False: {"execute_qa_plan"},
+    True: {"write_to_csv", "render_answer"}
+}
+# 计划模式的工作流程，替换 prompt.txt 中“## 工作流程”及之后的内容
+PLAN_WORKFLOW_FILE = 'prompt_plan.txt'
+WORKFLOW_HEADING = "## 工作流程"
+
+
+def load_system_prompt(plan_mode=False):
+    """加载系统提示词（计划模式下替换工作流程部分）"""
     try:
         with open('prompt.txt', 'r', encoding='utf-8') as f:
-            return f.read()
+            prompt = f.read()
     except FileNotFoundError:
         print("警告：未找到prompt.txt文件，使用默认提示词")
         return "你是一个智能表格处理助手，能够帮助用户处理CSV文件数据。"
+    if not plan_mode:
+        return prompt
+    try:
+        with open(PLAN_WORKFLOW_FILE, 'r', encoding='utf-8') as f:
+            workflow = f.read()
+    except FileNotFoundError:
+        print(f"警告：未找到{PLAN_WORKFLOW_FILE}文件，使用默认工作流程")
+        return prompt
+    head = prompt.split(WORKFLOW_HEADING, 1)[0]
+    return head + workflow
 
 def load_tools_description():
     """加载工具描述"""
@@ -28,28 +56,71 @@ def load_tools_description():
         print("警告：未找到tools.json文件")
         return ""
 
-def parse_function_call(response_content, response_data=None):
-    """解析LLM响应中的函数调用，优先从 response_data 的结构读取（并返回可能的 tool_call id）"""
+def _parse_tool_call(tool_call):
+    """解析单个结构化工具调用，缺少 id 时补一个"""
+    func_info = tool_call.get("function", {}) or {}
+    args_raw = func_info.get("arguments")
+    if isinstance(args_raw, str):
+        try:
+            args = json.loads(args_raw)
+        except Exception:
+            args = args_raw
+    else:
+        args = args_raw
+    tool_call_id = tool_call.get("id") or tool_call.get("tool_call_id") or tool_call.get("call_id")
+    return {
+        "name": func_info.get("name"),
+        "arguments": args or {},
+        "id": tool_call_id or str(uuid.uuid4())
+    }
+
+
+@functools.lru_cache(maxsize=None)
+def _static_prefix_json(plan_mode=False):
+    """系统提示词和工具描述在进程内（每种模式）只构建一次，序列化为固定的JSON文本"""
+    tools_openai_format = []
+    for tool in tools_info:
+        if tool["name"] in MODE_EXCLUDED_TOOLS[plan_mode]:
+            continue
+        tools_openai_format.append({
+            "type": "function",
+            "function": {
+                "name": tool["name"],
+                "description": tool.get("description"),
+                "parameters": tool.get("parameters")
+            }
+        })
+    return json.dumps({"system": load_system_prompt(plan_mode), "tools": tools_openai_format}, ensure_ascii=False)
+
+
+def get_static_prefix(plan_mode=False):
+    """
+    获取静态请求前缀（系统消息 + 工具描述）
+
+    每次返回新的副本，内容与首次构建时逐字节一致，便于服务端前缀缓存命中
+
+    Args:
+        plan_mode: 是否为计划模式
+
+    Returns:
+        tuple: (系统消息字典, OpenAI格式的工具列表)
+    """
+    prefix = json.loads(_static_prefix_json(plan_mode))
+    return {"role": "system", "content": prefix["system"]}, prefix["tools"]
+
+
+def static_prefix_digest(plan_mode=False):
+    """静态前缀的摘要，用于确认各会话前缀一致"""
+    return hashlib.sha256(_static_prefix_json(plan_mode).encode("utf-8")).hexdigest()[:12]
+
+
+def parse_function_calls(response_content, response_data=None):
+    """解析LLM响应中的全部函数调用，优先从 response_data 的结构读取"""
     try:
         if response_data and isinstance(response_data, dict) and "tool_calls" in response_data:
             tool_calls = response_data.get("tool_calls") or []
             if tool_calls:
-                tool_call = tool_calls[0]
-                func_info = tool_call.get("function", {}) or {}
-                args_raw = func_info.get("arguments")
-                if isinstance(args_raw, str):
-                    try:
-                        args = json.loads(args_raw)
-                    except Exception:
-                        args = args_raw
-                else:
-                    args = args_raw
-                tool_call_id = tool_call.get("id") or tool_call.get("tool_call_id") or tool_call.get("call_id")
-                return {
-                    "name": func_info.get("name"),
-                    "arguments": args or {},
-                    "id": tool_call_id
-                }
+                return [_parse_tool_call(tool_call) for tool_call in tool_calls]
 
         if response_content and "{" in response_content and "}" in response_content:
             start = response_content.find("{")
@@ -57,18 +128,25 @@ def parse_function_call(response_content, response_data=None):
             json_str = response_content[start:end]
             function_call = json.loads(json_str)
             # 返回保证格式
-            return {
+            return [{
                 "name": function_call.get("name"),
-                "arguments": function_call.get("arguments", {})
-            }
+                "arguments": function_call.get("arguments", {}),
+                "id": str(uuid.uuid4())
+            }]
 
-        return None
+        return []
 
     except json.JSONDecodeError:
-        return None
+        return []
     except Exception as e:
         print(f"解析函数调用时出错: {e}")
-        return None
+        return []
+
+
+def parse_function_call(response_content, response_data=None):
+    """解析LLM响应中的第一个函数调用（向后兼容）"""
+    calls = parse_function_calls(response_content, response_data)
+    return calls[0] if calls else None
 
 
 def execute_tool(function_name, function_args):
@@ -93,6 +171,22 @@ def execute_tool(function_name, function_args):
         }
 
 
+def timed_execute_tool(function_name, function_args):
+    """执行工具函数并计时，返回 (结果, 耗时秒数)"""
+    start = time.perf_counter()
+    result = execute_tool(function_name, function_args)
+    return result, time.perf_counter() - start
+
+
+def apply_output_override(function_name, function_args, output_file):
+    """命令行指定了输出文件时，写入工具统一写到该文件"""
+    if function_name == "write_to_csv" and output_file:
+        function_args["file_path"] = output_file
+    elif function_name in ("render_answer", "execute_qa_plan") and output_file:
+        function_args["output_file"] = output_file
+    return function_args
+
+
 def ensure_dict(obj):
     """确保 obj 是 dict；如果是 JSON 字符串尝试解析；否则返回空 dict"""
     if obj is None:
@@ -110,8 +204,27 @@ def ensure_dict(obj):
             return {}
     return {}
 
-def run_agent(user_input, csv_file, max_rounds=10, provider=None, api_key=None, output_file=None):
-    """运行agent主循环"""
+def run_agent(user_input, csv_file, max_rounds=10, provider=None, api_key=None, output_file=None,
+              llm_call=None, stream=False, max_tool_workers=4, history_manager=None,
+              checkpoint_path=None, resume=False, trace_log_path=None, session_id=None, plan_mode=False):
+    """运行agent主循环
+
+    llm_call: 可选的LLM调用函数（签名同 get_llm_response），批量运行时用于注入并发限制
+    stream: 流式接收模型输出，思考内容实时打印，工具调用参数一完整就开始执行
+    max_tool_workers: 同一轮多个工具调用并发执行的线程数
+    history_manager: 消息历史管理器，每轮请求前压缩旧的工具结果（默认 HistoryManager()）
+    checkpoint_path: 检查点文件路径，每完成一轮就把该轮消息和轨迹追加写入
+    resume: 从 checkpoint_path 恢复消息历史和轨迹，从最后一个完成的轮次之后继续
+    trace_log_path: 结构化轨迹日志（JSONL）路径，每轮写一行，包含各阶段耗时、行数、负载字节和token用量
+    session_id: 写入轨迹日志的会话ID
+    plan_mode: 计划模式，模型一次提交全部问题的结构化计划，由 execute_qa_plan 在本地执行、渲染并写入
+    """
+    if llm_call is None:
+        llm_call = get_llm_response
+    if history_manager is None:
+        history_manager = HistoryManager()
+    tool_executor = ThreadPoolExecutor(max_workers=max_tool_workers)
+    trace_logger = TraceLogger(trace_log_path, session_id) if trace_log_path else None
     
     print(f"\n{'='*60}")
     print(f"开始处理任务")
@@ -119,18 +232,18 @@ def run_agent(user_input, csv_file, max_rounds=10, provider=None, api_key=None,
     print(f"用户需求: {user_input}")
     print(f"最大轮次: {max_rounds}")
     print(f"LLM模型: {provider}")
+    if plan_mode:
+        print("执行模式: 计划模式")
     print(f"{'='*60}\n")
     
-    system_prompt = load_system_prompt()
-    
+    # 系统提示词和工具描述是跨会话不变的静态前缀，只构建一次
+    system_message, tools_openai_format = get_static_prefix(plan_mode)
+    print(f"静态前缀: {static_prefix_digest(plan_mode)}")
 
     combined_user_input = f"{user_input}\n\nCSV_PATH: {csv_file}"
     
     messages = [
-        {
-            "role": "system",
-            "content": system_prompt
-        },
+        system_message,
         {
             "role": "user",
             "content": combined_user_input
@@ -143,51 +256,110 @@ def run_agent(user_input, csv_file, max_rounds=10, provider=None, api_key=None,
     # OpenAI 风格使用 "function"；豆包(doubao) 等需要使用 "tool"
 
     function_message_role = "tool"
-
-    
-    tools_openai_format = []
-    for tool in tools_info:
-        tools_openai_format.append({
-            "type": "function",
-            "function": {
-                "name": tool["name"],
-                "description": tool.get("description"),
-                "parameters": tool.get("parameters")
-            }
-        })
     
     work_trace = []
+    start_round = 0
+    
+    checkpoint = SessionCheckpoint(checkpoint_path) if checkpoint_path else None
+    if checkpoint and resume and checkpoint.exists():
+        state = checkpoint.load()
+        messages = state["messages"] or messages
+        last_user_message = messages[1]["content"] if len(messages) > 1 else last_user_message
+        work_trace = state["work_trace"]
+        start_round = state["completed_rounds"]
+        print(f"从检查点恢复: 已完成 {start_round} 轮，共 {len(messages)} 条消息")
+    elif checkpoint:
+        checkpoint.start({
+            "user_input": user_input,
+            "csv_file": csv_file,
+            "max_rounds": max_rounds,
+            "provider": provider,
+            "output_file": output_file,
+            "plan_mode": plan_mode
+        }, messages)
+    
+    already_finished = any(
+        isinstance(call.get("result"), dict) and call["result"].get("task_finished")
+        for trace in work_trace
+        for call in trace.get("calls", [])
+    )
+    if already_finished:
+        print("检查点中的任务已完成，无需继续")
     
-    for round_num in range(max_rounds):
+    for round_num in range(start_round, start_round if already_finished else max_rounds):
         print(f"\n--- 第 {round_num + 1} 轮 ---")
         
         
+        context_report = history_manager.compact(messages)
+        if context_report["tokens_saved"] > 0:
+            print(f"上下文压缩: 约 {context_report['tokens_before']} -> {context_report['tokens_after']} tokens，"
+                  f"节省约 {context_report['tokens_saved']} tokens"
+                  + (f"，丢弃 {context_report['dropped_rounds']} 个旧轮次" if context_report["dropped_rounds"] else ""))
+        
+        # 本轮新增消息的起点（压缩之后计算，压缩可能删除旧消息）
+        round_start = len(messages)
+        round_timer = time.perf_counter()
+        
         print("正在调用LLM API...")
-        response = get_llm_response(messages, provider, api_key, tools=tools_openai_format)
+        llm_kwargs = {"tools": tools_openai_format}
+        early_results = {}
+        early_calls = []
+        if stream:
+            def on_tool_call(tool_call):
+                call = _parse_tool_call(tool_call)
+                call_args = apply_output_override(call["name"], ensure_dict(call["arguments"]), output_file)
+                early_calls.append(tool_call)
+                early_results[call["id"]] = tool_executor.submit(timed_execute_tool, call["name"], call_args)
 
-        if not isinstance(response, dict):
-            print("LLM 返回格式异常，预期 dict。")
-            break
+            def on_reasoning(text):
+                print(text, end="", flush=True)
 
-        if response.get("status") == "error":
-            print(f"LLM API调用失败: {response.get('message')}")
-            break
+            llm_kwargs.update(stream=True, on_tool_call=on_tool_call, on_reasoning=on_reasoning)
+            print("模型思考(流式): ", end="", flush=True)
+
+        llm_timer = time.perf_counter()
+        response = llm_call(messages, provider, api_key, **llm_kwargs)
+        llm_seconds = time.perf_counter() - llm_timer
+        if stream:
+            print()
+
+        llm_error = None
+        if not isinstance(response, dict):
+            llm_error = "LLM 返回格式异常，预期 dict。"
+        elif response.get("status") == "error":
+            llm_error = f"LLM API调用失败: {response.get('message')}"
+        if llm_error:
+            print(llm_error)
+            if not early_calls:
+                break
+            # 流式响应中途失败时，已提前执行的工具调用照常记入轨迹和消息历史后再结束，避免已执行的写入无迹可查
+            print(f"响应中断前已提前执行 {len(early_calls)} 个工具调用，记录其结果后结束")
+            response = {"content": "", "tool_calls": list(early_calls)}
 
         assistant_message = response.get("content", "") or ""
         reasoning_content = response.get("reasoning_content", "") or ""
 
-        function_call = parse_function_call(assistant_message, response)
-        if function_call:
- 
+        parse_timer = time.perf_counter()
+        function_calls = parse_function_calls(assistant_message, response)
+        for call in function_calls:
+            call["arguments"] = ensure_dict(call.get("arguments"))
+        parse_seconds = time.perf_counter() - parse_timer
+
+        if function_calls:
             assistant_msg_obj = {
                 "role": "assistant",
- 
-                "content": "",
-             
-                "function_call": {
-                    "name": function_call.get("name"),
-                    "arguments": json.dumps(function_call.get("arguments", {}), ensure_ascii=False)
-                }
+                "content": assistant_message,
+                "tool_calls": [
+                    {
+                        "id": call["id"],
+                        "type": "function",
+                        "function": {
+                            "name": call.get("name"),
+                            "arguments": json.dumps(call["arguments"], ensure_ascii=False)
+                        }
+                    }
+                    for call in function_calls
+                ]
             }
         else:
             assistant_msg_obj = {
@@ -203,9 +375,6 @@ def run_agent(user_input, csv_file, max_rounds=10, provider=None, api_key=None,
             print(f"模型思考: {reasoning_content[:200]}...")
         
 
-        function_call = parse_function_call(assistant_message, response)
-        
-
         model_thought = reasoning_content if reasoning_content else assistant_message
         
         trace_entry = {
@@ -217,72 +386,99 @@ def run_agent(user_input, csv_file, max_rounds=10, provider=None, api_key=None,
             "conversation": {
                 "user": last_user_message,
                 "assistant": assistant_message
-            }
+            },
+            "context": context_report,
+            "timing": {
+                "llm_seconds": round(llm_seconds, 4),
+                "parse_seconds": round(parse_seconds, 6)
+            },
+            "usage": response.get("usage") or {},
+            "cached": bool(response.get("cached"))
         }
+        if llm_error:
+            trace_entry["llm_error"] = llm_error
         
-        if not function_call:
+        if not function_calls:
             print("未检测到有效的工具调用，继续对话...")
             trace_entry["type"] = "conversation_only"
+            trace_entry["timing"]["round_seconds"] = round(time.perf_counter() - round_timer, 4)
             work_trace.append(trace_entry)
+            if trace_logger:
+                trace_logger.log_round(trace_entry)
+            if checkpoint:
+                checkpoint.append_round(round_num + 1, messages[round_start:], trace_entry)
         
             continue
-        else:
-            trace_entry["type"] = "tool_call"
-            function_name = function_call.get("name")
-            function_args = function_call.get("arguments", {})
-            tool_call_id = str(uuid.uuid4())
-       
-            function_args = ensure_dict(function_args)
-            trace_entry["function"] = function_name
-            trace_entry["arguments"] = function_args
-        
-        print(f"检测到工具调用: {function_name}")
-        print(f"参数: {json.dumps(function_args, ensure_ascii=False, indent=2)}")
         
+        trace_entry["type"] = "tool_call"
+        print(f"检测到 {len(function_calls)} 个工具调用: {', '.join(str(c.get('name')) for c in function_calls)}")
         
-        if function_name == "write_to_csv" and output_file:
-            function_args["file_path"] = output_file
+        # 同一轮的多个工具调用并发执行（流式模式下可能已提前开始执行）
+        futures = []
+        for call in function_calls:
+            print(f"参数({call.get('name')}): {json.dumps(call['arguments'], ensure_ascii=False, indent=2)}")
+            apply_output_override(call.get("name"), call["arguments"], output_file)
+            future = early_results.get(call["id"])
+            if future is None:
+                future = tool_executor.submit(timed_execute_tool, call.get("name"), call["arguments"])
+            futures.append(future)
         
-        tool_result = execute_tool(function_name, function_args)
-        
-        print(f"工具执行结果: {json.dumps(tool_result, ensure_ascii=False, indent=2)}")
-        
-
-        trace_entry["result"] = tool_result
-        work_trace.append(trace_entry)
-        
-   
-        print(f"已记录轮次 {round_num + 1} 的完整信息，包括模型思考、对话内容和工具调用")
-        
-        # 检查是否完成任务
-        if isinstance(tool_result, dict) and tool_result.get("task_finished"):
-            print(f"\n✅ 任务已完成: {tool_result.get('message', '')}")
-     
-            call_id = function_call.get("id") if function_call else str(uuid.uuid4())
+        task_finished = False
+        trace_entry["calls"] = []
+        for call, future in zip(function_calls, futures):
+            tool_result, tool_seconds = future.result()
+            function_name = call.get("name")
+            
+            print(f"工具执行结果({function_name}): {json.dumps(tool_result, ensure_ascii=False, indent=2)}")
+            
+            serialize_timer = time.perf_counter()
+            tool_content = encode_tool_result(tool_result)
+            serialize_seconds = time.perf_counter() - serialize_timer
+            rows_scanned, rows_returned = result_row_counts(tool_result)
+            
+            trace_entry["calls"].append({
+                "id": call["id"],
+                "function": function_name,
+                "arguments": call["arguments"],
+                "result": tool_result,
+                "metrics": {
+                    "tool_seconds": round(tool_seconds, 6),
+                    "serialize_seconds": round(serialize_seconds, 6),
+                    "payload_bytes": len(tool_content.encode("utf-8")),
+                    "rows_scanned": rows_scanned,
+                    "rows_returned": rows_returned
+                }
+            })
+            
+            # 每个结果带上各自的 tool_call_id 返回给模型
             messages.append({
                 "role": function_message_role,
                 "name": function_name,
-                "content": json.dumps(tool_result, ensure_ascii=False, indent=2),
-                "tool_call_id": call_id
+                "content": tool_content,
+                "tool_call_id": call["id"]
             })
-            break
+            
+            # 检查是否完成任务
+            if isinstance(tool_result, dict) and tool_result.get("task_finished"):
+                task_finished = True
+                print(f"\n✅ 任务已完成: {tool_result.get('message', '')}")
         
-        tool_msg = {
-            "role": function_message_role,
-            "name": function_name,
-            "content": json.dumps(tool_result, ensure_ascii=False, indent=2)
-        }
-
- 
-        call_id = function_call.get("id") if function_call else None
-        if not call_id:
-            call_id = str(uuid.uuid4())
-        tool_msg["tool_call_id"] = call_id
-
-        messages.append(tool_msg)
+        trace_entry["timing"]["round_seconds"] = round(time.perf_counter() - round_timer, 4)
+        work_trace.append(trace_entry)
+        if trace_logger:
+            trace_logger.log_round(trace_entry)
+        if checkpoint:
+            checkpoint.append_round(round_num + 1, messages[round_start:], trace_entry)
+        print(f"已记录轮次 {round_num + 1} 的完整信息，包括模型思考、对话内容和工具调用")
+        
+        if task_finished or llm_error:
+            break
         
     else:
-        print(f"\n⚠️  已达到最大轮次限制 ({max_rounds})，任务未完成")
+        if not already_finished:
+            print(f"\n⚠️  已达到最大轮次限制 ({max_rounds})，任务未完成")
+    
+    tool_executor.shutdown(wait=True)
     
 
     print(f"\n{'='*60}")
@@ -307,19 +503,25 @@ def run_agent(user_input, csv_file, max_rounds=10, provider=None, api_key=None,
         
    
         if trace.get('type') == 'tool_call':
-            print(f"  工具名称: {trace.get('function', 'N/A')}")
-            args_preview = json.dumps(trace.get('arguments', {}), ensure_ascii=False)
-            print(f"  工具参数: {args_preview[:150]}{'...' if len(args_preview) > 150 else ''}")
-            print(f"  执行结果: {trace.get('result', {}).get('status', 'unknown')}")
-            if 'message' in trace.get('result', {}):
-                result_msg = trace['result']['message']
-                print(f"  结果消息: {result_msg[:100]}{'...' if len(result_msg) > 100 else ''}")
+            for call in trace.get('calls', []):
+                print(f"  工具名称: {call.get('function', 'N/A')}")
+                args_preview = json.dumps(call.get('arguments', {}), ensure_ascii=False)
+                print(f"  工具参数: {args_preview[:150]}{'...' if len(args_preview) > 150 else ''}")
+                result = call.get('result', {}) if isinstance(call.get('result'), dict) else {}
+                print(f"  执行结果: {result.get('status', 'unknown')}")
+                if 'message' in result:
+                    result_msg = str(result['message'])
+                    print(f"  结果消息: {result_msg[:100]}{'...' if len(result_msg) > 100 else ''}")
     
     print(f"\n{'='*60}")
     print(f"总计记录了 {len(work_trace)} 个对话轮次")
-    tool_calls = sum(1 for trace in work_trace if trace.get('type') == 'tool_call')
-    conversations = len(work_trace) - tool_calls
-    print(f"其中工具调用: {tool_calls} 次，纯对话: {conversations} 次")
+    tool_rounds = sum(1 for trace in work_trace if trace.get('type') == 'tool_call')
+    tool_calls = sum(len(trace.get('calls', [])) for trace in work_trace)
+    conversations = len(work_trace) - tool_rounds
+    print(f"其中工具调用轮次: {tool_rounds} 轮（共 {tool_calls} 次调用），纯对话: {conversations} 次")
+    print(f"{'='*60}")
+    print("性能统计:")
+    print(format_summary(summarize_trace(work_trace)))
     print(f"{'='*60}")
     
     return work_trace
@@ -333,6 +535,14 @@ def main():
     parser.add_argument('--max-rounds', type=int, default=10, help='最大工作轮次 (默认: 10)')
     parser.add_argument('--provider', help='LLM模型名称 ')
     parser.add_argument('--api-key', help='API密钥（也可通过环境变量设置）')
+    parser.add_argument('--stream', action='store_true', help='流式接收模型输出，工具调用参数完整后立即执行')
+    parser.add_argument('--keep-rounds', type=int, default=3, help='消息历史中原样保留的最近轮次数 (默认: 3)')
+    parser.add_argument('--context-budget', type=int, default=60000, help='每次请求的消息token预算 (默认: 60000)')
+    parser.add_argument('--response-cache', help='本地LLM响应缓存目录，相同请求直接复用已记录的响应')
+    parser.add_argument('--checkpoint', help='检查点文件路径（JSONL），每完成一轮追加写入')
+    parser.add_argument('--resume', action='store_true', help='从 --checkpoint 指定的检查点恢复并继续')
+    parser.add_argument('--trace-log', help='结构化轨迹日志路径（JSONL），记录每轮的耗时、行数、负载和token用量')
+    parser.add_argument('--plan-mode', action='store_true', help='计划模式：模型一次提交全部问题的计划，由本地执行并写入')
     
     args = parser.parse_args()
 
@@ -344,6 +554,14 @@ def main():
         print("错误: 必须提供模型名称，请使用 --provider 参数")
         sys.exit(1)
     
+    if args.resume and not args.checkpoint:
+        print("错误: --resume 需要同时指定 --checkpoint")
+        sys.exit(1)
+    
+    llm_call = None
+    if args.response_cache:
+        llm_call = ResponseCache(args.response_cache).wrap(get_llm_response)
+    
     # 运行agent
     try:
         work_trace = run_agent(
@@ -352,13 +570,22 @@ def main():
             max_rounds=args.max_rounds,
             provider=args.provider,
             api_key=args.api_key,
-            output_file=args.output
+            output_file=args.output,
+            llm_call=llm_call,
+            stream=args.stream,
+            history_manager=HistoryManager(args.keep_rounds, args.context_budget),
+            checkpoint_path=args.checkpoint,
+            resume=args.resume,
+            trace_log_path=args.trace_log,
+            plan_mode=args.plan_mode
         )
         
         print(f"\n✅ Agent执行完成！")
         
     except KeyboardInterrupt:
         print(f"\n⚠️  用户中断执行")
+        if args.checkpoint:
+            print(f"已完成的轮次保存在 {args.checkpoint}，可使用 --resume 继续")
         sys.exit(1)
     except Exception as e:
         print(f"\n❌ 执行过程中发生错误: {str(e)}")
@@ -0,0 +1,86 @@
+import hashlib
+import json
+import os
+import threading
+
+from get_llm import DEFAULT_TEMPERATURE
+
+
+def request_key(messages, model, temperature=DEFAULT_TEMPERATURE, tools=None):
+    """
+    计算请求的缓存键：消息、模型、温度和工具描述的规范化JSON的sha256
+
+    Args:
+        messages: 消息列表
+        model: 模型名称
+        temperature: 采样温度
+        tools: 工具描述列表
+
+    Returns:
+        str: 十六进制缓存键
+    """
+    payload = json.dumps(
+        {"model": model, "temperature": temperature, "messages": messages, "tools": tools or []},
+        ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    本地LLM响应缓存：相同请求直接返回已记录的响应，
+    用于崩溃后重跑批量任务时跳过已完成的轮次
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key):
+        """读取缓存的响应，不存在时返回 None"""
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as f:
+                response = json.load(f)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return response
+
+    def put(self, key, response):
+        """写入响应（先写临时文件再替换，避免并发读到半个文件）"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(response, f, ensure_ascii=False, default=str)
+        os.replace(tmp_path, path)
+
+    def wrap(self, llm_call):
+        """
+        包装LLM调用函数：命中缓存时直接返回，只缓存成功的响应
+
+        Args:
+            llm_call: 签名同 get_llm_response 的函数
+
+        Returns:
+            function: 带缓存的调用函数
+        """
+        def cached_call(messages, provider=None, api_key=None, tools=None, *args, **kwargs):
+            key = request_key(messages, provider, DEFAULT_TEMPERATURE, tools)
+            cached = self.get(key)
+            if cached is not None:
+                return {**cached, "cached": True}
+            response = llm_call(messages, provider, api_key, tools, *args, **kwargs)
+            if isinstance(response, dict) and response.get("status") == "success":
+                self.put(key, response)
+            return response
+        return cached_call
@@ -0,0 +1,42 @@
+import pandas as pd
+import pytest
+
+from tools import table_schema
+from tools.csv_filter import filter_csv_data
+from tools.csv_reader import read_csv_info
+from tools.table_cache import clear_table_cache, load_table
+from tools.table_schema import clear_schema_cache, count_rows
+
+CASES = [
+    "a,b\n1,2\n3,4\n\n",
+    "a,b\n1,2\n3,4\r\n\r\n",
+    "a,b\n1,2\n  \n\t\n3,4",
+    "\n\na,b\n1,2\n\n3,4\n",
+    'a,b\n1,"x\n\ny"\n\n2,3\n',
+]
+
+
+@pytest.mark.parametrize("text", CASES)
+@pytest.mark.parametrize("block_bytes", [1, 3, 1024])
+def test_count_rows_skips_blank_lines_like_read_csv(tmp_path, monkeypatch, text, block_bytes):
+    file_path = tmp_path / "table.csv"
+    file_path.write_bytes(text.encode("utf-8"))
+    monkeypatch.setattr(table_schema, "COUNT_BLOCK_BYTES", block_bytes)
+
+    assert count_rows(str(file_path)) == len(pd.read_csv(file_path))
+
+
+def test_row_count_agrees_with_table_and_filter_on_trailing_blank_line(tmp_path, monkeypatch):
+    file_path = tmp_path / "table.csv"
+    file_path.write_text("a,b\n" + "".join(f"{i},{i * 2}\n" for i in range(20)) + "\n", encoding="utf-8")
+    # 样本小于文件行数，行数由 count_rows 统计
+    monkeypatch.setattr(table_schema, "SAMPLE_ROWS", 5)
+    monkeypatch.setattr(table_schema, "PERSIST_SCHEMA", False)
+    clear_schema_cache()
+    clear_table_cache()
+
+    info = read_csv_info(str(file_path))
+    assert info["rows"] == 20
+    assert len(load_table(str(file_path))) == 20
+    assert filter_csv_data(str(file_path), conditions=[{"column": "a", "operator": ">=", "value": 0}],
+                           count_only=True)["original_rows"] == 20
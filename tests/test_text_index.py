@@ -0,0 +1,52 @@
+import pandas as pd
+import pytest
+
+from tools import chunked_engine
+from tools.csv_filter import filter_csv_data
+from tools.table_cache import clear_table_cache
+
+NAMES = ["ΑΣ", "Σ", "abc", "ΟΔΥΣΣΕΥΣ", "ας", "Straße", "STRASSE", "İstanbul", "istanbul", None]
+
+CONDITIONS = [
+    {"operator": "contains", "value": "Σ"},
+    {"operator": "contains", "value": "ς"},
+    {"operator": "contains", "value": "ΑΣ", "case": True},
+    {"operator": "contains", "value": "ας", "case": True},
+    {"operator": "startswith", "value": "σ"},
+    {"operator": "contains", "value": "İ"},
+    {"operator": "contains", "value": "i"},
+    {"operator": "contains", "value": "ß"},
+    {"operator": "contains", "value": "strasse"},
+    {"operator": "startswith", "value": "ST", "case": True},
+]
+
+
+def _names(file_path, condition):
+    result = filter_csv_data(file_path, conditions=[{"column": "name", **condition}], limit=100)
+    assert result["status"] == "success", result
+    return [row["name"] for row in result["filtered_data"]]
+
+
+@pytest.mark.parametrize("condition", CONDITIONS)
+def test_index_and_scan_agree_on_non_ascii_text(tmp_path, monkeypatch, condition):
+    file_path = str(tmp_path / "names.csv")
+    pd.DataFrame({"name": NAMES}).to_csv(file_path, index=False)
+    clear_table_cache()
+
+    # 整表加载走文本索引，分块执行逐块扫描
+    monkeypatch.setattr(chunked_engine, "STREAM_THRESHOLD_MB", "0")
+    indexed = _names(file_path, condition)
+    monkeypatch.setattr(chunked_engine, "STREAM_THRESHOLD_MB", "0.00001")
+    monkeypatch.setattr(chunked_engine, "CHUNK_ROWS", 3)
+    scanned = _names(file_path, condition)
+
+    assert indexed == scanned
+
+
+def test_final_sigma_matches_case_insensitively(tmp_path):
+    file_path = str(tmp_path / "names.csv")
+    pd.DataFrame({"name": NAMES}).to_csv(file_path, index=False)
+    clear_table_cache()
+
+    assert _names(file_path, {"operator": "contains", "value": "Σ"}) == ["ΑΣ", "Σ", "ΟΔΥΣΣΕΥΣ", "ας"]
+    assert _names(file_path, {"operator": "contains", "value": "ΑΣ", "case": True}) == ["ΑΣ"]
@@ -4,14 +4,22 @@ from .csv_reader import read_csv_info, tool_info as reader_info
 from .csv_filter import filter_csv_data, tool_info as filter_info
 from .csv_calculator import calculate_csv_data, tool_info as calculator_info
 from .csv_writer import write_to_csv, tool_info as writer_info
+from .table_profile import profile_csv_table, get_profile, clear_profile_cache, tool_info as profile_info
+from .answer_render import render_answer, tool_info as render_info
+from .qa_plan import execute_qa_plan, tool_info as plan_info
 from .task_done import task_done, tool_info as task_info
+from .table_cache import load_table, set_cache_budget, clear_table_cache, cache_stats
+from .table_schema import get_schema, clear_schema_cache
 
 # 所有工具的映射
 tools_map = {
     "read_csv_info": read_csv_info,
     "filter_csv_data": filter_csv_data,
     "calculate_csv_data": calculate_csv_data,
+    "profile_csv_table": profile_csv_table,
     "write_to_csv": write_to_csv,
+    "render_answer": render_answer,
+    "execute_qa_plan": execute_qa_plan,
     "task_done": task_done
 }
 
@@ -20,7 +28,10 @@ tools_info = [
     reader_info,
     filter_info,
     calculator_info,
+    profile_info,
     writer_info,
+    render_info,
+    plan_info,
     task_info
 ]
 
@@ -50,7 +61,18 @@ __all__ = [
     'filter_csv_data', 
     'write_to_csv',
     'calculate_csv_data',
+    'profile_csv_table',
+    'render_answer',
+    'execute_qa_plan',
     'task_done',
     'get_tool_function',
-    'list_all_tools'
+    'list_all_tools',
+    'load_table',
+    'set_cache_budget',
+    'clear_table_cache',
+    'cache_stats',
+    'get_schema',
+    'clear_schema_cache',
+    'get_profile',
+    'clear_profile_cache'
 ]
\ No newline at end of file
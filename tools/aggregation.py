@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+
+from .query_planner import PlannerError
+
+OPERATIONS = ("sum", "avg", "count", "min", "max")
+# 数值型计算（count 统计行数，不要求数值列）
+NUMERIC_OPERATIONS = ("sum", "avg", "min", "max")
+
+# 部分结果中的行数列
+ROWS = "__rows__"
+
+
+def normalize_metrics(metrics):
+    """
+    规范化计算指标：[{"column": 列名, "operation": 操作}, ...]，也接受 [列名, 操作] 形式
+
+    Returns:
+        list: (列名, 操作) 列表
+    """
+    if not isinstance(metrics, list) or not metrics:
+        raise PlannerError("metrics参数必须是非空列表，每项为 {\"column\": 列名, \"operation\": 操作}")
+    result = []
+    for metric in metrics:
+        if isinstance(metric, dict):
+            column, operation = metric.get("column"), metric.get("operation")
+        elif isinstance(metric, (list, tuple)) and len(metric) == 2:
+            column, operation = metric
+        else:
+            raise PlannerError("metrics中的每项必须是 {\"column\": 列名, \"operation\": 操作}")
+        if operation not in OPERATIONS:
+            raise PlannerError(f"不支持的操作: {operation}")
+        if (column, operation) not in result:
+            result.append((column, operation))
+    return result
+
+
+def metric_name(column, operation):
+    """结果中指标的名称，例如 avg(获奖年份)"""
+    return f"{operation}({column})"
+
+
+def _numeric(series):
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return series
+    return pd.to_numeric(series, errors='coerce')
+
+
+def partial_stats(frame, group_by, value_columns):
+    """
+    一次 groupby 计算每组的行数及各数值列的 sum/count/min/max（部分结果，可合并）
+
+    Args:
+        frame: 已筛选的数据（整表或一个分块）
+        group_by: 分组列（为空时整体作为一组）
+        value_columns: 需要计算的数值列
+
+    Returns:
+        DataFrame: 以分组键为索引的部分结果
+    """
+    if not group_by:
+        # 不分组时直接按列计算，省去 groupby 的开销
+        row = {ROWS: len(frame)}
+        for i, column in enumerate(value_columns):
+            numeric = _numeric(frame[column])
+            row[f"v{i}_sum"] = numeric.sum()
+            row[f"v{i}_count"] = numeric.count()
+            row[f"v{i}_min"] = numeric.min()
+            row[f"v{i}_max"] = numeric.max()
+        return pd.DataFrame([row], index=[0])
+
+    data = {ROWS: np.ones(len(frame), dtype=np.int64)}
+    for i, column in enumerate(value_columns):
+        data[f"v{i}"] = _numeric(frame[column]).to_numpy()
+    work = pd.DataFrame(data, index=frame.index)
+    keys = [frame[column] for column in group_by]
+
+    named = {ROWS: (ROWS, "sum")}
+    for i in range(len(value_columns)):
+        for stat in ("sum", "count", "min", "max"):
+            named[f"v{i}_{stat}"] = (f"v{i}", stat)
+    return work.groupby(keys, sort=False, dropna=False).agg(**named)
+
+
+def merge_partials(partials):
+    """合并多个部分结果（分块执行时每块一个）"""
+    partials = [p for p in partials if len(p)]
+    if not partials:
+        return None
+    if len(partials) == 1:
+        return partials[0]
+    combined = pd.concat(partials)
+    how = {column: ("sum" if column == ROWS or column.endswith(("_sum", "_count")) else column.rsplit("_", 1)[1])
+           for column in combined.columns}
+    levels = list(range(combined.index.nlevels))
+    return combined.groupby(level=levels, sort=False, dropna=False).agg(how)
+
+
+def finalize(stats, metrics, value_columns):
+    """
+    由合并后的部分结果计算各指标
+
+    Args:
+        stats: merge_partials 的结果（可为 None，表示没有命中行）
+        metrics: (列名, 操作) 列表
+        value_columns: partial_stats 使用的数值列顺序
+
+    Returns:
+        tuple: (指标 DataFrame（以分组键为索引）, 各数值列的有效值总数)
+    """
+    if stats is None:
+        return None, {column: 0 for column in value_columns}
+    result = pd.DataFrame(index=stats.index)
+    for column, operation in metrics:
+        name = metric_name(column, operation)
+        if operation == "count":
+            result[name] = stats[ROWS]
+            continue
+        i = value_columns.index(column)
+        if operation == "sum":
+            result[name] = stats[f"v{i}_sum"]
+        elif operation == "avg":
+            result[name] = stats[f"v{i}_sum"] / stats[f"v{i}_count"].where(stats[f"v{i}_count"] > 0)
+        else:
+            result[name] = stats[f"v{i}_{operation}"]
+    valid = {column: int(stats[f"v{i}_count"].sum()) for i, column in enumerate(value_columns)}
+    return result, valid
@@ -0,0 +1,259 @@
+import numpy as np
+import pandas as pd
+
+from .csv_writer import write_to_csv
+from .qa_verify import answer_order, answer_rows
+from .query_planner import PlannerError
+from .result_store import get_result, save_result
+
+# 答案表格的最大行数（更多的行不适合作为一条问答的答案）
+MAX_ANSWER_ROWS = 200
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return [value]
+
+
+def answer_size_error(filtered_rows, limit=None):
+    """命中行数不适合作为答案时返回错误信息（没有问题时返回 None）"""
+    if filtered_rows == 0:
+        return "筛选条件没有命中任何行，请调整条件"
+    if filtered_rows > MAX_ANSWER_ROWS and limit is None:
+        return f"命中{filtered_rows}行，超过答案行数上限{MAX_ANSWER_ROWS}，请收紧条件或指定limit"
+    return None
+
+
+def _format_column(series):
+    """单元格转为展示文本：缺失值为空，整数值的浮点数去掉小数位（1921.0 -> 1921）"""
+    if pd.api.types.is_float_dtype(series):
+        return series.map(lambda v: "" if pd.isna(v) else format(v, ".15g"))
+    return series.astype(object).where(series.notna(), "").astype(str)
+
+
+def shape_answer(rows, columns=None, rename=None, value_map=None, sort_by=None, ascending=True, limit=None):
+    """
+    按输出要求整理答案行：排序、截取、格式化、取值映射、选列和重命名
+
+    Args:
+        rows: 命中的行（DataFrame）
+        columns: 输出的列及顺序（默认全部列）
+        rename: 列名 -> 表头（例如 {"获奖年份": "年份"}）
+        value_map: 列名 -> {原值: 新值}（例如 {"奖牌": {"Gold": "金牌"}}）
+        sort_by: 排序列（可多列，按原始取值排序）
+        ascending: 是否升序（可为与 sort_by 对应的列表）
+        limit: 最多输出的行数
+
+    Returns:
+        DataFrame: 全部为文本的答案表格
+    """
+    columns = _as_list(columns) or list(rows.columns)
+    sort_by = _as_list(sort_by)
+    rename = rename or {}
+    value_map = value_map or {}
+    if not isinstance(rename, dict) or not isinstance(value_map, dict):
+        raise PlannerError("rename和value_map必须是对象，键为列名")
+    for col in list(columns) + sort_by + list(rename) + list(value_map):
+        if col not in rows.columns:
+            raise PlannerError(f"列 '{col}' 不存在于文件中")
+
+    if sort_by or limit is not None:
+        rows = rows.iloc[answer_order(rows, sort_by, ascending, limit)]
+
+    table = pd.DataFrame(index=rows.index)
+    for col in columns:
+        text = _format_column(rows[col])
+        mapping = value_map.get(col)
+        if mapping:
+            if not isinstance(mapping, dict):
+                raise PlannerError(f"value_map中列 '{col}' 的映射必须是对象")
+            text = text.map(lambda v: mapping.get(v, v))
+        table[rename.get(col, col)] = text.astype(str)
+    return table.reset_index(drop=True)
+
+
+def _escape(value):
+    return str(value).replace("|", "\\|").replace("\r", " ").replace("\n", " ")
+
+
+def to_markdown(table):
+    """
+    答案表格渲染为markdown（包在 ```markdown 代码块中，与已有问答的格式一致）
+
+    Args:
+        table: shape_answer 得到的表格
+
+    Returns:
+        str: markdown文本
+    """
+    lines = ["| " + " | ".join(_escape(col) for col in table.columns) + " |",
+             "| " + " | ".join(":---" for _ in table.columns) + " |"]
+    for row in table.itertuples(index=False, name=None):
+        lines.append("| " + " | ".join(_escape(value) for value in row) + " |")
+    return "```markdown\n" + "\n".join(lines) + "\n```"
+
+
+def answer_ordering(sort_by=None, ascending=True, limit=None):
+    """答案的排序和截取要求，随答案句柄记录到答案来源中（不排序也不截取时为 None）"""
+    sort_by = _as_list(sort_by)
+    if not sort_by and limit is None:
+        return None
+    ordering = {"limit": limit}
+    if sort_by:
+        ordering.update({"sort_by": sort_by, "ascending": ascending})
+    return ordering
+
+
+def render_answer(result_id, columns=None, rename=None, value_map=None, sort_by=None, ascending=True,
+                  limit=None, query=None, output_file=None):
+    """
+    由筛选结果句柄直接生成markdown表格答案，提供问题文本时直接写入输出文件
+
+    Args:
+        result_id: filter_csv_data 返回的结果句柄
+        columns: 答案表格的列及顺序（源表列名，默认全部列）
+        rename: 列名 -> 答案表头
+        value_map: 列名 -> {原值: 新值}
+        sort_by: 排序列（按原始取值排序）
+        ascending: 是否升序
+        limit: 答案最多保留的行数
+        query: 问题文本（可选，提供时把问答写入 output_file）
+        output_file: 问答写入的CSV文件路径
+
+    Returns:
+        dict: 命中行数、答案行数；未写入时返回markdown答案，写入时返回写入和校验结果
+    """
+    try:
+        stored = get_result(result_id)
+        if stored is None:
+            return {
+                "status": "error",
+                "message": f"结果句柄 '{result_id}' 不存在或源文件已变更，请重新筛选"
+            }
+        if query and not output_file:
+            return {
+                "status": "error",
+                "message": "写入问答时必须提供output_file"
+            }
+        if limit is not None:
+            try:
+                limit = int(limit)
+            except (TypeError, ValueError):
+                return {
+                    "status": "error",
+                    "message": "limit必须是整数"
+                }
+            # 答案行数上限同样约束调用方给出的 limit
+            limit = min(limit, MAX_ANSWER_ROWS)
+
+        filtered_rows = int(len(stored.positions))
+        problem = answer_size_error(filtered_rows, limit)
+        if problem:
+            return {
+                "status": "error",
+                "filtered_rows": filtered_rows,
+                "message": problem
+            }
+
+        sort_by = _as_list(sort_by)
+        try:
+            kept, union, rows = answer_rows(stored.file_path, [{
+                "positions": stored.positions, "columns": _as_list(columns),
+                "sort_by": sort_by, "ascending": ascending, "limit": limit}])
+            positions = kept[0]
+            if isinstance(positions, PlannerError):
+                raise positions
+            table = shape_answer(rows.iloc[np.searchsorted(union, positions)], columns, rename, value_map)
+        except PlannerError as e:
+            return {
+                "status": "error",
+                "message": str(e)
+            }
+        answer = to_markdown(table)
+
+        result = {
+            "status": "success",
+            "filtered_rows": filtered_rows,
+            "answer_rows": len(table)
+        }
+        if not query:
+            result["answer"] = answer
+            return result
+
+        # 写入时使用答案自己的句柄：只含排序截取后保留的行，并记录排序截取要求，校验不会把截掉的行计为漏答
+        ordering = answer_ordering(sort_by, ascending, limit)
+        if ordering:
+            result_id = save_result(stored.file_path, positions, stored.conditions, stored.n_rows, ordering)
+        written = write_to_csv(output_file, query, answer, result_id)
+        result["status"] = written["status"]
+        for key in ("message", "duplicate", "verification"):
+            if key in written:
+                result[key] = written[key]
+        return result
+
+    except FileNotFoundError:
+        return {
+            "status": "error",
+            "message": f"文件未找到: {stored.file_path}"
+        }
+    except Exception as e:
+        return {
+            "status": "error",
+            "message": f"生成答案时发生错误: {str(e)}"
+        }
+
+
+# 工具信息
+tool_info = {
+    "name": "render_answer",
+    "description": "由筛选结果句柄直接生成markdown表格答案，支持选列、重命名表头、取值改写（如Gold→金牌）、排序和截取；"
+                   "同时提供query和output_file时直接把问答写入输出文件，不需要再手写答案调用write_to_csv",
+    "function": render_answer,
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "result_id": {
+                "type": "string",
+                "description": "filter_csv_data返回的结果句柄"
+            },
+            "columns": {
+                "type": "array",
+                "description": "答案表格的列及顺序（源表列名，默认全部列）",
+                "items": {"type": "string"}
+            },
+            "rename": {
+                "type": "object",
+                "description": "列名 -> 答案表头，例如 {\"获奖年份\": \"年份\"}"
+            },
+            "value_map": {
+                "type": "object",
+                "description": "列名 -> {原值: 新值}，例如 {\"奖牌\": {\"Gold\": \"金牌\"}}"
+            },
+            "sort_by": {
+                "type": "array",
+                "description": "排序列（可选，按原始取值排序）",
+                "items": {"type": "string"}
+            },
+            "ascending": {
+                "type": "boolean",
+                "description": "是否升序（默认true）"
+            },
+            "limit": {
+                "type": "integer",
+                "description": "答案最多保留的行数（命中超过200行时必须提供，最多200）"
+            },
+            "query": {
+                "type": "string",
+                "description": "问题文本（可选，提供时把问答写入output_file，否则只返回答案预览）"
+            },
+            "output_file": {
+                "type": "string",
+                "description": "问答写入的CSV文件路径"
+            }
+        },
+        "required": ["result_id"]
+    }
+}
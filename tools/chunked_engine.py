@@ -0,0 +1,256 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from .aggregation import merge_partials, partial_stats
+from .query_planner import PlannerError, condition_columns, execute_conditions
+from .table_cache import cache_stats
+from .table_schema import get_schema
+
+# 每块读取的行数，可通过环境变量 TABLE_CHUNK_ROWS 覆盖
+CHUNK_ROWS = int(os.getenv("TABLE_CHUNK_ROWS", "200000"))
+# CSV 文件超过该大小（MB）时改用分块执行；未设置时取表格缓存的内存预算，设为 0 则始终整表加载
+STREAM_THRESHOLD_MB = os.getenv("TABLE_STREAM_THRESHOLD_MB")
+
+
+def use_streaming(file_path):
+    """
+    判断该文件是否应分块执行（文件大于阈值，整表放进缓存不现实）
+
+    Args:
+        file_path: CSV文件路径
+
+    Returns:
+        bool: 是否分块执行
+    """
+    if STREAM_THRESHOLD_MB is None:
+        threshold = cache_stats()["max_bytes"]
+    else:
+        threshold = float(STREAM_THRESHOLD_MB) * 1024 * 1024
+        if threshold <= 0:
+            return False
+    return os.path.getsize(file_path) > threshold
+
+
+def read_header(file_path):
+    """只读取表头，返回列名列表"""
+    return list(pd.read_csv(file_path, nrows=0).columns)
+
+
+def fixed_dtypes(file_path):
+    """
+    分块读取使用的固定列类型，由表格schema一次得到，各块按同一类型解析
+
+    schema来自整表时固定所有文本、数值和布尔列；只来自前缀样本时只固定文本列
+    （样本中出现文本的列整列都是文本，数值列的缺失值或文本可能只出现在样本之后）
+
+    Args:
+        file_path: CSV文件路径
+
+    Returns:
+        dict: 列名 -> dtype
+    """
+    schema = get_schema(file_path)
+    exact = schema.get("dtype_source") != "sample"
+    dtypes = {}
+    for col, name in schema["data_types"].items():
+        if name in ("object", "str", "string"):
+            dtypes[col] = str
+        elif exact and (name == "bool" or name.startswith(("int", "float"))):
+            dtypes[col] = name
+    return dtypes
+
+
+def iter_chunks(file_path, usecols=None, chunk_rows=None, dtype=None):
+    """
+    分块读取CSV，只解析 usecols 中的列
+
+    Args:
+        file_path: CSV文件路径
+        usecols: 读取的列（默认全部列）
+        chunk_rows: 每块行数（默认 CHUNK_ROWS）
+        dtype: 列名 -> 固定的列类型（见 fixed_dtypes，默认逐块推断）
+
+    Yields:
+        tuple: (该块第一行的全局行号, DataFrame)
+    """
+    if dtype and usecols is not None:
+        dtype = {col: kind for col, kind in dtype.items() if col in set(usecols)}
+    start = 0
+    reader = pd.read_csv(file_path, usecols=usecols, chunksize=chunk_rows or CHUNK_ROWS, dtype=dtype or None)
+    with reader:
+        for chunk in reader:
+            # 行号统一为全局行号，与整表加载时的位置一致
+            chunk.index = pd.RangeIndex(start, start + len(chunk))
+            yield start, chunk
+            start += len(chunk)
+
+
+def _ordered_columns(header, wanted):
+    wanted = set(wanted)
+    return [col for col in header if col in wanted]
+
+
+def _check_columns(header, columns):
+    for col in columns:
+        if col not in header:
+            raise PlannerError(f"列 '{col}' 不存在于文件中")
+
+
+def stream_filter(file_path, conditions, columns=None, offset=0, limit=0, header=None, profile=None):
+    """
+    分块筛选：每块编译并执行条件，只保留命中行号和落在当前页内的行
+
+    Args:
+        file_path: CSV文件路径
+        conditions: 条件列表（与 filter_csv_data 相同）
+        columns: 当前页返回的列（默认全部列）
+        offset: 当前页起始的命中序号
+        limit: 当前页行数，为 0 时不物化任何行（只计数）
+        header: 已读取的表头（可选）
+        profile: 表格画像（可选），用于估计条件的选择率
+
+    Returns:
+        tuple: (升序命中行号, 文件总行数, 当前页 DataFrame)
+    """
+    header = header or read_header(file_path)
+    cond_columns = condition_columns(conditions)
+    _check_columns(header, cond_columns)
+    out_columns = list(columns) if columns else header
+    usecols = _ordered_columns(header, cond_columns + (out_columns if limit else []))
+
+    hits = []
+    page_parts = []
+    seen = 0
+    total_rows = 0
+    for start, chunk in iter_chunks(file_path, usecols, dtype=fixed_dtypes(file_path)):
+        total_rows += len(chunk)
+        # 分块上不使用整表索引，每块独立编译
+        local = execute_conditions(None, chunk, conditions, profile)
+        if len(local):
+            hits.append(local + start)
+            page_lo = max(offset - seen, 0)
+            page_hi = min(offset + limit - seen, len(local))
+            if page_lo < page_hi:
+                page_parts.append(chunk.iloc[local[page_lo:page_hi]][out_columns])
+            seen += len(local)
+
+    positions = np.concatenate(hits) if hits else np.empty(0, dtype=np.int64)
+    page_df = pd.concat(page_parts) if page_parts else pd.DataFrame(columns=out_columns)
+    return positions, total_rows, page_df
+
+
+def stream_filter_many(file_path, condition_sets, header=None):
+    """
+    一次分块扫描同时执行多组条件，只读取条件列、只保留命中行号（内存只取决于块大小和命中数）
+
+    各块按表头schema得到的固定列类型解析，同一组条件在各块上的比较语义一致；
+    需要的行由调用方按行号另行读取（见 read_rows）
+
+    Args:
+        file_path: CSV文件路径
+        condition_sets: 键 -> 条件列表
+        header: 已读取的表头（可选）
+
+    Returns:
+        tuple: (键 -> 升序命中行号或 PlannerError, 文件总行数)
+    """
+    header = header or read_header(file_path)
+    hits = {}
+    wanted = []
+    for key, conditions in condition_sets.items():
+        columns = condition_columns(conditions)
+        try:
+            _check_columns(header, columns)
+        except PlannerError as e:
+            hits[key] = e
+            continue
+        hits[key] = []
+        wanted.extend(columns)
+    # 所有条件都出错时也至少读取一列，用于统计总行数
+    usecols = _ordered_columns(header, wanted) or header[:1]
+
+    total_rows = 0
+    for start, chunk in iter_chunks(file_path, usecols, dtype=fixed_dtypes(file_path)):
+        total_rows += len(chunk)
+        for key, conditions in condition_sets.items():
+            if isinstance(hits[key], PlannerError):
+                continue
+            try:
+                positions = execute_conditions(None, chunk, conditions)
+            except PlannerError as e:
+                hits[key] = e
+                continue
+            if len(positions):
+                hits[key].append(positions + start)
+    for key, found in hits.items():
+        if not isinstance(found, PlannerError):
+            hits[key] = np.concatenate(found) if found else np.empty(0, dtype=np.int64)
+    return hits, total_rows
+
+
+def read_rows(file_path, positions, columns=None, header=None):
+    """
+    按全局行号分块取出若干行（用于结果句柄翻页），读到最后一个行号所在的块即停止
+
+    Args:
+        file_path: CSV文件路径
+        positions: 行号（不要求升序，排序截取后的答案句柄按答案顺序保存行号）
+        columns: 返回的列（默认全部列）
+        header: 已读取的表头（可选）
+
+    Returns:
+        DataFrame: 对应的行（与 positions 顺序一致）
+    """
+    header = header or read_header(file_path)
+    out_columns = list(columns) if columns else header
+    if len(positions) == 0:
+        return pd.DataFrame(columns=out_columns)
+    positions = np.asarray(positions)
+    order = None
+    if np.any(positions[1:] < positions[:-1]):
+        order = np.argsort(positions, kind='stable')
+        positions = positions[order]
+    parts = []
+    last = positions[-1]
+    for start, chunk in iter_chunks(file_path, _ordered_columns(header, out_columns), dtype=fixed_dtypes(file_path)):
+        lo, hi = np.searchsorted(positions, [start, start + len(chunk)])
+        if lo < hi:
+            parts.append(chunk.iloc[positions[lo:hi] - start][out_columns])
+        if start + len(chunk) > last:
+            break
+    rows = pd.concat(parts) if parts else pd.DataFrame(columns=out_columns)
+    if order is not None:
+        rows = rows.iloc[np.argsort(order)]
+    return rows
+
+
+def stream_partials(file_path, conditions, group_by, value_columns, header=None, profile=None):
+    """
+    分块分组聚合：只读取条件列、分组列和计算列，每块筛选后计算部分结果，最后合并
+
+    Args:
+        file_path: CSV文件路径
+        conditions: 条件列表（可为空）
+        group_by: 分组列
+        value_columns: 计算列
+        header: 已读取的表头（可选）
+        profile: 表格画像（可选），用于估计条件的选择率
+
+    Returns:
+        DataFrame | None: 合并后的部分结果（见 aggregation.partial_stats），没有命中行时为 None
+    """
+    header = header or read_header(file_path)
+    cond_columns = condition_columns(conditions) if conditions else []
+    _check_columns(header, cond_columns)
+    # 只统计行数时也至少读取一列
+    usecols = _ordered_columns(header, cond_columns + list(group_by) + list(value_columns)) or header[:1]
+
+    partials = []
+    for _, chunk in iter_chunks(file_path, usecols, dtype=fixed_dtypes(file_path)):
+        if conditions:
+            chunk = chunk.iloc[execute_conditions(None, chunk, conditions, profile)]
+        if len(chunk):
+            partials.append(partial_stats(chunk, group_by, value_columns))
+    return merge_partials(partials)
@@ -1,77 +1,152 @@
-import pandas as pd
+import json
 
-def calculate_csv_data(file_path, column, operation, filter_column=None, filter_value=None):
+import numpy as np
+
+from .table_cache import load_table
+from .aggregation import ROWS, NUMERIC_OPERATIONS, finalize, metric_name, normalize_metrics, partial_stats
+from .chunked_engine import read_header, stream_partials, use_streaming
+from .query_planner import PlannerError, execute_conditions
+from .table_profile import cached_profile
+
+# 分组结果默认返回的组数与上限
+DEFAULT_TOP_K = 20
+MAX_TOP_K = 1000
+
+
+def _records(frame):
+    # 经JSON往返，numpy 标量转为 Python 类型，缺失值转为 null
+    return json.loads(frame.to_json(orient='records', force_ascii=False, double_precision=15))
+
+
+def calculate_csv_data(file_path, column=None, operation=None, filter_column=None, filter_value=None,
+                       metrics=None, conditions=None, group_by=None, top_k=DEFAULT_TOP_K, sort_by=None,
+                       ascending=False):
     """
-    对CSV数据进行计算操作
+    对CSV数据进行计算操作，支持多指标、多条件和分组聚合（一次扫描完成）
     
     Args:
         file_path: CSV文件路径
-        column: 要计算的列名
+        column: 要计算的列名（单指标写法）
         operation: 计算操作（sum, avg, count, min, max）
-        filter_column: 筛选列名（可选）
+        filter_column: 筛选列名（可选，等值筛选，向后兼容）
         filter_value: 筛选值（可选）
+        metrics: 多指标列表，每项为 {"column": 列名, "operation": 操作}
+        conditions: 与 filter_csv_data 相同的条件列表
+        group_by: 分组列（字符串或列表）
+        top_k: 分组时返回的组数（默认20，上限1000）
+        sort_by: 分组排序使用的指标名（如 "count(获奖年份)"，默认第一个指标）
+        ascending: 分组是否升序排列（默认降序）
         
     Returns:
         dict: 包含计算结果的字典
     """
     try:
-        # 读取CSV文件
-        df = pd.read_csv(file_path)
-        
-        # 检查列是否存在
-        if column not in df.columns:
+        single = metrics is None
+        if single:
+            if not column or not operation:
+                return {
+                    "status": "error",
+                    "message": "必须提供column和operation参数，或metrics参数"
+                }
+            metrics = [{"column": column, "operation": operation}]
+        if isinstance(group_by, str):
+            group_by = [group_by]
+        group_by = list(group_by or [])
+        try:
+            metrics = normalize_metrics(metrics)
+            top_k = min(int(top_k if top_k is not None else DEFAULT_TOP_K), MAX_TOP_K)
+        except (TypeError, ValueError) as e:
             return {
                 "status": "error",
-                "message": f"列 '{column}' 不存在于文件中"
+                "message": str(e) if isinstance(e, PlannerError) else "top_k必须是整数"
             }
         
-        # 如果有筛选条件，先进行筛选
+        # 大文件分块执行，其余通过共享缓存读取CSV文件
+        streaming = use_streaming(file_path)
+        if streaming:
+            df = None
+            all_columns = read_header(file_path)
+        else:
+            df = load_table(file_path)
+            all_columns = list(df.columns)
+        
+        # 检查列是否存在
+        for col in [c for c, _ in metrics] + group_by:
+            if col not in all_columns:
+                return {
+                    "status": "error",
+                    "message": f"列 '{col}' 不存在于文件中"
+                }
+        
+        # 单个等值筛选（向后兼容）并入条件列表
+        conditions = list(conditions or [])
         if filter_column and filter_value:
-            if filter_column not in df.columns:
+            if filter_column not in all_columns:
                 return {
                     "status": "error",
                     "message": f"筛选列 '{filter_column}' 不存在于文件中"
                 }
-            df = df[df[filter_column] == filter_value]
+            conditions.append({"column": filter_column, "operator": "=", "value": filter_value})
+        
+        value_columns = []
+        for col, op in metrics:
+            if op in NUMERIC_OPERATIONS and col not in value_columns:
+                value_columns.append(col)
+        
+        # 一次分组聚合同时得到所有指标的部分结果
+        profile = cached_profile(file_path) if conditions else None
+        try:
+            if streaming:
+                stats = stream_partials(file_path, conditions, group_by, value_columns, all_columns, profile)
+            else:
+                frame = df
+                if conditions:
+                    frame = df.iloc[execute_conditions(file_path, df, conditions, profile)]
+                stats = partial_stats(frame, group_by, value_columns) if len(frame) else None
+        except PlannerError as e:
+            return {
+                "status": "error",
+                "message": str(e)
+            }
+        result_frame, valid = finalize(stats, metrics, value_columns)
         
         # 检查数据类型是否适合数值计算
-        if operation in ['sum', 'avg', 'min', 'max']:
-            try:
-                numeric_data = pd.to_numeric(df[column], errors='coerce')
-                if numeric_data.isna().all():
-                    return {
-                        "status": "error",
-                        "message": f"列 '{column}' 不包含有效的数值数据"
-                    }
-            except:
+        for col in value_columns:
+            if valid[col] == 0:
                 return {
                     "status": "error",
-                    "message": f"列 '{column}' 无法进行数值计算"
+                    "message": f"列 '{col}' 不包含有效的数值数据"
                 }
         
-        # 执行计算操作
-        if operation == "sum":
-            result = float(pd.to_numeric(df[column], errors='coerce').sum())
-        elif operation == "avg":
-            result = float(pd.to_numeric(df[column], errors='coerce').mean())
-        elif operation == "count":
-            result = int(len(df[column]))
-        elif operation == "min":
-            result = float(pd.to_numeric(df[column], errors='coerce').min())
-        elif operation == "max":
-            result = float(pd.to_numeric(df[column], errors='coerce').max())
-        else:
+        filtered_rows = int(stats[ROWS].sum()) if stats is not None else 0
+        
+        if group_by:
+            return _grouped_result(result_frame, metrics, group_by, filtered_rows, top_k, sort_by, ascending)
+        
+        values = {}
+        for col, op in metrics:
+            name = metric_name(col, op)
+            if result_frame is None:
+                values[name] = 0 if op == "count" else None
+            else:
+                value = result_frame[name].iloc[0]
+                values[name] = int(value) if op == "count" else (None if np.isnan(value) else float(value))
+        
+        if single:
             return {
-                "status": "error",
-                "message": f"不支持的操作: {operation}"
+                "status": "success",
+                "operation": operation,
+                "column": column,
+                "result": values[metric_name(column, operation)],
+                "filtered_rows": filtered_rows if conditions or filter_column else None
             }
-        
         return {
             "status": "success",
-            "operation": operation,
-            "column": column,
-            "result": result,
-            "filtered_rows": int(len(df)) if filter_column else None
+            "filtered_rows": filtered_rows,
+            "results": [
+                {"column": col, "operation": op, "result": values[metric_name(col, op)]}
+                for col, op in metrics
+            ]
         }
         
     except FileNotFoundError:
@@ -85,10 +160,40 @@ def calculate_csv_data(file_path, column, operation, filter_column=None, filter_
             "message": f"计算数据时发生错误: {str(e)}"
         }
 
+
+def _grouped_result(result_frame, metrics, group_by, filtered_rows, top_k, sort_by, ascending):
+    """按指标排序并截取前 top_k 组"""
+    names = [metric_name(col, op) for col, op in metrics]
+    sort_by = sort_by or names[0]
+    if sort_by not in names:
+        return {
+            "status": "error",
+            "message": f"sort_by必须是计算的指标之一: {', '.join(names)}"
+        }
+    if result_frame is None:
+        groups = []
+        group_count = 0
+    else:
+        group_count = len(result_frame)
+        top = result_frame.sort_values(sort_by, ascending=bool(ascending), na_position='last', kind='stable')
+        top = top.head(top_k)
+        top.index.names = group_by
+        groups = _records(top.reset_index())
+    return {
+        "status": "success",
+        "group_by": group_by,
+        "metrics": names,
+        "sort_by": sort_by,
+        "filtered_rows": filtered_rows,
+        "group_count": group_count,
+        "returned_groups": len(groups),
+        "groups": groups
+    }
+
 # 工具信息
 tool_info = {
     "name": "calculate_csv_data",
-    "description": "对CSV数据进行计算操作（求和、平均值、计数等）",
+    "description": "对CSV数据进行计算操作（求和、平均值、计数等），支持多指标、多条件筛选和分组统计，一次调用完成",
     "function": calculate_csv_data,
     "parameters": {
         "type": "object",
@@ -99,22 +204,64 @@ tool_info = {
             },
             "column": {
                 "type": "string",
-                "description": "要计算的列名"
+                "description": "要计算的列名（单指标写法）"
             },
             "operation": {
                 "type": "string",
                 "description": "计算操作（sum, avg, count, min, max）",
                 "enum": ["sum", "avg", "count", "min", "max"]
             },
+            "metrics": {
+                "type": "array",
+                "description": "多个指标，一次计算完成；结果中指标名为 操作(列名)，如 avg(获奖年份)",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "column": {"type": "string", "description": "要计算的列名"},
+                        "operation": {
+                            "type": "string",
+                            "description": "计算操作",
+                            "enum": ["sum", "avg", "count", "min", "max"]
+                        }
+                    },
+                    "required": ["column", "operation"]
+                }
+            },
+            "conditions": {
+                "type": "array",
+                "description": "筛选条件，格式与 filter_csv_data 的 conditions 相同",
+                "items": {"type": "object"}
+            },
+            "group_by": {
+                "type": "array",
+                "description": "分组列，按这些列的取值组合分别计算指标",
+                "items": {"type": "string"}
+            },
+            "top_k": {
+                "type": "integer",
+                "description": "分组时返回的组数（默认20，上限1000），返回结果中的 group_count 为总组数"
+            },
+            "sort_by": {
+                "type": "string",
+                "description": "分组排序使用的指标名（默认第一个指标）"
+            },
+            "ascending": {
+                "type": "boolean",
+                "description": "分组是否升序排列（默认降序）"
+            },
             "filter_column": {
                 "type": "string",
-                "description": "筛选列名（可选）"
+                "description": "筛选列名（可选，等值筛选，向后兼容）"
             },
             "filter_value": {
                 "type": "string",
                 "description": "筛选值（可选）"
             }
         },
-        "required": ["file_path", "column", "operation"]
+        "required": ["file_path"],
+        "anyOf": [
+            {"required": ["column", "operation"]},
+            {"required": ["metrics"]}
+        ]
     }
-}
\ No newline at end of file
+}
@@ -1,117 +1,143 @@
-import pandas as pd
+import os
 
-def filter_csv_data(file_path, conditions=None, column=None, operator=None, value=None):
+from .table_cache import load_table
+from .chunked_engine import read_header, read_rows, stream_filter, use_streaming
+from .query_planner import PlannerError, execute_conditions
+from .result_store import get_result, save_result
+from .table_profile import cached_profile
+
+# 单次返回的默认行数与上限，避免宽泛筛选撑爆消息历史
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+def filter_csv_data(file_path, conditions=None, column=None, operator=None, value=None,
+                    columns=None, limit=DEFAULT_LIMIT, offset=0, count_only=False, result_id=None):
     """
-    根据条件筛选CSV数据（支持单条件或多条件）
+    根据条件筛选CSV数据（支持单条件或多条件），结果分页返回
     
     Args:
         file_path: CSV文件路径
-        conditions: 多条件列表，每个条件为字典{"column":列名, "operator":操作符, "value":值}
+        conditions: 多条件列表（AND关系），每个条件为字典{"column":列名, "operator":操作符, "value":值}，
+            或 {"any": [...]} 表示OR条件组
         column: 单个筛选的列名（向后兼容）
         operator: 单个筛选的操作符（向后兼容）
         value: 单个筛选的值（向后兼容）
+        columns: 返回的列（可选，默认全部列）
+        limit: 本次最多返回的行数（默认100，上限1000）
+        offset: 从第几条命中记录开始返回
+        count_only: 为True时只返回命中行数
+        result_id: 之前筛选返回的结果句柄，提供时直接翻页，不重新执行筛选
         
     Returns:
         dict: 包含筛选结果的字典
     """
     try:
-        # 读取CSV文件
-        df = pd.read_csv(file_path)
+        # 大文件分块执行，其余通过共享缓存读取CSV文件
+        streaming = use_streaming(file_path)
+        if streaming:
+            df = None
+            all_columns = read_header(file_path)
+        else:
+            df = load_table(file_path)
+            all_columns = list(df.columns)
+        
+        try:
+            limit = min(int(limit if limit is not None else DEFAULT_LIMIT), MAX_LIMIT)
+            offset = int(offset or 0)
+        except (TypeError, ValueError):
+            return {
+                "status": "error",
+                "message": "limit和offset必须是整数"
+            }
+        if limit < 0 or offset < 0:
+            return {
+                "status": "error",
+                "message": "limit和offset不能为负数"
+            }
         
-        # 构建条件列表（支持向后兼容）
-        if conditions:
-            # 多条件模式
-            if not isinstance(conditions, list):
+        if columns:
+            if isinstance(columns, str):
+                columns = [columns]
+            missing = [col for col in columns if col not in all_columns]
+            if missing:
                 return {
                     "status": "error",
-                    "message": "conditions参数必须是列表格式"
+                    "message": f"列 '{missing[0]}' 不存在于文件中"
                 }
-            
-            # 检查所有列是否存在
-            for cond in conditions:
-                if not isinstance(cond, dict) or "column" not in cond:
-                    return {
-                        "status": "error",
-                        "message": "每个条件必须是包含'column'、'operator'和'value'的字典"
-                    }
-                if cond["column"] not in df.columns:
-                    return {
-                        "status": "error",
-                        "message": f"列 '{cond['column']}' 不存在于文件中"
-                    }
-        elif column is not None:
-            # 单条件模式（向后兼容）
-            if column not in df.columns:
+        
+        page_df = None
+        if result_id:
+            # 翻页：复用已保存的命中行号
+            stored = get_result(result_id)
+            if stored is None:
+                return {
+                    "status": "error",
+                    "message": f"结果句柄 '{result_id}' 不存在或源文件已变更，请重新筛选"
+                }
+            if os.path.abspath(file_path) != stored.signature[0]:
                 return {
                     "status": "error",
-                    "message": f"列 '{column}' 不存在于文件中"
+                    "message": f"结果句柄 '{result_id}' 属于文件 {stored.file_path}，与 file_path 不一致"
                 }
-            conditions = [{"column": column, "operator": operator, "value": value}]
+            positions = stored.positions
+            n_rows = stored.n_rows if streaming else len(df)
         else:
-            return {
-                "status": "error",
-                "message": "必须提供conditions参数或column/operator/value参数组合"
-            }
-        
-        # 应用所有条件进行筛选
-        filtered_df = df.copy()
-        
-        for cond in conditions:
-            col = cond["column"]
-            op = cond["operator"]
-            val = cond["value"]
-            
-            if op == "=":
-                filtered_df = filtered_df[filtered_df[col] == val]
-            elif op == "!=":
-                filtered_df = filtered_df[filtered_df[col] != val]
-            elif op == ">":
-                try:
-                    filtered_df = filtered_df[filtered_df[col] > float(val)]
-                except ValueError:
+            # 构建条件列表（支持向后兼容），列和操作符的校验在编译查询计划时完成
+            if not conditions:
+                if column is None:
                     return {
                         "status": "error",
-                        "message": f"无法将值 '{val}' 转换为浮点数进行比较"
+                        "message": "必须提供conditions参数或column/operator/value参数组合"
                     }
-            elif op == "<":
-                try:
-                    filtered_df = filtered_df[filtered_df[col] < float(val)]
-                except ValueError:
-                    return {
-                        "status": "error",
-                        "message": f"无法将值 '{val}' 转换为浮点数进行比较"
-                    }
-            elif op == ">=":
-                try:
-                    filtered_df = filtered_df[filtered_df[col] >= float(val)]
-                except ValueError:
-                    return {
-                        "status": "error",
-                        "message": f"无法将值 '{val}' 转换为浮点数进行比较"
-                    }
-            elif op == "<=":
-                try:
-                    filtered_df = filtered_df[filtered_df[col] <= float(val)]
-                except ValueError:
-                    return {
-                        "status": "error",
-                        "message": f"无法将值 '{val}' 转换为浮点数进行比较"
-                    }
-            elif op == "contains":
-                filtered_df = filtered_df[filtered_df[col].astype(str).str.contains(val, case=False, na=False)]
-            else:
+                # 单条件模式（向后兼容）
+                conditions = [{"column": column, "operator": operator, "value": value}]
+            
+            # 已有表格画像时用于估计选择率（不会为此触发画像计算）
+            profile = cached_profile(file_path)
+            try:
+                if streaming:
+                    # 分块扫描：只解析条件列和返回列，扫描时顺带取出当前页
+                    positions, n_rows, page_df = stream_filter(
+                        file_path, conditions, columns, offset, 0 if count_only else limit, all_columns, profile)
+                else:
+                    # 编译查询计划：按选择率排序执行，只操作行号，不复制整表
+                    positions = execute_conditions(file_path, df, conditions, profile)
+                    n_rows = len(df)
+            except PlannerError as e:
                 return {
                     "status": "error",
-                    "message": f"不支持的操作符: {op}"
+                    "message": str(e)
                 }
+            result_id = save_result(file_path, positions, conditions, n_rows)
         
-        # 返回筛选结果
+        total = len(positions)
         result = {
             "status": "success",
-            "original_rows": len(df),
-            "filtered_rows": len(filtered_df),
-            "filtered_data": filtered_df.to_dict('records')
+            "original_rows": n_rows,
+            "filtered_rows": total,
+            "result_id": result_id
         }
+        if count_only:
+            return result
+        
+        # 只物化当前页（和投影列）
+        page = positions[offset:offset + limit]
+        if page_df is None:
+            if streaming:
+                page_df = read_rows(file_path, page, columns, all_columns)
+            else:
+                page_df = df.iloc[page]
+                if columns:
+                    page_df = page_df[list(columns)]
+        
+        end = offset + len(page)
+        result.update({
+            "offset": offset,
+            "returned_rows": len(page),
+            "has_more": end < total,
+            "next_offset": end if end < total else None,
+            "filtered_data": page_df.to_dict('records')
+        })
         
         return result
         
@@ -129,7 +155,7 @@ def filter_csv_data(file_path, conditions=None, column=None, operator=None, valu
 # 工具信息
 tool_info = {
     "name": "filter_csv_data",
-    "description": "根据条件筛选CSV数据，支持单条件或多条件筛选",
+    "description": "根据条件筛选CSV数据，支持单条件或多条件筛选，结果分页返回并附带可翻页的结果句柄",
     "function": filter_csv_data,
     "parameters": {
         "type": "object",
@@ -141,7 +167,7 @@ tool_info = {
             },
             "conditions": {
                 "type": "array",
-                "description": "多条件列表，每个条件为字典格式",
+                "description": "多条件列表（AND关系），每个条件为字典格式；用 {\"any\": [条件, ...]} 表示OR条件组",
                 "items": {
                     "type": "object",
                     "properties": {
@@ -151,15 +177,32 @@ tool_info = {
                         },
                         "operator": {
                             "type": "string",
-                            "description": "操作符（=, !=, >, <, >=, <=, contains）",
-                            "enum": ["=", "!=", ">", "<", ">=", "<=", "contains"]
+                            "description": "操作符（=, !=, >, <, >=, <=, contains, startswith, in, between）；"
+                                           "contains和startswith按字面、不区分大小写匹配",
+                            "enum": ["=", "!=", ">", "<", ">=", "<=", "contains", "startswith", "in", "between"]
                         },
                         "value": {
-                            "type": "string",
-                            "description": "筛选值"
+                            "description": "筛选值；in 为取值数组，between 为 [下限, 上限]",
+                            "anyOf": [
+                                {"type": "string"},
+                                {"type": "number"},
+                                {"type": "array", "items": {}}
+                            ]
+                        },
+                        "case": {
+                            "type": "boolean",
+                            "description": "contains/startswith是否区分大小写（默认false）"
+                        },
+                        "regex": {
+                            "type": "boolean",
+                            "description": "contains是否按正则表达式匹配（默认false，按字面匹配）"
+                        },
+                        "any": {
+                            "type": "array",
+                            "description": "OR条件组，元素为条件字典（可用 {\"all\": [...]} 嵌套AND组）",
+                            "items": {"type": "object"}
                         }
-                    },
-                    "required": ["column", "operator", "value"]
+                    }
                 }
             },
             "column": {
@@ -169,17 +212,39 @@ tool_info = {
             "operator": {
                 "type": "string",
                 "description": "单个筛选的操作符（向后兼容）",
-                "enum": ["=", "!=", ">", "<", ">=", "<=", "contains"]
+                "enum": ["=", "!=", ">", "<", ">=", "<=", "contains", "startswith"]
             },
             "value": {
                 "type": "string",
                 "description": "单个筛选的值（向后兼容）"
+            },
+            "columns": {
+                "type": "array",
+                "description": "只返回这些列（可选，默认全部列）",
+                "items": {"type": "string"}
+            },
+            "limit": {
+                "type": "integer",
+                "description": "本次最多返回的行数（默认100，上限1000）"
+            },
+            "offset": {
+                "type": "integer",
+                "description": "从第几条命中记录开始返回（默认0）"
+            },
+            "count_only": {
+                "type": "boolean",
+                "description": "只返回命中行数，不返回数据"
+            },
+            "result_id": {
+                "type": "string",
+                "description": "之前筛选返回的结果句柄，提供后直接翻页，无需重复传条件"
             }
         },
         "required": ["file_path"],
         "anyOf": [
             {"required": ["conditions"]},
-            {"required": ["column", "operator", "value"]}
+            {"required": ["column", "operator", "value"]},
+            {"required": ["result_id"]}
         ]
     }
 }
\ No newline at end of file
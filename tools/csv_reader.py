@@ -1,5 +1,4 @@
-import pandas as pd
-import json
+from .table_schema import get_schema
 
 def read_csv_info(file_path):
     """
@@ -12,17 +11,17 @@ def read_csv_info(file_path):
         dict: 包含文件信息的字典
     """
     try:
-        # 读取CSV文件
-        df = pd.read_csv(file_path)
+        # 只读取表头和前缀样本（结果缓存并保存到文件旁），不解析整个文件
+        schema = get_schema(file_path)
         
         # 获取基本信息
         info = {
             "status": "success",
-            "rows": len(df),
-            "columns": len(df.columns),
-            "column_names": list(df.columns),
-            "data_types": {col: str(dtype) for col, dtype in df.dtypes.items()},
-            "sample_data": df.head(3).to_dict('records')
+            "rows": schema["rows"],
+            "columns": len(schema["column_names"]),
+            "column_names": list(schema["column_names"]),
+            "data_types": dict(schema["data_types"]),
+            "sample_data": list(schema["sample_data"])
         }
         
         return info
@@ -1,62 +1,165 @@
-import pandas as pd
+import csv
+import io
+import json
 import os
-from datetime import datetime
 
-def write_to_csv(file_path, query, answer):
+from .qa_dedup import DEDUP_MODE, DEDUP_MODES, find_duplicate, prepare_entry, record_entry
+from .qa_verify import append_provenance, verify_answer
+from .result_store import get_result
+
+try:
+    import fcntl
+except ImportError:  # 非POSIX平台没有 fcntl，退化为不加锁的追加
+    fcntl = None
+
+# 行数侧车文件后缀，记录数据行数及对应的文件大小
+ROW_COUNT_SUFFIX = ".rows.json"
+
+HEADERS = ['query', 'answer']
+
+
+def _format_rows(rows):
+    """按CSV规则转义（多行markdown答案会被引号包裹），返回UTF-8字节"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerows(rows)
+    return buffer.getvalue().encode("utf-8")
+
+
+def _count_rows(file_path):
+    """流式统计已有数据行数（不含表头），仅在行数侧车缺失或失效时使用"""
+    with open(file_path, 'r', encoding='utf-8', newline='') as f:
+        return max(sum(1 for _ in csv.reader(f)) - 1, 0)
+
+
+def _read_row_count(file_path, size):
+    """读取行数侧车，记录的文件大小与当前一致时才可信"""
+    try:
+        with open(file_path + ROW_COUNT_SUFFIX, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get("size") != size:
+        return None
+    return meta.get("rows")
+
+
+def _write_row_count(file_path, rows, size):
+    tmp_path = file_path + ROW_COUNT_SUFFIX + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({"rows": rows, "size": size}, f)
+    os.replace(tmp_path, file_path + ROW_COUNT_SUFFIX)
+
+
+def write_to_csv(file_path, query, answer, result_id=None, on_duplicate=None, source_file=None):
     """
     将问题和答案写入CSV文件的query和answer两列（仅支持追加写入）
-    
+
+    以追加模式直接写入新行，文件锁保证多个agent写同一文件时互不覆盖，
+    行数保存在侧车文件中，无需重新读取整个文件
+
     Args:
         file_path: 目标CSV文件路径
         query: 问题字符串
         answer: 答案字符串
-        
+        result_id: 产生答案的筛选结果句柄（可选），提供时记录答案来源并立即校验答案
+        on_duplicate: 与已有问答重复时的处理方式 reject/flag/off（默认取环境变量 QA_DEDUP_MODE，未设置时为 reject）
+        source_file: 答案所依据的源表路径（可选），与 result_id 同时提供时须与句柄的源文件一致
+
     Returns:
-        dict: 包含写入结果的字典
+        dict: 包含写入结果的字典（提供 result_id 时含校验结果 verification）
     """
     try:
-        # 定义固定的列标题
-        headers = ['query', 'answer']
-        
-        # 检查文件是否存在
-        file_exists = os.path.exists(file_path)
-        
-        # 准备数据
-        data = [[query, answer]]
-        
-        if file_exists:
-            # 读取现有文件
-            existing_df = pd.read_csv(file_path)
-            
-            # 创建新的数据框
-            new_df = pd.DataFrame(data, columns=headers)
-            
-            # 追加数据
-            combined_df = pd.concat([existing_df, new_df], ignore_index=True)
-            
-            # 保存文件
-            combined_df.to_csv(file_path, index=False)
-            
-            return {
-                "status": "success",
-                "message": f"成功追加1行问答数据到文件",
-                "total_rows": len(combined_df),
-                "file_path": file_path
-            }
-        else:
-            # 创建新文件
-            new_df = pd.DataFrame(data, columns=headers)
-            
-            # 保存文件
-            new_df.to_csv(file_path, index=False)
-            
+        mode = on_duplicate or DEDUP_MODE
+        if mode not in DEDUP_MODES:
             return {
-                "status": "success",
-                "message": f"成功创建新文件并写入1行问答数据",
-                "total_rows": len(new_df),
-                "file_path": file_path
+                "status": "error",
+                "message": f"不支持的重复处理方式: {mode}"
             }
-            
+        # 签名在加锁前计算，临界区内只做索引查找
+        entry = prepare_entry(query, answer) if mode != "off" else None
+
+        stored = None
+        if result_id:
+            stored = get_result(result_id)
+            if stored is None:
+                return {
+                    "status": "error",
+                    "message": f"结果句柄 '{result_id}' 不存在或源文件已变更，请重新筛选后再写入"
+                }
+            if source_file and os.path.abspath(source_file) != stored.signature[0]:
+                return {
+                    "status": "error",
+                    "message": f"结果句柄 '{result_id}' 属于文件 {stored.file_path}，与 source_file 不一致"
+                }
+
+        with open(file_path, 'ab+') as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                f.seek(0, os.SEEK_END)
+                size = f.tell()
+                created = size == 0
+
+                if created:
+                    existing_rows = 0
+                else:
+                    existing_rows = _read_row_count(file_path, size)
+                    if existing_rows is None:
+                        existing_rows = _count_rows(file_path)
+
+                duplicate = find_duplicate(file_path, entry, existing_rows) if entry is not None else None
+                if duplicate is not None and mode == "reject":
+                    return {
+                        "status": "error",
+                        "message": f"与已有的第{duplicate['row']}行问答重复（问题相似度 {duplicate['query_similarity']}"
+                                   f"{'，答案相同' if duplicate['same_answer'] else ''}），未写入，请构造不同的问题：{duplicate['query']}",
+                        "duplicate": duplicate
+                    }
+
+                if created:
+                    payload = _format_rows([HEADERS, [query, answer]])
+                else:
+                    payload = _format_rows([[query, answer]])
+                    # 已有文件末尾缺少换行时先补齐，避免新行接在最后一条记录后面
+                    f.seek(size - 1)
+                    if f.read(1) != b"\n":
+                        payload = b"\n" + payload
+
+                f.write(payload)
+                f.flush()
+                total_rows = existing_rows + 1
+                _write_row_count(file_path, total_rows, size + len(payload))
+                if entry is not None:
+                    record_entry(file_path, existing_rows, entry, duplicate["row"] if duplicate else None)
+                if stored is not None:
+                    # 记录答案来源，供批量校验（python -m tools.qa_verify）重新执行
+                    append_provenance(file_path, existing_rows, stored.file_path, stored.conditions,
+                                      stored.ordering)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+        result = {
+            "status": "success",
+            "message": "成功创建新文件并写入1行问答数据" if created else "成功追加1行问答数据到文件",
+            "total_rows": total_rows,
+            "file_path": file_path
+        }
+        if duplicate is not None:
+            result["duplicate"] = duplicate
+        if stored is not None:
+            # 直接复用句柄中的命中行号比对答案，不再重新筛选；校验失败不影响已完成的写入
+            try:
+                result["verification"] = verify_answer(answer, stored.file_path, stored.conditions, stored.positions,
+                                                       stored.ordering)
+            except Exception as e:
+                result["verification"] = {
+                    "status": "error",
+                    "message": f"校验答案时发生错误: {str(e)}"
+                }
+        return result
+
     except Exception as e:
         return {
             "status": "error",
@@ -66,7 +169,7 @@ def write_to_csv(file_path, query, answer):
 # 工具信息
 tool_info = {
     "name": "write_to_csv",
-    "description": "将问题和答案写入CSV文件的query和answer两列",
+    "description": "将问题和答案写入CSV文件的query和answer两列，与已有问答重复（问题高度相似或答案行完全相同）时拒绝写入；提供答案对应的筛选结果句柄result_id时，会用该筛选结果校验答案表格并返回精确率和召回率",
     "function": write_to_csv,
     "parameters": {
         "type": "object",
@@ -82,8 +185,16 @@ tool_info = {
             "answer": {
                 "type": "string",
                 "description": "答案文本"
+            },
+            "result_id": {
+                "type": "string",
+                "description": "产生答案的filter_csv_data结果句柄（可选），用于记录答案来源并校验答案"
+            },
+            "source_file": {
+                "type": "string",
+                "description": "答案所依据的源表CSV路径（可选），提供result_id时用于确认句柄来自该文件"
             }
         },
         "required": ["file_path", "query", "answer"]
     }
-}
\ No newline at end of file
+}
@@ -0,0 +1,336 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import threading
+import zlib
+from collections import defaultdict
+from itertools import chain
+
+import numpy as np
+import pandas as pd
+
+from .qa_verify import normalize_values, parse_markdown_table
+
+# 去重索引侧车文件后缀：每行记录一条问答的问题签名和答案行集合哈希
+DEDUP_SUFFIX = ".dedup.jsonl"
+# MinHash 签名长度，LSH 分为 BANDS 段（每段 NUM_PERM // BANDS 个值）
+NUM_PERM = 64
+BANDS = 16
+# 问题文本按字符切分的片段长度（中文不依赖分词）
+SHINGLE_SIZE = 3
+# 问题签名的估计相似度达到该值即视为重复
+SIMILARITY_THRESHOLD = float(os.getenv("QA_DEDUP_THRESHOLD", "0.8"))
+# 写入时发现重复的处理方式：reject 拒绝写入，flag 照常写入并在结果中标记，off 不检查
+DEDUP_MODE = os.getenv("QA_DEDUP_MODE", "reject")
+DEDUP_MODES = ("reject", "flag", "off")
+# 索引中保存的问题预览长度（用于提示与哪条问答重复）
+QUERY_PREVIEW_CHARS = 100
+
+_PRIME = np.uint64(4294967311)
+_rng = np.random.default_rng(20240601)
+_PERM_A = _rng.integers(1, 1 << 31, NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.integers(0, 1 << 31, NUM_PERM, dtype=np.uint64)
+_NOISE = re.compile(r"[\W_]+")
+
+_lock = threading.Lock()
+_indexes = {}
+
+
+def query_signature(query):
+    """
+    计算问题文本的 MinHash 签名（去掉空白和标点后按字符切片）
+
+    Args:
+        query: 问题文本
+
+    Returns:
+        numpy.ndarray: 长度为 NUM_PERM 的签名
+    """
+    text = _NOISE.sub("", str(query).lower())
+    if len(text) <= SHINGLE_SIZE:
+        shingles = {text}
+    else:
+        shingles = {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+    hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+    return ((np.outer(hashes, _PERM_A) + _PERM_B) % _PRIME).min(axis=0)
+
+
+def answer_digests(answers):
+    """
+    计算答案表格行集合的哈希（与表头名称和行顺序无关），所有答案的单元格一次规范化
+
+    Args:
+        answers: 答案文本列表
+
+    Returns:
+        list: 哈希值列表，答案没有表格行时对应 None
+    """
+    tables = [parse_markdown_table(answer)[1] for answer in answers]
+    cells = [cell for rows in tables for row in rows for cell in row]
+    normalized = normalize_values(pd.Series(cells, dtype=object)).to_numpy()
+    digests = []
+    offset = 0
+    for rows in tables:
+        if not rows:
+            digests.append(None)
+            continue
+        keys = []
+        for row in rows:
+            keys.append("\x1f".join(normalized[offset:offset + len(row)]))
+            offset += len(row)
+        keys.sort()
+        digests.append(hashlib.sha1("\x1e".join(keys).encode("utf-8")).hexdigest())
+    return digests
+
+
+def prepare_entries(queries, answers):
+    """计算多条问答的索引项（在加锁之前计算，缩短临界区）"""
+    return [{
+        "signature": query_signature(query),
+        "answer_hash": digest,
+        "query": str(query)[:QUERY_PREVIEW_CHARS]
+    } for query, digest in zip(queries, answer_digests(answers))]
+
+
+def prepare_entry(query, answer):
+    """计算一条问答的索引项"""
+    return prepare_entries([query], [answer])[0]
+
+
+def _bands(signature):
+    width = NUM_PERM // BANDS
+    return [(band, signature[band * width:(band + 1) * width].tobytes()) for band in range(BANDS)]
+
+
+def _read_rows(qa_file):
+    if not os.path.exists(qa_file) or os.path.getsize(qa_file) == 0:
+        return pd.DataFrame(columns=["query", "answer"])
+    return pd.read_csv(qa_file, dtype=str, keep_default_na=False)
+
+
+class DedupIndex:
+    """一个问答文件的去重索引：LSH 分桶查找相似问题，答案行集合哈希查找相同答案"""
+
+    def __init__(self, qa_file, persist=True):
+        self.qa_file = qa_file
+        self.path = qa_file + DEDUP_SUFFIX
+        self.persist = persist
+        self._reset()
+
+    def _reset(self):
+        # 已读取到的侧车文件字节偏移，之后只读取新追加的部分
+        self.offset = 0
+        self.rows = 0
+        # 签名按加入顺序存放在矩阵中，分桶和查找都使用矩阵中的槽位
+        self.signatures = np.empty((0, NUM_PERM), dtype=np.uint64)
+        self.slot_rows = []
+        self.queries = []
+        self.buckets = defaultdict(list)
+        self.exact = {}
+        self.answers = {}
+
+    def _add(self, row, signature, answer_hash, query):
+        slot = len(self.slot_rows)
+        if slot == len(self.signatures):
+            grown = np.empty((max(64, slot * 2), NUM_PERM), dtype=np.uint64)
+            grown[:slot] = self.signatures[:slot]
+            self.signatures = grown
+        self.signatures[slot] = signature
+        self.slot_rows.append(row)
+        self.queries.append(query)
+        self.exact.setdefault(signature.tobytes(), slot)
+        for key in _bands(signature):
+            self.buckets[key].append(slot)
+        if answer_hash is not None:
+            self.answers.setdefault(answer_hash, slot)
+        self.rows = max(self.rows, row + 1)
+
+    def refresh(self):
+        """增量读取其他进程追加到侧车文件的记录；侧车文件被替换或截断时重新读取"""
+        if not self.persist:
+            return
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            if self.offset:
+                self._reset()
+            return
+        if size < self.offset:
+            self._reset()
+        if size == self.offset:
+            return
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            data = f.read(size - self.offset)
+        # 只处理完整的行，写到一半的行留到下次读取
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            self._add(record["row"], np.asarray(record["minhash"], dtype=np.uint64),
+                      record.get("answer_hash"), record.get("query", ""))
+        self.offset += end
+
+    def sync(self, total_rows):
+        """
+        使索引覆盖问答文件的全部 total_rows 行：缺少的行从CSV补建，索引多于文件行数（文件被替换）时整体重建
+
+        Args:
+            total_rows: 问答文件当前的数据行数
+        """
+        self.refresh()
+        if self.rows == total_rows:
+            return
+        if self.rows > total_rows:
+            self._reset()
+            if self.persist and os.path.exists(self.path):
+                os.remove(self.path)
+        if total_rows == 0:
+            return
+        # 未经索引写入的行（例如旧文件）一次补建
+        qa = _read_rows(self.qa_file).iloc[self.rows:total_rows]
+        rows = range(self.rows, self.rows + len(qa))
+        self.append_many(rows, prepare_entries(qa["query"].tolist(), qa["answer"].tolist()))
+
+    def find(self, entry):
+        """
+        查找与索引项重复的已有问答
+
+        Returns:
+            dict | None: 重复的行号、问题预览、问题相似度及答案是否相同
+        """
+        signature = entry["signature"]
+        best_slot, best_similarity = self.exact.get(signature.tobytes()), 1.0
+        # 签名完全相同时直接命中，不必展开（可能很大的）分桶
+        candidates = () if best_slot is not None else np.unique(np.fromiter(
+            chain.from_iterable(self.buckets.get(key, ()) for key in _bands(signature)), dtype=np.int64))
+        if len(candidates):
+            similarities = (self.signatures[candidates] == signature).mean(axis=1)
+            # 相似度相同时取最早的一行
+            best = int(np.argmax(similarities))
+            best_slot, best_similarity = int(candidates[best]), float(similarities[best])
+        same_answer_slot = self.answers.get(entry["answer_hash"]) if entry["answer_hash"] is not None else None
+
+        if best_slot is not None and best_similarity >= SIMILARITY_THRESHOLD:
+            slot = best_slot
+        elif same_answer_slot is not None:
+            slot = same_answer_slot
+            best_similarity = float((self.signatures[slot] == signature).mean())
+        else:
+            return None
+        return {
+            "row": self.slot_rows[slot],
+            "query": self.queries[slot],
+            "query_similarity": round(best_similarity, 3),
+            "same_answer": same_answer_slot == slot
+        }
+
+    def append(self, row, entry, duplicate_of=None):
+        """把一条问答加入索引并追加到侧车文件（调用方负责加锁）"""
+        self.append_many([row], [entry], [duplicate_of])
+
+    def append_many(self, rows, entries, duplicates=None):
+        """把多条问答加入索引，侧车文件一次追加"""
+        if not self.persist:
+            for row, entry in zip(rows, entries):
+                self._add(row, entry["signature"], entry["answer_hash"], entry["query"])
+            return
+        lines = []
+        for row, entry, duplicate_of in zip(rows, entries, duplicates or [None] * len(entries)):
+            record = {
+                "row": row,
+                "minhash": entry["signature"].tolist(),
+                "answer_hash": entry["answer_hash"],
+                "query": entry["query"]
+            }
+            if duplicate_of is not None:
+                record["duplicate_of"] = duplicate_of
+            lines.append(json.dumps(record, ensure_ascii=False) + "\n")
+        if not lines:
+            return
+        with open(self.path, 'ab') as f:
+            f.write("".join(lines).encode("utf-8"))
+        # 读回刚追加的记录，同时推进偏移
+        self.refresh()
+
+
+def get_dedup_index(qa_file):
+    """获取问答文件的去重索引（进程内缓存，之后每次只增量读取）"""
+    key = os.path.abspath(qa_file)
+    with _lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = DedupIndex(qa_file)
+    return index
+
+
+def find_duplicate(qa_file, entry, total_rows):
+    """
+    在问答文件的去重索引中查找重复（需在问答文件的写入锁内调用）
+
+    Args:
+        qa_file: 问答CSV路径
+        entry: prepare_entry 得到的索引项
+        total_rows: 问答文件当前的数据行数
+
+    Returns:
+        dict | None: 重复信息
+    """
+    index = get_dedup_index(qa_file)
+    with _lock:
+        index.sync(total_rows)
+        return index.find(entry)
+
+
+def record_entry(qa_file, row, entry, duplicate_of=None):
+    """写入问答后把它加入去重索引（需在问答文件的写入锁内调用）"""
+    index = get_dedup_index(qa_file)
+    with _lock:
+        index.append(row, entry, duplicate_of)
+
+
+def clear_dedup_cache():
+    """清空进程内的去重索引（侧车文件保留）"""
+    with _lock:
+        _indexes.clear()
+
+
+def scan_file(qa_file):
+    """
+    按行顺序扫描已有问答文件，找出与之前某行重复的问答（不读写侧车文件）
+
+    Returns:
+        list: [{"row": 行号, "duplicate": 重复信息}, ...]
+    """
+    qa = _read_rows(qa_file)
+    index = DedupIndex(qa_file, persist=False)
+    duplicates = []
+    for row, entry in enumerate(prepare_entries(qa["query"].tolist(), qa["answer"].tolist())):
+        duplicate = index.find(entry)
+        if duplicate is not None:
+            duplicates.append({"row": row, "duplicate": duplicate})
+        index.append(row, entry)
+    return duplicates
+
+
+def main():
+    """命令行入口：python -m tools.qa_dedup <问答CSV>..."""
+    parser = argparse.ArgumentParser(description='找出问答文件中的重复问答')
+    parser.add_argument('qa_files', nargs='+', help='问答CSV文件路径')
+    args = parser.parse_args()
+
+    for qa_file in args.qa_files:
+        duplicates = scan_file(qa_file)
+        print(f"{qa_file}: {len(duplicates)} 条问答与之前的问答重复")
+        for item in duplicates:
+            duplicate = item["duplicate"]
+            print(f"  第{item['row']}行 与 第{duplicate['row']}行重复（问题相似度 {duplicate['query_similarity']}，"
+                  f"答案{'相同' if duplicate['same_answer'] else '不同'}）：{duplicate['query']}")
+
+
+if __name__ == "__main__":
+    main()
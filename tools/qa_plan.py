@@ -0,0 +1,215 @@
+import numpy as np
+
+from .answer_render import answer_ordering, answer_size_error, shape_answer, to_markdown
+from .chunked_engine import stream_filter_many, use_streaming
+from .csv_writer import write_to_csv
+from .qa_verify import answer_rows
+from .query_planner import PlannerError, execute_conditions
+from .result_store import save_result
+from .table_cache import load_table
+from .table_profile import cached_profile
+
+# 一次计划最多包含的问题数
+MAX_PLANS = 20
+
+
+def _check_plan(plan):
+    """校验单个问题计划，返回错误信息（没有错误时返回 None）"""
+    if not isinstance(plan, dict):
+        return "每个计划必须是对象"
+    if not isinstance(plan.get("query"), str) or not plan["query"].strip():
+        return "计划缺少问题文本query"
+    if not isinstance(plan.get("conditions"), list) or not plan["conditions"]:
+        return "计划缺少筛选条件conditions"
+    return None
+
+
+def _execute_all(file_path, plans):
+    """
+    一次执行所有计划的条件：小表在共享缓存上逐个执行（复用列索引），大表一次分块扫描同时执行（只保留命中行号）
+
+    Returns:
+        tuple: (各计划的命中行号或 PlannerError, 源表总行数)
+    """
+    if use_streaming(file_path):
+        hits, n_rows = stream_filter_many(file_path, {i: plan["conditions"] for i, plan in enumerate(plans)})
+        return [hits[i] for i in range(len(plans))], n_rows
+
+    df = load_table(file_path)
+    profile = cached_profile(file_path)
+    hits = []
+    for plan in plans:
+        try:
+            hits.append(execute_conditions(file_path, df, plan["conditions"], profile))
+        except PlannerError as e:
+            hits.append(e)
+    return hits, len(df)
+
+
+def execute_qa_plan(file_path, output_file, plans):
+    """
+    批量执行问题计划：一次执行所有问题的筛选条件，按输出要求渲染markdown答案并逐条写入输出文件
+
+    Args:
+        file_path: 源CSV文件路径
+        output_file: 问答写入的CSV文件路径
+        plans: 问题计划列表，每项为 {query, conditions, columns, rename, value_map, sort_by, ascending, limit}
+
+    Returns:
+        dict: 每个计划的执行结果（写入、命中行数、校验结果或错误信息）
+    """
+    try:
+        if not isinstance(plans, list) or not plans:
+            return {
+                "status": "error",
+                "message": "plans参数必须是非空列表"
+            }
+        if len(plans) > MAX_PLANS:
+            return {
+                "status": "error",
+                "message": f"一次最多执行{MAX_PLANS}个计划"
+            }
+
+        results = [None] * len(plans)
+        valid = []
+        for i, plan in enumerate(plans):
+            problem = _check_plan(plan)
+            if problem:
+                results[i] = {"index": i, "status": "error", "message": problem}
+            else:
+                valid.append(i)
+
+        hits, n_rows = _execute_all(file_path, [plans[i] for i in valid])
+        answerable = []
+        for i, positions in zip(valid, hits):
+            plan = plans[i]
+            results[i] = {"index": i, "query": plan["query"]}
+            if isinstance(positions, PlannerError):
+                results[i].update({"status": "error", "message": str(positions)})
+                continue
+            results[i]["filtered_rows"] = int(len(positions))
+            problem = answer_size_error(int(len(positions)), plan.get("limit"))
+            if problem:
+                results[i].update({"status": "error", "message": problem})
+                continue
+            answerable.append((i, positions))
+
+        # 所有答案保留的行一次取出（大表只读取排序列和答案列，行数受 limit 和答案行数上限约束）
+        kept, union, rows = answer_rows(file_path, [{
+            "positions": positions,
+            "columns": plans[i].get("columns"),
+            "sort_by": plans[i].get("sort_by"),
+            "ascending": plans[i].get("ascending", True),
+            "limit": plans[i].get("limit")
+        } for i, positions in answerable])
+        for (i, _), positions in zip(answerable, kept):
+            plan = plans[i]
+            outcome = results[i]
+            try:
+                if isinstance(positions, PlannerError):
+                    raise positions
+                table = shape_answer(rows.iloc[np.searchsorted(union, positions)], plan.get("columns"),
+                                     plan.get("rename"), plan.get("value_map"))
+            except PlannerError as e:
+                outcome.update({"status": "error", "message": str(e)})
+                continue
+
+            # 答案句柄只含排序截取后保留的行，排序截取要求随句柄记入答案来源
+            result_id = save_result(file_path, positions, plan["conditions"], n_rows,
+                                    answer_ordering(plan.get("sort_by"), plan.get("ascending", True), plan.get("limit")))
+            written = write_to_csv(output_file, plan["query"], to_markdown(table), result_id)
+            outcome.update({
+                "status": written["status"],
+                "answer_rows": len(table),
+                "result_id": result_id
+            })
+            for key in ("message", "duplicate", "verification"):
+                if key in written:
+                    outcome[key] = written[key]
+
+        written_count = sum(1 for r in results if r["status"] == "success")
+        return {
+            "status": "success",
+            "message": f"共{len(plans)}个计划，成功写入{written_count}条问答",
+            "written": written_count,
+            "results": results
+        }
+
+    except FileNotFoundError:
+        return {
+            "status": "error",
+            "message": f"文件未找到: {file_path}"
+        }
+    except Exception as e:
+        return {
+            "status": "error",
+            "message": f"执行问题计划时发生错误: {str(e)}"
+        }
+
+
+# 工具信息
+tool_info = {
+    "name": "execute_qa_plan",
+    "description": "一次提交多个问题的结构化计划：每个计划包含问题文本、筛选条件和答案的输出要求，"
+                   "工具一次执行所有筛选，生成markdown表格答案并逐条写入输出文件，返回每个计划的写入结果",
+    "function": execute_qa_plan,
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "file_path": {
+                "type": "string",
+                "description": "源CSV文件路径"
+            },
+            "output_file": {
+                "type": "string",
+                "description": "问答写入的CSV文件路径"
+            },
+            "plans": {
+                "type": "array",
+                "description": "问题计划列表",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "query": {
+                            "type": "string",
+                            "description": "问题文本"
+                        },
+                        "conditions": {
+                            "type": "array",
+                            "description": "筛选条件，格式与filter_csv_data的conditions相同",
+                            "items": {"type": "object"}
+                        },
+                        "columns": {
+                            "type": "array",
+                            "description": "答案表格的列及顺序（源表列名）",
+                            "items": {"type": "string"}
+                        },
+                        "rename": {
+                            "type": "object",
+                            "description": "列名 -> 答案表头，例如 {\"获奖年份\": \"年份\"}"
+                        },
+                        "value_map": {
+                            "type": "object",
+                            "description": "列名 -> {原值: 新值}，例如 {\"奖牌\": {\"Gold\": \"金牌\"}}"
+                        },
+                        "sort_by": {
+                            "type": "array",
+                            "description": "排序列（可选）",
+                            "items": {"type": "string"}
+                        },
+                        "ascending": {
+                            "type": "boolean",
+                            "description": "是否升序（默认true）"
+                        },
+                        "limit": {
+                            "type": "integer",
+                            "description": "答案最多保留的行数（可选）"
+                        }
+                    },
+                    "required": ["query", "conditions"]
+                }
+            }
+        },
+        "required": ["file_path", "output_file", "plans"]
+    }
+}
@@ -0,0 +1,527 @@
+import argparse
+import json
+import os
+import re
+import time
+from collections import Counter, defaultdict
+
+import numpy as np
+import pandas as pd
+
+from .chunked_engine import read_header, read_rows, stream_filter, stream_filter_many, use_streaming
+from .query_planner import PlannerError, execute_conditions
+from .table_cache import load_table
+
+# 问答来源侧车文件后缀：每行记录一条问答对应的源表和筛选条件
+PROVENANCE_SUFFIX = ".provenance.jsonl"
+# 答案列与源表列的取值重合比例达到该值才视为同一列（表头不同或取值经过改写的列会被排除）
+VALUE_MATCH_RATIO = 0.5
+# 视为缺失值的单元格文本
+MISSING_VALUES = ("", "nan", "NaN", "None", "null", "-", "—")
+
+_SEPARATOR_CELL = re.compile(r"^:?-{3,}:?$")
+_CELL_SPLIT = re.compile(r"(?<!\\)\|")
+
+
+def _split_row(line):
+    line = line.strip()
+    if line.startswith("|"):
+        line = line[1:]
+    if line.endswith("|") and not line.endswith("\\|"):
+        line = line[:-1]
+    return [cell.strip().replace("\\|", "|") for cell in _CELL_SPLIT.split(line)]
+
+
+def parse_markdown_table(answer):
+    """
+    解析答案中的第一个markdown表格（可包在 ```markdown 代码块中）
+
+    Args:
+        answer: 答案文本
+
+    Returns:
+        tuple: (表头列表, 行列表)，没有表格时均为空列表
+    """
+    block = []
+    for line in str(answer).splitlines():
+        if line.strip().startswith("|"):
+            block.append(line)
+        elif block:
+            break
+    if not block:
+        return [], []
+
+    headers = _split_row(block[0])
+    rows = []
+    for line in block[1:]:
+        cells = _split_row(line)
+        if all(_SEPARATOR_CELL.match(cell.replace(" ", "")) for cell in cells):
+            continue
+        # 单元格数与表头不一致时按表头补齐或截断
+        rows.append((cells + [""] * len(headers))[:len(headers)])
+    return headers, rows
+
+
+def normalize_values(series):
+    """单元格统一为可比较的文本：去空白、缺失值为空串、数值去掉多余的小数位（1921.0 -> 1921）"""
+    text = series.astype(object).where(series.notna(), "").astype(str).str.strip()
+    text = text.where(~text.isin(MISSING_VALUES), "")
+    number = pd.to_numeric(text.str.replace(",", "", regex=False), errors='coerce')
+    numeric = number.notna() & (text != "")
+    if numeric.any():
+        values = number[numeric]
+        integral = values == np.floor(values)
+        text = text.copy()
+        text[numeric] = np.where(integral, values.map("{:.0f}".format), values.map("{:.10g}".format))
+    return text
+
+
+def _normalize_columns(frame):
+    """逐列规范化，返回 列名 -> 规范化文本数组"""
+    return {col: normalize_values(frame[col]).to_numpy() for col in frame.columns}
+
+
+def _match_columns(headers, answer_columns, expected):
+    """
+    将答案列对应到源表列：优先按表头同名，否则取值重合比例最高的列；重合比例不足的列不参与比对
+
+    Args:
+        headers: 答案表头
+        answer_columns: 每个答案列的规范化取值
+        expected: 源表列名 -> 期望行的规范化取值
+
+    Returns:
+        tuple: ({答案列序号: 源表列名}, 未匹配的答案表头列表)
+    """
+    expected_values = {col: set(values) for col, values in expected.items()}
+    mapping = {}
+    used = set()
+    unmatched = []
+    # 同名列先分配，避免被其他列按取值抢占
+    order = sorted(range(len(headers)), key=lambda i: headers[i] not in expected_values)
+    for i in order:
+        values = set(answer_columns[i]) - {""}
+        candidates = [headers[i]] if headers[i] in expected_values else list(expected_values)
+        best, best_ratio = None, VALUE_MATCH_RATIO
+        for col in candidates:
+            if col in used:
+                continue
+            ratio = len(values & expected_values[col]) / len(values) if values else 0.0
+            if ratio >= best_ratio and (best is None or ratio > best_ratio):
+                best, best_ratio = col, ratio
+        if best is None:
+            unmatched.append(headers[i])
+        else:
+            mapping[i] = best
+            used.add(best)
+    return dict(sorted(mapping.items())), unmatched
+
+
+def _compare(headers, answer_columns, expected, expected_rows):
+    """
+    按行比对答案和期望行（只比对能对应到源表的列，重复行按多重集各匹配一次）
+
+    Args:
+        headers: 答案表头
+        answer_columns: 每个答案列的规范化取值
+        expected: 源表列名 -> 期望行的规范化取值
+        expected_rows: 期望行数
+
+    Returns:
+        dict: 校验结果
+    """
+    mapping, unmatched = _match_columns(headers, answer_columns, expected)
+    answer_rows = len(answer_columns[0]) if answer_columns else 0
+    matched = 0
+    if mapping and answer_rows and expected_rows:
+        answer_keys = Counter(zip(*(answer_columns[i] for i in mapping)))
+        expected_keys = Counter(zip(*(expected[col] for col in mapping.values())))
+        matched = sum((answer_keys & expected_keys).values())
+    return {
+        "status": "success",
+        "answer_rows": answer_rows,
+        "expected_rows": expected_rows,
+        "matched_rows": matched,
+        "precision": round(matched / answer_rows, 6) if answer_rows else 1.0,
+        "recall": round(matched / expected_rows, 6) if expected_rows else 1.0,
+        "matched_columns": {headers[i]: col for i, col in mapping.items()},
+        "unmatched_columns": unmatched
+    }
+
+
+def _answer_columns(headers, rows):
+    frame = pd.DataFrame(rows, columns=range(len(headers)), dtype=object)
+    return [normalize_values(frame[i]).to_numpy() for i in range(len(headers))]
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return [value]
+
+
+def answer_order(rows, sort_by=None, ascending=True, limit=None):
+    """
+    答案保留的行及其顺序：按原始取值稳定排序后截取前 limit 行
+
+    Args:
+        rows: 命中的行（DataFrame，须包含排序列）
+        sort_by: 排序列（可多列）
+        ascending: 是否升序（可为与 sort_by 对应的列表）
+        limit: 最多保留的行数
+
+    Returns:
+        ndarray: 保留的行在 rows 中的序号（按答案中的顺序）
+    """
+    order = np.arange(len(rows))
+    if isinstance(sort_by, str):
+        sort_by = [sort_by]
+    if sort_by:
+        sort_by = list(sort_by)
+        for col in sort_by:
+            if col not in rows.columns:
+                raise PlannerError(f"列 '{col}' 不存在于文件中")
+        if isinstance(ascending, list) and len(ascending) != len(sort_by):
+            raise PlannerError("ascending为列表时长度必须与sort_by一致")
+        keys = rows[sort_by].reset_index(drop=True)
+        order = keys.sort_values(sort_by, ascending=ascending, kind='stable').index.to_numpy()
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except (TypeError, ValueError):
+            raise PlannerError("limit必须是整数")
+        order = order[:max(limit, 0)]
+    return order
+
+
+def answer_rows(file_path, requests, header=None):
+    """
+    取出多个答案保留的行：不排序时只取前 limit 个命中行；排序时先只取排序列定出保留的行，
+    再一次取出所有答案保留的行。大表每步各分块读取一遍，只读取用到的列，内存只取决于保留的行数
+
+    Args:
+        file_path: 源表CSV路径
+        requests: 列表，每项为 {positions: 命中行号, columns: 需要的列（默认全部列）, sort_by, ascending, limit}
+        header: 已读取的表头（可选）
+
+    Returns:
+        tuple: (各项保留的行号（按答案顺序）或 PlannerError, 升序的保留行号并集, 并集对应的行)
+    """
+    streaming = use_streaming(file_path)
+    if streaming:
+        df = None
+        header = header or read_header(file_path)
+    else:
+        df = load_table(file_path)
+        header = list(df.columns)
+
+    kept = [None] * len(requests)
+    sorted_requests = []
+    for i, request in enumerate(requests):
+        sort_by = _as_list(request.get("sort_by"))
+        try:
+            for col in _as_list(request.get("columns")) + sort_by:
+                if col not in header:
+                    raise PlannerError(f"列 '{col}' 不存在于文件中")
+            if sort_by:
+                sorted_requests.append(i)
+            else:
+                positions = np.asarray(request["positions"])
+                kept[i] = positions[answer_order(positions, limit=request.get("limit"))]
+        except PlannerError as e:
+            kept[i] = e
+
+    if sorted_requests:
+        key_columns = []
+        for i in sorted_requests:
+            for col in _as_list(requests[i]["sort_by"]):
+                if col not in key_columns:
+                    key_columns.append(col)
+        key_union = np.unique(np.concatenate([np.asarray(requests[i]["positions"]) for i in sorted_requests]))
+        if streaming:
+            keys = read_rows(file_path, key_union, key_columns, header)
+        else:
+            keys = df.iloc[key_union, df.columns.get_indexer(key_columns)]
+        for i in sorted_requests:
+            request = requests[i]
+            positions = np.asarray(request["positions"])
+            try:
+                offsets = answer_order(keys.iloc[np.searchsorted(key_union, positions)], request["sort_by"],
+                                       request.get("ascending", True), request.get("limit"))
+                kept[i] = positions[offsets]
+            except PlannerError as e:
+                kept[i] = e
+
+    found = [positions for positions in kept if not isinstance(positions, PlannerError)]
+    union = np.unique(np.concatenate(found)) if found else np.empty(0, dtype=np.int64)
+    if not streaming:
+        return kept, union, df.iloc[union]
+    columns = []
+    for request in requests:
+        if not request.get("columns"):
+            columns = None
+            break
+        columns.extend(col for col in _as_list(request["columns"]) if col not in columns)
+    return kept, union, read_rows(file_path, union, columns, header)
+
+
+def _expected_rows(source_file, conditions, positions=None, ordering=None):
+    """按记录的条件（及排序截取要求）重新取出源表中答案应包含的行（大文件分块执行）"""
+    if positions is not None:
+        if use_streaming(source_file):
+            return read_rows(source_file, positions)
+        return load_table(source_file).iloc[positions]
+    if use_streaming(source_file):
+        header = read_header(source_file)
+        hits, _, _ = stream_filter(source_file, conditions, None, 0, 0, header)
+    else:
+        header = None
+        hits = execute_conditions(source_file, load_table(source_file), conditions)
+    kept, union, rows = answer_rows(source_file, [{"positions": hits, **(ordering or {})}], header)
+    if isinstance(kept[0], PlannerError):
+        raise kept[0]
+    return rows.iloc[np.searchsorted(union, kept[0])]
+
+
+def verify_answer(answer, source_file, conditions, positions=None, ordering=None):
+    """
+    校验一条答案：解析markdown表格，用记录的条件从源表重新得到期望行，按行比对计算精确率和召回率
+
+    Args:
+        answer: 答案文本（markdown表格）
+        source_file: 源表CSV路径
+        conditions: 产生答案的筛选条件（与 filter_csv_data 相同）
+        positions: 已知的答案行号（可选，提供时不再执行条件，已按 ordering 排序截取）
+        ordering: 答案的排序和截取要求 {sort_by, ascending, limit}（可选）
+
+    Returns:
+        dict: 校验结果（answer_rows、expected_rows、matched_rows、precision、recall、匹配的列）
+    """
+    headers, rows = parse_markdown_table(answer)
+    if not headers:
+        return {
+            "status": "error",
+            "message": "答案中没有markdown表格"
+        }
+    try:
+        expected = _expected_rows(source_file, conditions, positions, ordering)
+    except PlannerError as e:
+        return {
+            "status": "error",
+            "message": str(e)
+        }
+    return _compare(headers, _answer_columns(headers, rows), _normalize_columns(expected), len(expected))
+
+
+def provenance_path(qa_file):
+    return qa_file + PROVENANCE_SUFFIX
+
+
+def append_provenance(qa_file, row, source_file, conditions, ordering=None):
+    """
+    记录一条问答的来源（调用方负责加锁，与问答写入在同一临界区内）
+
+    Args:
+        qa_file: 问答CSV路径
+        row: 问答所在的数据行号（从0开始，不含表头）
+        source_file: 源表CSV路径
+        conditions: 产生答案的筛选条件
+        ordering: 答案的排序和截取要求 {sort_by, ascending, limit}（可选）
+    """
+    record = {"row": row, "source_file": source_file, "conditions": conditions}
+    if ordering:
+        record.update(ordering)
+    with open(provenance_path(qa_file), 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+
+def read_provenance(qa_file):
+    """
+    读取问答来源记录
+
+    Returns:
+        dict: 数据行号 -> 来源记录（同一行有多条记录时以最后一条为准）
+    """
+    records = {}
+    try:
+        with open(provenance_path(qa_file), 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                records[record["row"]] = record
+    except OSError:
+        pass
+    return records
+
+
+def _normalize_answers(tables):
+    """所有答案的单元格合并成一列一次规范化，再按答案拆回每列"""
+    cells = [cell for headers, rows in tables for row in rows for cell in row]
+    normalized = normalize_values(pd.Series(cells, dtype=object)).to_numpy()
+    columns = []
+    offset = 0
+    for headers, rows in tables:
+        block = normalized[offset:offset + len(rows) * len(headers)].reshape(len(rows), len(headers))
+        offset += block.size
+        columns.append([block[:, i] for i in range(len(headers))])
+    return columns
+
+
+def _conditions_key(conditions):
+    return json.dumps(conditions, ensure_ascii=False, sort_keys=True, default=str)
+
+
+def _record_ordering(record):
+    """来源记录中的排序和截取要求（旧记录没有这些字段）"""
+    ordering = {key: record[key] for key in ("sort_by", "ascending", "limit") if record.get(key) is not None}
+    return ordering or None
+
+
+def _verify_source(source_file, group, answer_columns):
+    """
+    校验同一源表上的一组问答：相同条件只执行一次，各问答期望保留的行合并后只读取和规范化一次
+
+    Args:
+        source_file: 源表CSV路径
+        group: [(问答行号, 表头, 条件, 排序截取要求), ...]
+        answer_columns: 问答行号 -> 答案各列的规范化取值
+
+    Returns:
+        dict: 问答行号 -> 校验结果
+    """
+    unique = {}
+    for _, _, conditions, _ in group:
+        unique.setdefault(_conditions_key(conditions), conditions)
+
+    if use_streaming(source_file):
+        hits, _ = stream_filter_many(source_file, unique)
+    else:
+        df = load_table(source_file)
+        hits = {}
+        for key, conditions in unique.items():
+            try:
+                hits[key] = execute_conditions(source_file, df, conditions)
+            except PlannerError as e:
+                hits[key] = e
+
+    results = {}
+    targets = []
+    requests = []
+    for row, headers, conditions, ordering in group:
+        positions = hits[_conditions_key(conditions)]
+        if isinstance(positions, PlannerError):
+            results[row] = {"status": "error", "message": str(positions)}
+            continue
+        targets.append((row, headers))
+        requests.append({"positions": positions, **(ordering or {})})
+    # 只取出各问答期望保留的行（排序截取按原始取值进行），union 为升序的全局行号，各问答的期望行由行号二分查找得到
+    kept, union, rows = answer_rows(source_file, requests)
+    columns = _normalize_columns(rows)
+
+    for (row, headers), positions in zip(targets, kept):
+        if isinstance(positions, PlannerError):
+            results[row] = {"status": "error", "message": str(positions)}
+            continue
+        index = np.searchsorted(union, positions)
+        expected = {col: values[index] for col, values in columns.items()}
+        results[row] = _compare(headers, answer_columns[row], expected, len(index))
+    return results
+
+
+def verify_file(qa_file):
+    """
+    批量校验问答文件中所有记录了来源的问答
+
+    同一源表只加载一次，相同条件只执行一次，答案单元格和期望行各只规范化一次，
+    逐条问答只剩集合比对，数千条问答可在数秒内完成
+
+    Args:
+        qa_file: 问答CSV路径（query、answer 两列）
+
+    Returns:
+        dict: 汇总指标及每条问答的校验结果
+    """
+    started = time.perf_counter()
+    qa = pd.read_csv(qa_file, dtype=str, keep_default_na=False)
+    provenance = read_provenance(qa_file)
+
+    outcomes = {}
+    tables = {}
+    groups = defaultdict(list)
+    for row, answer in enumerate(qa["answer"]):
+        record = provenance.get(row)
+        if record is None:
+            outcomes[row] = {"status": "unverifiable", "message": "没有记录产生答案的筛选条件"}
+            continue
+        headers, rows = parse_markdown_table(answer)
+        if not headers:
+            outcomes[row] = {"status": "error", "message": "答案中没有markdown表格"}
+            continue
+        tables[row] = (headers, rows)
+        groups[record["source_file"]].append((row, headers, record["conditions"], _record_ordering(record)))
+
+    answer_columns = dict(zip(tables, _normalize_answers(list(tables.values()))))
+    for source_file, group in groups.items():
+        try:
+            outcomes.update(_verify_source(source_file, group, answer_columns))
+        except FileNotFoundError:
+            for row, _, _, _ in group:
+                outcomes[row] = {"status": "error", "message": f"文件未找到: {source_file}"}
+
+    results = [{"row": row, **outcomes[row]} for row in sorted(outcomes)]
+    verified = [r for r in results if r["status"] == "success"]
+    return {
+        "status": "success",
+        "qa_file": qa_file,
+        "total": len(results),
+        "verified": len(verified),
+        "unverifiable": sum(r["status"] == "unverifiable" for r in results),
+        "errors": sum(r["status"] == "error" for r in results),
+        "exact": sum(r["precision"] == 1.0 and r["recall"] == 1.0 for r in verified),
+        "mean_precision": round(float(np.mean([r["precision"] for r in verified])), 6) if verified else None,
+        "mean_recall": round(float(np.mean([r["recall"] for r in verified])), 6) if verified else None,
+        "seconds": round(time.perf_counter() - started, 3),
+        "results": results
+    }
+
+
+def main():
+    """命令行入口：python -m tools.qa_verify <问答CSV>..."""
+    parser = argparse.ArgumentParser(description='按记录的筛选条件重新执行，校验问答文件中的答案')
+    parser.add_argument('qa_files', nargs='+', help='问答CSV文件路径')
+    parser.add_argument('--output', help='完整校验报告的输出路径（JSON）')
+    parser.add_argument('--min-precision', type=float, default=1.0, help='低于该精确率的问答会被列出（默认1.0）')
+    parser.add_argument('--min-recall', type=float, default=1.0, help='低于该召回率的问答会被列出（默认1.0）')
+    args = parser.parse_args()
+
+    reports = []
+    for qa_file in args.qa_files:
+        report = verify_file(qa_file)
+        reports.append(report)
+        print(f"{qa_file}: 共{report['total']}条，校验{report['verified']}条，完全一致{report['exact']}条，"
+              f"无来源记录{report['unverifiable']}条，出错{report['errors']}条，"
+              f"平均精确率 {report['mean_precision']}，平均召回率 {report['mean_recall']}，耗时 {report['seconds']}s")
+        for result in report["results"]:
+            if result["status"] == "error":
+                print(f"  第{result['row']}行: 错误 - {result['message']}")
+            elif result["status"] == "success" and (result["precision"] < args.min_precision
+                                                   or result["recall"] < args.min_recall):
+                print(f"  第{result['row']}行: 精确率 {result['precision']}，召回率 {result['recall']}"
+                      f"（答案{result['answer_rows']}行，期望{result['expected_rows']}行，"
+                      f"未比对的列: {', '.join(result['unmatched_columns']) or '无'}）")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(reports if len(reports) > 1 else reports[0], f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,401 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from .table_index import RANGE_OPERATORS, fold_case, fold_values, get_index, get_text_index, lookup_positions, text_values
+
+SUPPORTED_OPERATORS = ("=", "!=", ">", "<", ">=", "<=", "contains", "startswith", "in", "between")
+# 文本匹配操作符：默认按字面、不区分大小写匹配
+TEXT_OPERATORS = ("contains", "startswith")
+
+# 无法从索引得到行数时使用的默认选择率
+DEFAULT_SELECTIVITY = {
+    "=": 0.05,
+    "in": 0.1,
+    "contains": 0.1,
+    "startswith": 0.05,
+    "between": 0.25,
+    ">": 0.33,
+    "<": 0.33,
+    ">=": 0.33,
+    "<=": 0.33,
+    "!=": 0.95
+}
+
+
+class PlannerError(ValueError):
+    """条件编译失败，消息可直接返回给模型"""
+
+
+def _is_numeric_column(series):
+    return pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series)
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise PlannerError(f"无法将值 '{value}' 转换为浮点数进行比较")
+
+
+def _coerce_value(series, value):
+    """数值列上的数字字符串按数值比较（工具参数中的 value 通常是字符串）"""
+    if isinstance(value, str) and _is_numeric_column(series):
+        try:
+            number = float(value)
+        except ValueError:
+            return value
+        return int(number) if number.is_integer() else number
+    return value
+
+
+def _split_values(value):
+    """in/between 的取值：数组，或逗号分隔的字符串"""
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    if isinstance(value, str):
+        return [part.strip() for part in value.split(",")]
+    return [value]
+
+
+def _same_value(a, b):
+    if isinstance(a, (int, float)) or isinstance(b, (int, float)):
+        try:
+            return float(a) == float(b)
+        except (TypeError, ValueError):
+            return False
+    return str(a) == str(b)
+
+
+def _equal_fraction(column, value, rows):
+    for item in column["top_values"]:
+        if _same_value(item["value"], value):
+            return item["count"] / rows
+    # 不在高频值中：出现次数不超过最少的高频值，按剩余取值均匀分布估计
+    top = column["top_values"]
+    rest_rows = column["non_null"] - sum(item["count"] for item in top)
+    rest_distinct = column["distinct"] - len(top)
+    if rest_distinct <= 0 or rest_rows <= 0:
+        return 0.0
+    return rest_rows / rest_distinct / rows
+
+
+def _range_fraction(histogram, lo, hi, rows):
+    """直方图中落在 [lo, hi] 内的行数占比（箱内按均匀分布）"""
+    edges = histogram["edges"]
+    total = 0.0
+    for i, count in enumerate(histogram["counts"]):
+        left, right = edges[i], edges[i + 1]
+        if right < lo or left > hi or not count:
+            continue
+        width = right - left
+        if width <= 0:
+            total += count
+            continue
+        covered = min(right, hi) - max(left, lo)
+        total += count * max(covered, 0.0) / width
+    return total / rows
+
+
+def profile_selectivity(column, operator, value, rows):
+    """
+    用画像估计单列条件的选择率
+
+    Args:
+        column: 列画像
+        operator: 操作符
+        value: 已规范化的条件取值（见 Predicate）
+        rows: 总行数
+
+    Returns:
+        float | None: 估计的命中行占比，无法估计时返回 None
+    """
+    if not rows:
+        return 0.0
+    if operator == "=":
+        return _equal_fraction(column, value, rows)
+    if operator == "!=":
+        return 1.0 - _equal_fraction(column, value, rows)
+    if operator == "in":
+        return min(1.0, sum(_equal_fraction(column, v, rows) for v in value))
+    if operator in TEXT_OPERATORS:
+        top = column["top_values"]
+        covered = sum(item["count"] for item in top)
+        if not covered:
+            return None
+        needle = fold_case(str(value))
+        if operator == "startswith":
+            matched = sum(item["count"] for item in top if fold_case(str(item["value"])).startswith(needle))
+        else:
+            matched = sum(item["count"] for item in top if needle in fold_case(str(item["value"])))
+        # 高频值中命中的比例外推到整列
+        return matched / covered * column["non_null"] / rows
+    histogram = column.get("histogram")
+    if not histogram or histogram["kind"] != "numeric":
+        return None
+    if operator == "between":
+        lo, hi = value
+    elif operator in (">", ">="):
+        lo, hi = value, float("inf")
+    elif operator in ("<", "<="):
+        lo, hi = float("-inf"), value
+    else:
+        return None
+    return _range_fraction(histogram, lo, hi, rows)
+
+
+class _Context:
+    def __init__(self, file_path, df, indexed=True, profile=None):
+        self.file_path = file_path
+        self.df = df
+        self.n_rows = len(df)
+        # 分块执行时 df 只是文件的一部分，不能使用整表的列索引
+        self.indexed = indexed
+        # 表格画像（可选），没有索引可用时用于估计选择率
+        self.profile = profile
+
+
+class Predicate:
+    """单列条件；文本匹配条件可指定 case（区分大小写）和 regex（contains 按正则匹配）"""
+
+    def __init__(self, df, column, operator, value, case=False, regex=False):
+        if column not in df.columns:
+            raise PlannerError(f"列 '{column}' 不存在于文件中")
+        if operator not in SUPPORTED_OPERATORS:
+            raise PlannerError(f"不支持的操作符: {operator}")
+        if not isinstance(case, bool) or not isinstance(regex, bool):
+            raise PlannerError("case和regex必须是布尔值")
+        series = df[column]
+        self.column = column
+        self.operator = operator
+        self.case = case
+        self.regex = regex and operator == "contains"
+
+        if operator in RANGE_OPERATORS:
+            self.value = _to_float(value)
+        elif operator == "in":
+            self.value = [_coerce_value(series, v) for v in _split_values(value)]
+        elif operator == "between":
+            bounds = _split_values(value)
+            if len(bounds) != 2:
+                raise PlannerError("between 操作符需要两个取值 [下限, 上限]")
+            self.value = (_to_float(bounds[0]), _to_float(bounds[1]))
+        elif operator in TEXT_OPERATORS:
+            self.value = str(value)
+            if self.regex:
+                try:
+                    re.compile(self.value)
+                except re.error as e:
+                    raise PlannerError(f"正则表达式 '{self.value}' 无效: {e}")
+        else:
+            self.value = _coerce_value(series, value)
+        self._exact = None
+        self._text_hits = None
+
+    def _index_positions(self, ctx):
+        """能走索引的条件返回精确命中行号，否则返回 None"""
+        if self._exact is not None:
+            return self._exact
+        if not ctx.indexed:
+            return None
+        op = self.operator
+        if op in ("=",) or op in RANGE_OPERATORS:
+            hit = lookup_positions(ctx.file_path, ctx.df, self.column, op, self.value)
+        elif op == "in":
+            index = get_index(ctx.file_path, ctx.df, self.column)
+            parts = [index.equal(v) for v in self.value]
+            hit = np.unique(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+        elif op == "between" and _is_numeric_column(ctx.df[self.column]):
+            index = get_index(ctx.file_path, ctx.df, self.column)
+            lo, hi = self.value
+            hit = np.intersect1d(index.range(">=", lo), index.range("<=", hi), assume_unique=True)
+        else:
+            hit = None
+        self._exact = hit
+        return hit
+
+    def _text_index(self, ctx):
+        """文本匹配条件可用的文本索引（正则匹配、分块执行或列过长时为 None）"""
+        if self.operator not in TEXT_OPERATORS or self.regex or not ctx.indexed:
+            return None
+        return get_text_index(ctx.file_path, ctx.df, self.column)
+
+    def _text_count(self, index):
+        if self._text_hits is None:
+            self._text_hits = index.count(self.value, prefix=self.operator == "startswith")
+        return self._text_hits
+
+    def estimate(self, ctx):
+        """估计选择率（命中行占比），索引可用时为精确值（文本索引为上界）"""
+        if ctx.n_rows == 0:
+            return 0.0
+        if self.operator == "!=" and ctx.indexed:
+            index = get_index(ctx.file_path, ctx.df, self.column)
+            return 1.0 - len(index.equal(self.value)) / ctx.n_rows
+        text_index = self._text_index(ctx)
+        if text_index is not None:
+            return self._text_count(text_index) / ctx.n_rows
+        hit = self._index_positions(ctx)
+        if hit is not None:
+            return len(hit) / ctx.n_rows
+        if ctx.profile is not None and self.column in ctx.profile["columns"]:
+            estimate = profile_selectivity(ctx.profile["columns"][self.column], self.operator, self.value,
+                                           ctx.profile["rows"])
+            if estimate is not None:
+                return estimate
+        return DEFAULT_SELECTIVITY[self.operator]
+
+    def _mask(self, series):
+        op = self.operator
+        val = self.value
+        if op == "=":
+            return series == val
+        if op == "!=":
+            return series != val
+        if op == ">":
+            return series > val
+        if op == "<":
+            return series < val
+        if op == ">=":
+            return series >= val
+        if op == "<=":
+            return series <= val
+        if op == "in":
+            return series.isin(val)
+        if op == "between":
+            return series.between(val[0], val[1])
+        # 文本匹配与文本索引使用相同的转换和大小写折叠（fold_case），缺失值不匹配
+        text = text_values(series)
+        if self.regex:
+            return text.str.contains(val, case=self.case, regex=True, na=False)
+        if not self.case:
+            text, val = fold_values(text), fold_case(val)
+        if op == "startswith":
+            return text.str.startswith(val, na=False)
+        return text.str.contains(val, regex=False, na=False)
+
+    def evaluate(self, ctx, candidates):
+        """在候选行上求值，返回升序命中行号"""
+        text_index = self._text_index(ctx)
+        # 文本索引命中的上界不超过候选行数时才查索引，否则直接在（更少的）候选行上匹配
+        if text_index is not None and self._exact is None and \
+                (candidates is None or self._text_count(text_index) <= len(candidates)):
+            self._exact = text_index.search(self.value, prefix=self.operator == "startswith", case=self.case)
+        hit = self._index_positions(ctx)
+        if hit is not None and (candidates is None or len(hit) <= len(candidates)):
+            return hit if candidates is None else np.intersect1d(candidates, hit, assume_unique=True)
+        series = ctx.df[self.column] if candidates is None else ctx.df[self.column].iloc[candidates]
+        mask = self._mask(series).to_numpy(dtype=bool)
+        return np.flatnonzero(mask) if candidates is None else candidates[mask]
+
+
+class AllGroup:
+    """AND 组：按选择率从低到高依次收窄候选行"""
+
+    def __init__(self, children):
+        self.children = children
+
+    def estimate(self, ctx):
+        result = 1.0
+        for child in self.children:
+            result *= child.estimate(ctx)
+        return result
+
+    def evaluate(self, ctx, candidates):
+        ordered = sorted(self.children, key=lambda child: child.estimate(ctx))
+        for child in ordered:
+            candidates = child.evaluate(ctx, candidates)
+            if len(candidates) == 0:
+                break
+        return candidates if candidates is not None else np.arange(ctx.n_rows)
+
+
+class AnyGroup:
+    """OR 组：各分支在同一候选集上求值后取并集"""
+
+    def __init__(self, children):
+        self.children = children
+
+    def estimate(self, ctx):
+        return min(1.0, sum(child.estimate(ctx) for child in self.children))
+
+    def evaluate(self, ctx, candidates):
+        result = np.empty(0, dtype=np.int64)
+        for child in self.children:
+            result = np.union1d(result, child.evaluate(ctx, candidates))
+        return result
+
+
+def _compile_node(df, node):
+    if not isinstance(node, dict):
+        raise PlannerError("每个条件必须是包含'column'、'operator'和'value'的字典")
+    if "any" in node or "all" in node:
+        key = "any" if "any" in node else "all"
+        members = node[key]
+        if not isinstance(members, list) or not members:
+            raise PlannerError(f"'{key}' 条件组必须是非空列表")
+        children = [_compile_node(df, member) for member in members]
+        return AnyGroup(children) if key == "any" else AllGroup(children)
+    if "column" not in node:
+        raise PlannerError("每个条件必须是包含'column'、'operator'和'value'的字典")
+    return Predicate(df, node["column"], node.get("operator"), node.get("value"),
+                     node.get("case", False), node.get("regex", False))
+
+
+def compile_conditions(df, conditions):
+    """
+    将条件列表编译为查询计划（顶层各条件为 AND 关系）
+
+    Args:
+        df: 表格
+        conditions: 条件列表，元素为 {"column", "operator", "value"}，
+            或 {"any": [...]} / {"all": [...]} 条件组
+
+    Returns:
+        AllGroup: 可执行的查询计划
+    """
+    if not isinstance(conditions, list):
+        raise PlannerError("conditions参数必须是列表格式")
+    return AllGroup([_compile_node(df, cond) for cond in conditions])
+
+
+def condition_columns(conditions):
+    """
+    收集条件（含嵌套条件组）引用的列名，按首次出现的顺序
+
+    Args:
+        conditions: 条件列表
+
+    Returns:
+        list: 列名
+    """
+    columns = []
+    stack = list(reversed(conditions)) if isinstance(conditions, list) else []
+    while stack:
+        node = stack.pop()
+        if not isinstance(node, dict):
+            continue
+        for key in ("any", "all"):
+            if isinstance(node.get(key), list):
+                stack.extend(reversed(node[key]))
+        if "column" in node and node["column"] not in columns:
+            columns.append(node["column"])
+    return columns
+
+
+def execute_conditions(file_path, df, conditions, profile=None):
+    """
+    编译并执行条件，按估计选择率从低到高执行，全程只操作行号
+
+    Args:
+        file_path: CSV文件路径（用于定位列索引）；为 None 时不使用索引（例如 df 只是一个分块）
+        df: 缓存表格
+        conditions: 条件列表
+        profile: 表格画像（可选，见 table_profile），用于没有索引时估计选择率
+
+    Returns:
+        ndarray: 升序排列的命中行号
+    """
+    plan = compile_conditions(df, conditions)
+    return plan.evaluate(_Context(file_path, df, indexed=file_path is not None, profile=profile), None)
@@ -0,0 +1,83 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from .table_cache import file_signature
+
+# 最多保留的结果句柄数量，超出后按LRU淘汰
+MAX_RESULTS = 256
+
+_lock = threading.Lock()
+_results = OrderedDict()
+
+
+class StoredResult:
+    """筛选结果句柄：只保存命中行号，不保存数据本身"""
+
+    def __init__(self, file_path, positions, conditions, n_rows=None, ordering=None):
+        self.file_path = file_path
+        self.signature = file_signature(file_path)
+        self.positions = positions
+        self.conditions = conditions
+        # 源表总行数（分块执行时翻页不再扫描全表，直接使用）
+        self.n_rows = n_rows
+        # 答案句柄的排序和截取要求 {sort_by, ascending, limit}，positions 为排序截取后的行号
+        self.ordering = ordering
+
+
+def save_result(file_path, positions, conditions=None, n_rows=None, ordering=None):
+    """
+    保存筛选结果，返回可在后续轮次翻页的句柄
+
+    Args:
+        file_path: CSV文件路径
+        positions: 命中行号
+        conditions: 产生该结果的条件（可选，便于回溯）
+        n_rows: 源表总行数（可选）
+        ordering: 排序和截取要求（可选，positions 已按其排序截取时提供，记录到答案来源中）
+
+    Returns:
+        str: 结果句柄（同一文件版本上的相同条件得到相同句柄，保证重放时工具输出一致）
+    """
+    stored = StoredResult(file_path, positions, conditions, n_rows, ordering)
+    key = [list(stored.signature), conditions]
+    if ordering:
+        key.append(ordering)
+    key = json.dumps(key, ensure_ascii=False, sort_keys=True, default=str)
+    result_id = "r_" + hashlib.sha1(key.encode("utf-8")).hexdigest()[:10]
+    with _lock:
+        _results[result_id] = stored
+        _results.move_to_end(result_id)
+        while len(_results) > MAX_RESULTS:
+            _results.popitem(last=False)
+    return result_id
+
+
+def get_result(result_id):
+    """
+    获取结果句柄，句柄不存在或源文件已变更时返回 None
+
+    Args:
+        result_id: 结果句柄
+
+    Returns:
+        StoredResult | None: 保存的结果
+    """
+    with _lock:
+        stored = _results.get(result_id)
+        if stored is None:
+            return None
+        _results.move_to_end(result_id)
+    try:
+        if file_signature(stored.file_path) != stored.signature:
+            return None
+    except OSError:
+        return None
+    return stored
+
+
+def clear_results():
+    """清空所有结果句柄"""
+    with _lock:
+        _results.clear()
@@ -0,0 +1,185 @@
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from .table_sidecar import load_sidecar, convert_to_sidecar
+
+# 默认内存预算（MB），可通过环境变量 TABLE_CACHE_MAX_MB 覆盖
+DEFAULT_MAX_MB = 1024
+# 设置 TABLE_SIDECAR_AUTO=1 后，首次解析CSV时自动生成列式侧车文件
+AUTO_SIDECAR = os.getenv("TABLE_SIDECAR_AUTO", "0") == "1"
+
+
+class _CacheEntry:
+    """缓存条目：解析好的 DataFrame 及其占用的字节数"""
+
+    def __init__(self, signature, df):
+        self.signature = signature
+        self.df = df
+        self.nbytes = int(df.memory_usage(deep=True).sum())
+        # 挂在同一张表上的派生结构（索引等），随表一起失效
+        self.extras = {}
+
+
+_lock = threading.Lock()
+_entries = OrderedDict()
+_loading_locks = {}
+_max_bytes = int(float(os.getenv("TABLE_CACHE_MAX_MB", DEFAULT_MAX_MB)) * 1024 * 1024)
+_total_bytes = 0
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+
+def file_signature(file_path):
+    """
+    计算文件签名，用于判断缓存是否过期
+
+    Args:
+        file_path: 文件路径
+
+    Returns:
+        tuple: (绝对路径, 修改时间ns, 文件大小)
+    """
+    abs_path = os.path.abspath(file_path)
+    st = os.stat(abs_path)
+    return (abs_path, st.st_mtime_ns, st.st_size)
+
+
+def _read_source(file_path):
+    """从磁盘加载表格：优先使用有效的列式侧车文件，过期或缺失时回退到CSV"""
+    df = load_sidecar(file_path)
+    if df is not None:
+        return df
+    df = pd.read_csv(file_path)
+    if AUTO_SIDECAR:
+        convert_to_sidecar(file_path, df=df)
+    return df
+
+
+def _evict_locked():
+    """按LRU顺序淘汰条目直到满足内存预算（调用方需持有 _lock）"""
+    global _total_bytes
+    # 至少保留最近使用的一张表，即使它单独超出预算
+    while _total_bytes > _max_bytes and len(_entries) > 1:
+        _, entry = _entries.popitem(last=False)
+        _total_bytes -= entry.nbytes
+        _stats["evictions"] += 1
+
+
+def _get_entry(file_path):
+    """获取（必要时加载）缓存条目"""
+    global _total_bytes
+    signature = file_signature(file_path)
+    abs_path = signature[0]
+
+    with _lock:
+        entry = _entries.get(abs_path)
+        if entry is not None and entry.signature == signature:
+            _entries.move_to_end(abs_path)
+            _stats["hits"] += 1
+            return entry
+        # 同一文件的并发加载只解析一次
+        loading_lock = _loading_locks.setdefault(abs_path, threading.Lock())
+
+    with loading_lock:
+        with _lock:
+            entry = _entries.get(abs_path)
+            if entry is not None and entry.signature == signature:
+                _entries.move_to_end(abs_path)
+                _stats["hits"] += 1
+                return entry
+
+        df = _read_source(file_path)
+        entry = _CacheEntry(signature, df)
+
+        with _lock:
+            old = _entries.pop(abs_path, None)
+            if old is not None:
+                _total_bytes -= old.nbytes
+            _entries[abs_path] = entry
+            _total_bytes += entry.nbytes
+            _stats["misses"] += 1
+            _evict_locked()
+        return entry
+
+
+def load_table(file_path):
+    """
+    通过缓存读取表格。返回的 DataFrame 在各工具间共享，调用方不得原地修改
+
+    Args:
+        file_path: CSV文件路径
+
+    Returns:
+        DataFrame: 解析后的表格
+    """
+    return _get_entry(file_path).df
+
+
+def peek_table(file_path):
+    """
+    只查看缓存：表格已加载且未过期时返回，否则返回 None（不触发加载，不计入命中统计）
+
+    Args:
+        file_path: CSV文件路径
+
+    Returns:
+        DataFrame | None: 缓存中的表格
+    """
+    signature = file_signature(file_path)
+    with _lock:
+        entry = _entries.get(signature[0])
+        if entry is not None and entry.signature == signature:
+            return entry.df
+    return None
+
+
+def table_extras(file_path):
+    """
+    获取与表格缓存条目绑定的派生数据字典（文件变更或被淘汰时一并失效）
+
+    Args:
+        file_path: CSV文件路径
+
+    Returns:
+        dict: 可供索引等模块存放派生结构的字典
+    """
+    return _get_entry(file_path).extras
+
+
+def set_cache_budget(max_bytes):
+    """
+    设置缓存内存预算
+
+    Args:
+        max_bytes: 最大字节数
+    """
+    global _max_bytes
+    with _lock:
+        _max_bytes = int(max_bytes)
+        _evict_locked()
+
+
+def clear_table_cache():
+    """清空缓存"""
+    global _total_bytes
+    with _lock:
+        _entries.clear()
+        _total_bytes = 0
+
+
+def cache_stats():
+    """
+    获取缓存统计信息
+
+    Returns:
+        dict: 命中、未命中、淘汰次数及当前占用
+    """
+    with _lock:
+        return {
+            **_stats,
+            "tables": len(_entries),
+            "bytes": _total_bytes,
+            "max_bytes": _max_bytes
+        }
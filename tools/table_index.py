@@ -0,0 +1,464 @@
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from .table_cache import file_signature, table_extras
+from .table_sidecar import pack_strings, unpack_strings
+
+# 设置 TABLE_INDEX_PERSIST=0 可关闭索引落盘（默认保存到 <csv>.idx/ 供后续会话复用）
+PERSIST_INDEX = os.getenv("TABLE_INDEX_PERSIST", "1") != "0"
+INDEX_DIR_SUFFIX = ".idx"
+# 索引文件格式版本，索引结构变化时递增，旧版本的索引文件会重新构建
+INDEX_FORMAT_VERSION = 3
+
+RANGE_OPERATORS = (">", "<", ">=", "<=")
+# 文本索引覆盖的字符总数上限（按不同取值计），超出的列不建文本索引，contains 回退为逐行扫描
+TEXT_INDEX_MAX_CHARS = int(os.getenv("TABLE_TEXT_INDEX_MAX_CHARS", "50000000"))
+# 构建文本索引时每批处理的字符数，限制临时数组的内存
+TEXT_INDEX_BATCH_CHARS = 4000000
+# 二元组键 = 前一字符码位 << 21 | 后一字符码位（Unicode 码位不超过21位）
+_CODEPOINT_BITS = np.uint64(21)
+
+
+class HashIndex:
+    """等值索引：按取值分组的行号（CSR结构），适用于类别型列"""
+
+    kind = "hash"
+
+    def __init__(self, series):
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+        order = np.argsort(codes, kind="stable")
+        counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+        # 缺失值（code=-1）排在最前，跳过它们
+        start = int((codes < 0).sum())
+        self.positions = order[start:]
+        self.offsets = np.concatenate(([0], np.cumsum(counts)))
+        self.lookup_map = {value: i for i, value in enumerate(uniques.tolist())}
+        self.distinct = len(uniques)
+
+    def to_arrays(self):
+        """落盘的数组；取值不全是字符串（无法不经 pickle 保存）时返回 None，只在内存中缓存"""
+        packed = pack_strings(list(self.lookup_map))
+        if packed is None:
+            return None
+        return {"positions": self.positions, "offsets": self.offsets, "values": packed[0], "value_offsets": packed[1]}
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        index = cls.__new__(cls)
+        index.positions = arrays["positions"]
+        index.offsets = arrays["offsets"]
+        values = unpack_strings(arrays["values"], arrays["value_offsets"])
+        index.lookup_map = {value: i for i, value in enumerate(values)}
+        index.distinct = len(index.lookup_map)
+        return index
+
+    def equal(self, value):
+        code = self.lookup_map.get(value)
+        if code is None:
+            return np.empty(0, dtype=np.int64)
+        return self.positions[self.offsets[code]:self.offsets[code + 1]]
+
+
+class SortedIndex:
+    """有序索引：排序后的取值和对应行号，适用于数值列的等值和范围查询"""
+
+    kind = "sorted"
+
+    def __init__(self, series):
+        values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+        order = np.argsort(values, kind="stable")
+        sorted_values = values[order]
+        # NaN 排在末尾，不参与任何比较
+        valid = int((~np.isnan(sorted_values)).sum())
+        self.order = order[:valid]
+        self.sorted_values = sorted_values[:valid]
+
+    def to_arrays(self):
+        return {"order": self.order, "sorted_values": self.sorted_values}
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        index = cls.__new__(cls)
+        index.order = arrays["order"]
+        index.sorted_values = arrays["sorted_values"]
+        return index
+
+    def _slice(self, lo, hi):
+        return np.sort(self.order[lo:hi])
+
+    def equal(self, value):
+        if isinstance(value, bool) or not isinstance(value, (int, float, np.number)):
+            # 与 pandas 语义一致：数值列和字符串比较恒为 False
+            return np.empty(0, dtype=np.int64)
+        lo = np.searchsorted(self.sorted_values, value, side="left")
+        hi = np.searchsorted(self.sorted_values, value, side="right")
+        return self._slice(lo, hi)
+
+    def range(self, operator, value):
+        if operator == ">":
+            return self._slice(np.searchsorted(self.sorted_values, value, side="right"), len(self.order))
+        if operator == ">=":
+            return self._slice(np.searchsorted(self.sorted_values, value, side="left"), len(self.order))
+        if operator == "<":
+            return self._slice(0, np.searchsorted(self.sorted_values, value, side="left"))
+        if operator == "<=":
+            return self._slice(0, np.searchsorted(self.sorted_values, value, side="right"))
+        raise ValueError(f"不支持的范围操作符: {operator}")
+
+
+def text_values(series):
+    """列取值转为文本（与 str 转换一致），缺失值保持缺失；文本索引和逐行扫描使用同一转换"""
+    return series.astype(str).where(series.notna())
+
+
+class _CaseFold(dict):
+    """逐字符 casefold 的 str.translate 转换表，按需填充；折叠为多个字符的（如 ß、İ）保持原字符"""
+
+    def __missing__(self, code):
+        folded = chr(code).casefold()
+        self[code] = value = ord(folded) if len(folded) == 1 else code
+        return value
+
+
+_CASE_FOLD = _CaseFold()
+
+
+def fold_case(text):
+    """
+    不区分大小写匹配使用的统一折叠：逐字符 casefold，与上下文无关且不改变文本长度
+    （整串 lower() 会把词尾的 Σ 变为 ς、把 İ 变为两个字符）；文本索引和逐行扫描共用
+
+    Args:
+        text: 字符串
+
+    Returns:
+        str: 折叠后的字符串
+    """
+    return text.translate(_CASE_FOLD)
+
+
+def fold_values(series):
+    """逐个取值做 fold_case，缺失值保持缺失"""
+    return series.str.translate(_CASE_FOLD)
+
+
+def _codepoints(texts):
+    """多个字符串的 Unicode 码位：每个字符串前各有一个0作为分隔（取值开头标记），末尾再接一个0"""
+    joined = "\0" + "\0".join(texts) + "\0"
+    return np.frombuffer(joined.encode("utf-32-le", "surrogatepass"), dtype=np.uint32)
+
+
+def _sorted_unique(values):
+    """排序去重（对高基数整数数组比 np.unique 的哈希实现快得多）"""
+    values = np.sort(values)
+    if len(values) > 1:
+        values = values[np.concatenate(([True], values[1:] != values[:-1]))]
+    return values
+
+
+def _bigram_keys(codepoints):
+    return (codepoints[:-1].astype(np.uint64) << _CODEPOINT_BITS) | codepoints[1:]
+
+
+class TextIndex:
+    """
+    文本索引：对列中不同取值（经 fold_case 折叠）的字符二元组建立倒排表，用于 contains 和 startswith
+
+    按 Unicode 字符切分，中日韩文本无需分词。每个取值前后的分隔符也参与组成二元组：
+    (0, 首字符) 表示以该字符开头，(末字符, 0) 保证每个字符都是某个二元组的前一个字符，
+    因此单字符查询和前缀查询同样由倒排表得到
+    """
+
+    kind = "text"
+    # 落盘的数值数组；取值文本另行编码，折叠文本加载时重新计算
+    _ARRAYS = ("codes", "counts", "keys", "offsets", "postings", "key_rows")
+
+    def __init__(self, series):
+        codes, uniques = pd.factorize(text_values(series), use_na_sentinel=True)
+        self.codes = codes.astype(np.int32)
+        self.values = np.asarray(uniques, dtype=object)
+        self.folded = np.asarray(fold_values(pd.Series(self.values, dtype=object)), dtype=object)
+        # 每个取值的行数，用于不经确认地估计命中行数
+        self.counts = np.bincount(self.codes[self.codes >= 0], minlength=len(self.values))
+        self._build_postings()
+
+    def to_arrays(self):
+        packed = pack_strings(self.values.tolist())
+        if packed is None:
+            return None
+        arrays = {name: getattr(self, name) for name in self._ARRAYS}
+        arrays.update(values=packed[0], value_offsets=packed[1])
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        index = cls.__new__(cls)
+        for name in cls._ARRAYS:
+            setattr(index, name, arrays[name])
+        index.values = np.asarray(unpack_strings(arrays["values"], arrays["value_offsets"]), dtype=object)
+        index.folded = np.asarray(fold_values(pd.Series(index.values, dtype=object)), dtype=object)
+        return index
+
+    def _batch_pairs(self, start, end, lengths):
+        """一批取值的 (二元组键, 取值编号)，按键、编号排序并去重"""
+        codepoints = _codepoints(self.folded[start:end].tolist())
+        # 二元组归属其第一个位置所在的取值（取值前的分隔符归属该取值）
+        offsets = np.arange(end - start, dtype=np.uint64)
+        docs = np.repeat(offsets, lengths[start:end] + 1)
+        valid = (codepoints[:-1] != 0) | (codepoints[1:] != 0)
+        # 一批不超过 2^22 个取值，键（42位）和批内编号合成一个64位整数排序
+        pairs = _sorted_unique((_bigram_keys(codepoints)[valid] << np.uint64(22)) | docs[valid])
+        return pairs >> np.uint64(22), (pairs & np.uint64((1 << 22) - 1)).astype(np.int32) + np.int32(start)
+
+    def _build_postings(self):
+        lengths = np.fromiter((len(text) for text in self.folded), dtype=np.int64, count=len(self.folded))
+        ends = np.cumsum(lengths + 1)
+        batches = []
+        start = 0
+        while start < len(self.folded):
+            base = ends[start - 1] if start else 0
+            end = int(np.searchsorted(ends, base + TEXT_INDEX_BATCH_CHARS, side="right"))
+            end = min(max(start + 1, end), start + (1 << 22))
+            batches.append(self._batch_pairs(start, end, lengths))
+            start = end
+
+        self.keys = _sorted_unique(np.concatenate([keys for keys, _ in batches])) if batches else np.empty(0, np.uint64)
+        batches = [(np.searchsorted(self.keys, keys), docs) for keys, docs in batches]
+        counts = np.zeros(len(self.keys), dtype=np.int64)
+        for key_ids, _ in batches:
+            counts += np.bincount(key_ids, minlength=len(self.keys))
+        self.offsets = np.concatenate(([0], np.cumsum(counts)))
+        # 批按取值编号先后处理、批内按键和编号排序，逐批填入各键的倒排表即保持编号升序，无需全局排序
+        self.postings = np.empty(int(self.offsets[-1]), dtype=np.int32)
+        filled = self.offsets[:-1].copy()
+        for key_ids, docs in batches:
+            if not len(key_ids):
+                continue
+            first = np.concatenate(([True], key_ids[1:] != key_ids[:-1]))
+            segment_starts = np.flatnonzero(first)
+            rank = np.arange(len(key_ids)) - np.repeat(segment_starts, np.diff(np.append(segment_starts, len(key_ids))))
+            self.postings[filled[key_ids] + rank] = docs
+            filled[key_ids[segment_starts]] += np.diff(np.append(segment_starts, len(key_ids)))
+        # 每个二元组出现在多少行中，用于快速估计命中行数的上界
+        self.key_rows = np.add.reduceat(self.counts[self.postings], self.offsets[:-1]) \
+            if len(self.postings) else np.zeros(len(self.keys), dtype=np.int64)
+
+    def _posting(self, key):
+        i = np.searchsorted(self.keys, key)
+        if i == len(self.keys) or self.keys[i] != key:
+            return np.empty(0, dtype=np.int32)
+        return self.postings[self.offsets[i]:self.offsets[i + 1]]
+
+    def _candidates(self, needle, prefix):
+        """
+        候选取值：折叠文本包含 needle（已折叠）全部二元组的取值编号
+
+        Returns:
+            tuple: (候选编号, 候选是否已精确)
+        """
+        if not needle:
+            return np.arange(len(self.values), dtype=np.int32), True
+        codepoints = np.frombuffer(needle.encode("utf-32-le", "surrogatepass"), dtype=np.uint32)
+        if prefix:
+            codepoints = np.concatenate(([0], codepoints)).astype(np.uint32)
+        elif len(codepoints) == 1:
+            # 单字符：以该字符开头的全部二元组（键连续），标记后取出，避免对大量行号排序
+            lo_key = np.uint64(codepoints[0]) << _CODEPOINT_BITS
+            lo, hi = np.searchsorted(self.keys, [lo_key, lo_key + (np.uint64(1) << _CODEPOINT_BITS)])
+            marked = np.zeros(len(self.values), dtype=bool)
+            marked[self.postings[self.offsets[lo]:self.offsets[hi]]] = True
+            return np.flatnonzero(marked), True
+        postings = sorted((self._posting(key) for key in _sorted_unique(_bigram_keys(codepoints))), key=len)
+        ids = postings[0]
+        for posting in postings[1:]:
+            if len(ids) == 0:
+                break
+            # 倒排表都是升序，从最短的开始在较长的表中二分查找，不必对长表排序
+            found = np.minimum(np.searchsorted(posting, ids), len(posting) - 1)
+            ids = ids[posting[found] == ids]
+        # 只有一个二元组时命中即精确；多个二元组同时出现不代表连续出现
+        return ids, len(codepoints) == 2
+
+    def count(self, needle, prefix=False):
+        """命中行数的上界（只查各二元组的行数，不求交集），供查询计划估计选择率"""
+        needle = fold_case(str(needle))
+        total = int(self.counts.sum())
+        if not needle:
+            return total
+        codepoints = np.frombuffer(needle.encode("utf-32-le", "surrogatepass"), dtype=np.uint32)
+        if prefix:
+            codepoints = np.concatenate(([0], codepoints)).astype(np.uint32)
+        elif len(codepoints) == 1:
+            lo_key = np.uint64(codepoints[0]) << _CODEPOINT_BITS
+            lo, hi = np.searchsorted(self.keys, [lo_key, lo_key + (np.uint64(1) << _CODEPOINT_BITS)])
+            return min(total, int(self.key_rows[lo:hi].sum()))
+        keys = _bigram_keys(codepoints)
+        found = np.minimum(np.searchsorted(self.keys, keys), max(len(self.keys) - 1, 0))
+        if not len(self.keys) or (self.keys[found] != keys).any():
+            return 0
+        return int(self.key_rows[found].min())
+
+    def search(self, needle, prefix=False, case=False):
+        """
+        查找文本包含（或以之开头）needle 的行，按字面匹配
+
+        Args:
+            needle: 查找的文本
+            prefix: 为 True 时只匹配开头
+            case: 为 True 时区分大小写
+
+        Returns:
+            ndarray: 升序排列的命中行号
+        """
+        needle = str(needle)
+        if case:
+            # 区分大小写时不用折叠文本的二元组剪枝，直接在不同取值上按原文匹配
+            texts = pd.Series(self.values, dtype=object)
+            matched = texts.str.startswith(needle) if prefix else texts.str.contains(needle, regex=False)
+            ids = np.flatnonzero(matched.to_numpy(dtype=bool))
+        else:
+            target = fold_case(needle)
+            ids, exact = self._candidates(target, prefix)
+            if len(ids) and not exact:
+                texts = pd.Series(self.folded[ids], dtype=object)
+                matched = texts.str.startswith(target) if prefix else texts.str.contains(target, regex=False)
+                ids = ids[matched.to_numpy(dtype=bool)]
+        selected = np.zeros(len(self.values) + 1, dtype=bool)
+        selected[ids] = True
+        # 缺失值的编号为 -1，落在最后一个（始终为 False 的）位置
+        return np.flatnonzero(selected[self.codes])
+
+
+def _index_kind(series):
+    """数值列使用有序索引，其余列使用等值索引"""
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return "sorted"
+    return "hash"
+
+
+def _index_path(signature, column, kind):
+    digest = hashlib.md5(str(column).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(signature[0] + INDEX_DIR_SUFFIX, f"{kind}_{digest}.npz")
+
+
+def _index_meta(signature, column, kind):
+    return {"format_version": INDEX_FORMAT_VERSION, "signature": list(signature[1:]), "column": str(column), "kind": kind}
+
+
+def _load_persisted(signature, column, kind):
+    """加载落盘的索引（不允许 pickle）；文件缺失、损坏、格式版本或源文件签名不符时返回 None，由调用方重新构建"""
+    try:
+        with np.load(_index_path(signature, column, kind), allow_pickle=False) as data:
+            meta = json.loads(data["meta"].tobytes().decode("utf-8"))
+            if meta != _index_meta(signature, column, kind):
+                return None
+            arrays = {name: data[name] for name in data.files if name != "meta"}
+        return _INDEX_CLASSES[kind].from_arrays(arrays)
+    except Exception:
+        return None
+
+
+def _persist(signature, column, index):
+    arrays = index.to_arrays()
+    if arrays is None:
+        return
+    meta = json.dumps(_index_meta(signature, column, index.kind), ensure_ascii=False).encode("utf-8")
+    arrays["meta"] = np.frombuffer(meta, dtype=np.uint8)
+    path = _index_path(signature, column, index.kind)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+    except OSError:
+        # 数据目录只读时仅保留内存中的索引
+        pass
+
+
+_INDEX_CLASSES = {"hash": HashIndex, "sorted": SortedIndex, "text": TextIndex}
+
+
+def _cached_index(file_path, df, column, kind, key):
+    extras = table_extras(file_path)
+    indexes = extras.setdefault("indexes", {})
+    if key in indexes:
+        return indexes[key]
+
+    lock = extras.setdefault("index_lock", threading.Lock())
+    with lock:
+        if key in indexes:
+            return indexes[key]
+        signature = file_signature(file_path)
+        index = _load_persisted(signature, column, kind) if PERSIST_INDEX else None
+        if index is None:
+            index = _INDEX_CLASSES[kind](df[column])
+            if PERSIST_INDEX:
+                _persist(signature, column, index)
+        indexes[key] = index
+        return index
+
+
+def get_index(file_path, df, column):
+    """
+    获取列索引，首次使用时构建，之后在同一张缓存表的各轮次间复用
+
+    Args:
+        file_path: CSV文件路径
+        df: 该文件对应的缓存表格
+        column: 列名
+
+    Returns:
+        HashIndex | SortedIndex: 列索引
+    """
+    return _cached_index(file_path, df, column, _index_kind(df[column]), column)
+
+
+def get_text_index(file_path, df, column):
+    """
+    获取列的文本索引（contains / startswith 使用），首次使用时构建并与其他列索引一样缓存和落盘
+
+    Args:
+        file_path: CSV文件路径
+        df: 该文件对应的缓存表格
+        column: 列名
+
+    Returns:
+        TextIndex | None: 文本索引；列的不同取值文本过长（超过 TEXT_INDEX_MAX_CHARS）时返回 None
+    """
+    key = ("text", column)
+    indexes = table_extras(file_path).get("indexes", {})
+    if key in indexes:
+        return indexes[key]
+    hash_index = indexes.get(column)
+    distinct = hash_index.lookup_map if isinstance(hash_index, HashIndex) else df[column].dropna().unique()
+    if sum(len(str(value)) for value in distinct) > TEXT_INDEX_MAX_CHARS:
+        table_extras(file_path).setdefault("indexes", {})[key] = None
+        return None
+    return _cached_index(file_path, df, column, "text", key)
+
+
+def lookup_positions(file_path, df, column, operator, value):
+    """
+    尝试用索引求解单个条件
+
+    Args:
+        file_path: CSV文件路径
+        df: 缓存表格
+        column: 列名
+        operator: 操作符
+        value: 比较值（范围操作符需已转换为数值）
+
+    Returns:
+        ndarray | None: 升序排列的命中行号；条件不适合走索引时返回 None
+    """
+    if operator == "=":
+        return get_index(file_path, df, column).equal(value)
+    if operator in RANGE_OPERATORS and _index_kind(df[column]) == "sorted":
+        return get_index(file_path, df, column).range(operator, value)
+    return None
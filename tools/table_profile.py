@@ -0,0 +1,310 @@
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from .table_cache import file_signature, load_table
+from .chunked_engine import iter_chunks, use_streaming
+
+PROFILE_SUFFIX = ".profile.json"
+# 画像格式版本，格式或计算方式变化时递增，旧版本的画像文件会重新计算
+PROFILE_FORMAT_VERSION = 2
+# 每列保存的高频值个数和直方图分箱数
+STORED_TOP_N = 20
+HISTOGRAM_BINS = 10
+# 高频值展示时的最大字符数
+VALUE_PREVIEW_CHARS = 100
+# 判断文本列是否为日期列时检查的不同取值个数
+DATE_PROBE_VALUES = 100
+# 设置 TABLE_PROFILE_PERSIST=0 可关闭画像落盘（只在进程内缓存）
+PERSIST_PROFILE = os.getenv("TABLE_PROFILE_PERSIST", "1") != "0"
+
+_lock = threading.Lock()
+_profiles = {}
+
+
+def _plain(value):
+    """numpy 标量转为可JSON序列化的 Python 值"""
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _preview(value):
+    if isinstance(value, str) and len(value) > VALUE_PREVIEW_CHARS:
+        return value[:VALUE_PREVIEW_CHARS] + "…"
+    return value
+
+
+def _as_dates(values):
+    """文本取值大多能按 ISO 8601 解析时返回解析结果，否则返回 None"""
+    probe = pd.Series(values[:DATE_PROBE_VALUES], dtype=object).astype(str)
+    if probe.empty or not probe.str.contains(r"^\d{4}[-/]\d{1,2}", regex=True).all():
+        return None
+    parsed = pd.to_datetime(pd.Series(values, dtype=object).astype(str), errors='coerce', format='ISO8601')
+    if parsed.notna().mean() < 0.9:
+        return None
+    return parsed
+
+
+def _histogram(values, weights, kind, unit="ns"):
+    """unit 为日期列整数时间戳的单位（pandas 解析出的日期列不一定是纳秒精度）"""
+    counts, edges = np.histogram(values, bins=HISTOGRAM_BINS, weights=weights)
+    if kind == "date":
+        edges = [pd.Timestamp(int(edge), unit=unit).isoformat() for edge in edges]
+    else:
+        edges = [float(edge) for edge in edges]
+    return {"kind": kind, "edges": edges, "counts": [int(c) for c in counts]}
+
+
+def _column_profile(counts, rows, dtype):
+    """
+    由一列的取值频数（含缺失值）计算该列画像
+
+    Args:
+        counts: 取值 -> 出现次数（value_counts(dropna=False) 的结果）
+        rows: 总行数
+        dtype: 列类型
+
+    Returns:
+        dict: 画像
+    """
+    null_count = int(counts[counts.index.isna()].sum())
+    present = counts[~counts.index.isna()].sort_values(ascending=False, kind='stable')
+    profile = {
+        "dtype": str(dtype),
+        "non_null": rows - null_count,
+        "null_ratio": round(null_count / rows, 6) if rows else 0.0,
+        "distinct": int(len(present)),
+        "top_values": [{"value": _preview(_plain(value)), "count": int(count)}
+                       for value, count in present.head(STORED_TOP_N).items()],
+        "min": None,
+        "max": None
+    }
+    if present.empty:
+        return profile
+
+    index = present.index
+    if pd.api.types.is_numeric_dtype(index) and not pd.api.types.is_bool_dtype(index):
+        values = index.to_numpy(dtype=float)
+        profile["min"] = _plain(index.min())
+        profile["max"] = _plain(index.max())
+        profile["histogram"] = _histogram(values, present.to_numpy(), "numeric")
+        return profile
+
+    dates = _as_dates(list(index))
+    if dates is not None:
+        valid = dates.notna().to_numpy()
+        stamps = dates[valid]
+        profile["min"] = stamps.min().isoformat()
+        profile["max"] = stamps.max().isoformat()
+        profile["histogram"] = _histogram(stamps.astype("int64").to_numpy(), present.to_numpy()[valid], "date",
+                                          stamps.dt.unit)
+    return profile
+
+
+def _merge_dtype(a, b):
+    """各分块推断的列类型不一致时取能容纳两者的类型"""
+    if a == b:
+        return a
+    if pd.api.types.is_numeric_dtype(a) and pd.api.types.is_numeric_dtype(b):
+        return np.result_type(a, b)
+    return np.dtype(object)
+
+
+def _value_counts(file_path):
+    """计算每列的取值频数：小表整表计算，大表分块计算后相加（内存取决于不同取值的个数）"""
+    if not use_streaming(file_path):
+        df = load_table(file_path)
+        return len(df), {col: (df[col].value_counts(dropna=False), df[col].dtype) for col in df.columns}
+
+    rows = 0
+    merged = {}
+    for _, chunk in iter_chunks(file_path):
+        rows += len(chunk)
+        for col in chunk.columns:
+            counts = chunk[col].value_counts(dropna=False)
+            dtype = chunk[col].dtype
+            if col in merged:
+                previous, previous_dtype = merged[col]
+                counts = previous.add(counts, fill_value=0).astype(np.int64)
+                dtype = _merge_dtype(previous_dtype, dtype)
+            merged[col] = (counts, dtype)
+    return rows, merged
+
+
+def _build_profile(file_path, signature):
+    rows, column_counts = _value_counts(file_path)
+    return {
+        "format_version": PROFILE_FORMAT_VERSION,
+        "source_mtime_ns": signature[1],
+        "source_size": signature[2],
+        "rows": rows,
+        "columns": {str(col): _column_profile(counts, rows, dtype) for col, (counts, dtype) in column_counts.items()}
+    }
+
+
+def _profile_path(file_path):
+    return file_path + PROFILE_SUFFIX
+
+
+def _fresh(profile, signature):
+    return profile is not None and profile.get("format_version") == PROFILE_FORMAT_VERSION \
+        and profile.get("source_mtime_ns") == signature[1] and profile.get("source_size") == signature[2]
+
+
+def _load_persisted(file_path, signature):
+    try:
+        with open(_profile_path(file_path), 'r', encoding='utf-8') as f:
+            profile = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return profile if _fresh(profile, signature) else None
+
+
+def _persist(file_path, profile):
+    path = _profile_path(file_path)
+    try:
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(profile, f, ensure_ascii=False, default=str)
+        os.replace(tmp_path, path)
+    except OSError:
+        # 数据目录只读时只保留进程内的画像
+        pass
+
+
+def cached_profile(file_path):
+    """
+    获取已经计算过的表格画像（进程内或 <csv>.profile.json），不存在或已过期时返回 None，不触发计算
+
+    Args:
+        file_path: CSV文件路径
+
+    Returns:
+        dict | None: 表格画像
+    """
+    signature = file_signature(file_path)
+    with _lock:
+        profile = _profiles.get(signature[0])
+    if _fresh(profile, signature):
+        return profile
+    profile = _load_persisted(file_path, signature) if PERSIST_PROFILE else None
+    if profile is not None:
+        with _lock:
+            _profiles[signature[0]] = profile
+    return profile
+
+
+def get_profile(file_path):
+    """
+    获取表格画像，首次调用时计算并缓存（进程内和 <csv>.profile.json）
+
+    Args:
+        file_path: CSV文件路径
+
+    Returns:
+        dict: 表格画像（rows 及每列的 distinct、top_values、min/max、null_ratio、histogram）
+    """
+    profile = cached_profile(file_path)
+    if profile is not None:
+        return profile
+    signature = file_signature(file_path)
+    profile = _build_profile(file_path, signature)
+    if PERSIST_PROFILE:
+        _persist(file_path, profile)
+    with _lock:
+        _profiles[signature[0]] = profile
+    return profile
+
+
+def clear_profile_cache():
+    """清空进程内的画像缓存"""
+    with _lock:
+        _profiles.clear()
+
+
+def profile_csv_table(file_path, columns=None, top_n=10):
+    """
+    获取表格画像：每列的不同取值个数、高频值、最小/最大值、缺失比例，以及数值和日期列的直方图。
+    首次调用时计算一次并缓存，之后直接返回
+
+    Args:
+        file_path: CSV文件路径
+        columns: 只返回这些列的画像（可选，默认全部列）
+        top_n: 每列返回的高频值个数（默认10，上限20）
+
+    Returns:
+        dict: 包含表格画像的字典
+    """
+    try:
+        try:
+            top_n = max(0, min(int(top_n if top_n is not None else 10), STORED_TOP_N))
+        except (TypeError, ValueError):
+            return {
+                "status": "error",
+                "message": "top_n必须是整数"
+            }
+        if isinstance(columns, str):
+            columns = [columns]
+
+        profile = get_profile(file_path)
+        names = list(columns) if columns else list(profile["columns"])
+        for name in names:
+            if name not in profile["columns"]:
+                return {
+                    "status": "error",
+                    "message": f"列 '{name}' 不存在于文件中"
+                }
+
+        result = {}
+        for name in names:
+            column = dict(profile["columns"][name])
+            column["top_values"] = column["top_values"][:top_n]
+            result[name] = column
+        return {
+            "status": "success",
+            "rows": profile["rows"],
+            "columns": result
+        }
+
+    except FileNotFoundError:
+        return {
+            "status": "error",
+            "message": f"文件未找到: {file_path}"
+        }
+    except Exception as e:
+        return {
+            "status": "error",
+            "message": f"生成表格画像时发生错误: {str(e)}"
+        }
+
+
+# 工具信息
+tool_info = {
+    "name": "profile_csv_table",
+    "description": "获取表格各列的画像：不同取值个数、高频值及其出现次数、最小/最大值、缺失比例、数值和日期列的直方图。"
+                   "用于了解各列有哪些取值，代替反复试探性筛选；结果会缓存，重复调用很快",
+    "function": profile_csv_table,
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "file_path": {
+                "type": "string",
+                "description": "CSV文件路径"
+            },
+            "columns": {
+                "type": "array",
+                "description": "只返回这些列的画像（可选，默认全部列）",
+                "items": {"type": "string"}
+            },
+            "top_n": {
+                "type": "integer",
+                "description": "每列返回的高频值个数（默认10，上限20）"
+            }
+        },
+        "required": ["file_path"]
+    }
+}
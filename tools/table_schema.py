@@ -0,0 +1,168 @@
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from .table_cache import file_signature, peek_table
+from .table_sidecar import read_sidecar_schema
+
+SCHEMA_SUFFIX = ".schema.json"
+# 推断列类型使用的前缀样本行数
+SAMPLE_ROWS = int(os.getenv("TABLE_SCHEMA_SAMPLE_ROWS", "1000"))
+# 设置 TABLE_SCHEMA_PERSIST=0 可关闭schema落盘（只在进程内缓存）
+PERSIST_SCHEMA = os.getenv("TABLE_SCHEMA_PERSIST", "1") != "0"
+# 统计行数时每次读取的字节数
+COUNT_BLOCK_BYTES = 16 * 1024 * 1024
+
+# 非空白字节；只含空格、制表符、回车的行会被 pd.read_csv 跳过（skip_blank_lines）
+_CONTENT_BYTES = np.ones(256, dtype=bool)
+_CONTENT_BYTES[list(b" \t\r\n")] = False
+
+_lock = threading.Lock()
+_schemas = {}
+
+
+def _has_content(data):
+    return bool(_CONTENT_BYTES[data].any())
+
+
+def count_rows(file_path):
+    """
+    快速统计CSV数据行数：按块扫描换行符，跳过引号内的换行（字段中的 "" 转义不影响引号奇偶）；
+    与 pd.read_csv 的 skip_blank_lines 一致，只含空格、制表符或回车的空行不计入
+
+    Args:
+        file_path: CSV文件路径
+
+    Returns:
+        int: 数据行数（不含表头）
+    """
+    lines = 0
+    in_quotes = 0
+    # 当前尚未结束的行中是否已有非空白字符
+    pending = False
+    with open(file_path, 'rb') as f:
+        while True:
+            block = f.read(COUNT_BLOCK_BYTES)
+            if not block:
+                break
+            data = np.frombuffer(block, dtype=np.uint8)
+            newline = data == ord("\n")
+            if in_quotes or b'"' in block:
+                parity = (np.cumsum(data == ord('"')) + in_quotes) & 1
+                newline &= parity == 0
+                in_quotes = int(parity[-1])
+            ends = np.flatnonzero(newline)
+            if not len(ends):
+                pending = pending or _has_content(data)
+                continue
+            # 块首的行接上一块未结束的部分；其余行只有以空白字节开头时才可能是空行，逐个确认
+            blank = 0 if pending or _has_content(data[:ends[0]]) else 1
+            starts = ends[:-1] + 1
+            for i in np.flatnonzero(~_CONTENT_BYTES[data[starts]]):
+                if not _has_content(data[starts[i]:ends[i + 1]]):
+                    blank += 1
+            lines += len(ends) - blank
+            pending = _has_content(data[ends[-1] + 1:])
+    # 最后一行没有换行符时也算一行；再减去表头
+    if pending:
+        lines += 1
+    return max(lines - 1, 0)
+
+
+def _schema_path(file_path):
+    return file_path + SCHEMA_SUFFIX
+
+
+def _load_persisted(file_path, signature):
+    try:
+        with open(_schema_path(file_path), 'r', encoding='utf-8') as f:
+            schema = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if schema.get("source_mtime_ns") != signature[1] or schema.get("source_size") != signature[2]:
+        return None
+    return schema
+
+
+def _persist(file_path, schema):
+    path = _schema_path(file_path)
+    try:
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(schema, f, ensure_ascii=False, indent=2, default=str)
+        os.replace(tmp_path, path)
+    except OSError:
+        # 数据目录只读时只保留进程内的schema
+        pass
+
+
+def _records(df):
+    # 通过JSON往返，使样本中的 numpy 标量、缺失值与落盘后读回的结果一致
+    return json.loads(df.to_json(orient='records', force_ascii=False, date_format='iso'))
+
+
+def _probe(file_path, signature):
+    """读取表头和前缀样本推断schema，行数来自缓存的表格、侧车schema或换行计数"""
+    cached = peek_table(file_path)
+    if cached is not None:
+        rows, dtypes, source = len(cached), cached.dtypes, "table"
+        sample = cached.head(3)
+    else:
+        sample_df = pd.read_csv(file_path, nrows=SAMPLE_ROWS)
+        sample = sample_df.head(3)
+        sidecar = read_sidecar_schema(file_path)
+        if sidecar is not None:
+            rows, dtypes, source = sidecar["rows"], sidecar["dtypes"], "sidecar"
+        else:
+            # 样本未读满说明整个文件都在样本里，行数和类型都是精确的
+            exact = len(sample_df) < SAMPLE_ROWS
+            rows = len(sample_df) if exact else count_rows(file_path)
+            dtypes, source = sample_df.dtypes, "full" if exact else "sample"
+    return {
+        "source_mtime_ns": signature[1],
+        "source_size": signature[2],
+        "rows": int(rows),
+        "column_names": [str(col) for col in sample.columns],
+        "data_types": {str(col): str(dtypes[col]) for col in sample.columns},
+        "dtype_source": source,
+        "sample_data": _records(sample)
+    }
+
+
+def get_schema(file_path):
+    """
+    获取表格schema（行数、列名、列类型、前3行样本），不解析整个文件
+
+    依次使用：进程内缓存、文件旁有效的 <csv>.schema.json、已加载的表格、侧车schema、
+    表头加前缀样本的快速探测；探测结果写回 <csv>.schema.json
+
+    Args:
+        file_path: CSV文件路径
+
+    Returns:
+        dict: schema信息（dtype_source 说明列类型来自整表还是前缀样本）
+    """
+    signature = file_signature(file_path)
+    with _lock:
+        schema = _schemas.get(signature[0])
+        if schema is not None and schema["source_mtime_ns"] == signature[1] \
+                and schema["source_size"] == signature[2]:
+            return schema
+
+    schema = _load_persisted(file_path, signature) if PERSIST_SCHEMA else None
+    if schema is None:
+        schema = _probe(file_path, signature)
+        if PERSIST_SCHEMA:
+            _persist(file_path, schema)
+    with _lock:
+        _schemas[signature[0]] = schema
+    return schema
+
+
+def clear_schema_cache():
+    """清空进程内的schema缓存"""
+    with _lock:
+        _schemas.clear()
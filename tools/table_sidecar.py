@@ -0,0 +1,239 @@
+import argparse
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow.feather as feather
+except ImportError:  # pyarrow 为可选依赖，缺失时退回 NumPy 列文件
+    feather = None
+
+SCHEMA_SUFFIX = ".sidecar.json"
+FEATHER_SUFFIX = ".feather"
+NUMPY_SUFFIX = ".npycols"
+# numpy 侧车中按原类型保存（可内存映射）的列类型，其余列按文本保存
+_MMAP_DTYPES = ("int64", "float64", "bool", "int32", "float32")
+
+
+def _source_stat(file_path):
+    st = os.stat(file_path)
+    return st.st_mtime_ns, st.st_size
+
+
+def sidecar_paths(file_path):
+    """
+    获取源表格对应的侧车文件路径
+
+    Args:
+        file_path: 源CSV文件路径
+
+    Returns:
+        dict: schema / feather / numpy 三种路径
+    """
+    return {
+        "schema": file_path + SCHEMA_SUFFIX,
+        "feather": file_path + FEATHER_SUFFIX,
+        "numpy": file_path + NUMPY_SUFFIX
+    }
+
+
+def read_sidecar_schema(file_path):
+    """
+    读取侧车schema，文件缺失或源表格已变更时返回 None
+
+    Args:
+        file_path: 源CSV文件路径
+
+    Returns:
+        dict | None: schema信息
+    """
+    schema_path = sidecar_paths(file_path)["schema"]
+    try:
+        with open(schema_path, 'r', encoding='utf-8') as f:
+            schema = json.load(f)
+        mtime_ns, size = _source_stat(file_path)
+    except (OSError, ValueError):
+        return None
+    if schema.get("source_mtime_ns") != mtime_ns or schema.get("source_size") != size:
+        return None
+    return schema
+
+
+def pack_strings(values):
+    """字符串列表编码为 UTF-8 字节数组和各串的偏移，用于不经 pickle 落盘；含非字符串取值时返回 None"""
+    if not all(isinstance(value, str) for value in values):
+        return None
+    encoded = [value.encode("utf-8", "surrogatepass") for value in values]
+    lengths = np.fromiter((len(item) for item in encoded), dtype=np.int64, count=len(encoded))
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), np.concatenate(([0], np.cumsum(lengths)))
+
+
+def unpack_strings(blob, offsets):
+    """pack_strings 的逆过程"""
+    data = blob.tobytes()
+    bounds = offsets.tolist()
+    return [data[bounds[i]:bounds[i + 1]].decode("utf-8", "surrogatepass") for i in range(len(bounds) - 1)]
+
+
+def _write_numpy(df, target_dir):
+    """
+    每列保存为 .npy 文件：数值列可被内存映射；文本列保存为 UTF-8 字节、偏移和缺失标记三个数组，
+    全部不经 pickle，加载时不会执行文件中的代码
+    """
+    os.makedirs(target_dir)
+    for i, col in enumerate(df.columns):
+        if str(df[col].dtype) in _MMAP_DTYPES:
+            np.save(os.path.join(target_dir, f"c{i}.npy"), df[col].to_numpy(), allow_pickle=False)
+            continue
+        values = df[col].to_numpy(dtype=object)
+        missing = pd.isna(values)
+        packed = pack_strings(["" if absent else value for value, absent in zip(values, missing)])
+        if packed is None:
+            raise ValueError(f"列 '{col}' 含非文本取值，numpy 侧车无法保存，请使用 feather 格式")
+        np.save(os.path.join(target_dir, f"c{i}.npy"), packed[0], allow_pickle=False)
+        np.save(os.path.join(target_dir, f"c{i}.offsets.npy"), packed[1], allow_pickle=False)
+        np.save(os.path.join(target_dir, f"c{i}.missing.npy"), missing, allow_pickle=False)
+
+
+def _read_numpy(target_dir, schema):
+    data = {}
+    for i, col in enumerate(schema["columns"]):
+        dtype = schema["dtypes"][col]
+        path = os.path.join(target_dir, f"c{i}")
+        if dtype in _MMAP_DTYPES:
+            data[col] = np.load(path + ".npy", mmap_mode='r', allow_pickle=False)
+            continue
+        values = np.asarray(unpack_strings(np.load(path + ".npy", allow_pickle=False),
+                                           np.load(path + ".offsets.npy", allow_pickle=False)), dtype=object)
+        values[np.load(path + ".missing.npy", allow_pickle=False)] = np.nan
+        data[col] = values
+    df = pd.DataFrame(data, columns=schema["columns"], copy=False)
+    for col, dtype in schema["dtypes"].items():
+        if str(df[col].dtype) != dtype:
+            df[col] = df[col].astype(dtype)
+    return df
+
+
+def convert_to_sidecar(file_path, fmt=None, df=None):
+    """
+    将源CSV转换为列式侧车文件，并写入带类型的schema
+
+    Args:
+        file_path: 源CSV文件路径
+        fmt: 侧车格式（feather, numpy），默认有 pyarrow 时用 feather
+        df: 已解析的表格（可选，避免重复解析）
+
+    Returns:
+        dict: 包含转换结果的字典
+    """
+    try:
+        if fmt is None:
+            fmt = "feather" if feather is not None else "numpy"
+        if fmt not in ("feather", "numpy"):
+            return {
+                "status": "error",
+                "message": f"不支持的侧车格式: {fmt}"
+            }
+        if fmt == "feather" and feather is None:
+            return {
+                "status": "error",
+                "message": "feather 格式需要安装 pyarrow"
+            }
+
+        mtime_ns, size = _source_stat(file_path)
+        if df is None:
+            df = pd.read_csv(file_path)
+        paths = sidecar_paths(file_path)
+
+        # 先删除schema使旧侧车失效，数据写完后再写schema作为提交标记
+        if os.path.exists(paths["schema"]):
+            os.remove(paths["schema"])
+        if os.path.isdir(paths["numpy"]):
+            shutil.rmtree(paths["numpy"])
+        if os.path.exists(paths["feather"]):
+            os.remove(paths["feather"])
+
+        if fmt == "feather":
+            tmp_path = paths["feather"] + ".tmp"
+            feather.write_feather(df, tmp_path, compression="uncompressed")
+            os.replace(tmp_path, paths["feather"])
+        else:
+            _write_numpy(df, paths["numpy"])
+
+        schema = {
+            "format": fmt,
+            "source_mtime_ns": mtime_ns,
+            "source_size": size,
+            "rows": int(len(df)),
+            "columns": [str(col) for col in df.columns],
+            "dtypes": {str(col): str(dtype) for col, dtype in df.dtypes.items()}
+        }
+        tmp_schema = paths["schema"] + ".tmp"
+        with open(tmp_schema, 'w', encoding='utf-8') as f:
+            json.dump(schema, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_schema, paths["schema"])
+
+        return {
+            "status": "success",
+            "message": f"已生成 {fmt} 侧车文件",
+            "format": fmt,
+            "rows": schema["rows"],
+            "schema_path": paths["schema"]
+        }
+
+    except FileNotFoundError:
+        return {
+            "status": "error",
+            "message": f"文件未找到: {file_path}"
+        }
+    except Exception as e:
+        return {
+            "status": "error",
+            "message": f"生成侧车文件时发生错误: {str(e)}"
+        }
+
+
+def load_sidecar(file_path):
+    """
+    从有效的侧车文件加载表格，侧车缺失、过期或损坏时返回 None 由调用方回退到CSV
+
+    Args:
+        file_path: 源CSV文件路径
+
+    Returns:
+        DataFrame | None: 加载的表格
+    """
+    schema = read_sidecar_schema(file_path)
+    if schema is None:
+        return None
+    paths = sidecar_paths(file_path)
+    try:
+        if schema.get("format") == "feather":
+            if feather is None:
+                return None
+            # 未压缩的 feather 可直接内存映射
+            return feather.read_feather(paths["feather"], memory_map=True)
+        if schema.get("format") == "numpy":
+            return _read_numpy(paths["numpy"], schema)
+    except (OSError, ValueError, KeyError):
+        return None
+    return None
+
+
+def main():
+    """命令行入口：python -m tools.table_sidecar <csv文件>..."""
+    parser = argparse.ArgumentParser(description='将CSV转换为列式侧车文件')
+    parser.add_argument('csv_files', nargs='+', help='要转换的CSV文件路径')
+    parser.add_argument('--format', choices=['feather', 'numpy'], help='侧车格式（默认有pyarrow时用feather）')
+    args = parser.parse_args()
+
+    for csv_file in args.csv_files:
+        result = convert_to_sidecar(csv_file, args.format)
+        print(f"{csv_file}: {result.get('message')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import json
+import os
+import threading
+
+
+def _percentile(values, q):
+    """线性插值分位数，values 为空时返回 None"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    pos = (len(ordered) - 1) * q
+    lower = int(pos)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (pos - lower)
+
+
+def _stats(values):
+    return {
+        "count": len(values),
+        "total": round(sum(values), 4),
+        "avg": round(sum(values) / len(values), 4) if values else None,
+        "p50": round(_percentile(values, 0.5), 4) if values else None,
+        "p95": round(_percentile(values, 0.95), 4) if values else None,
+        "max": round(max(values), 4) if values else None
+    }
+
+
+def result_row_counts(result):
+    """
+    从工具结果中提取扫描行数和返回行数
+
+    Args:
+        result: 工具结果字典
+
+    Returns:
+        tuple: (扫描行数, 返回行数)，无法判断时为 None
+    """
+    if not isinstance(result, dict):
+        return None, None
+    scanned = result.get("original_rows", result.get("rows"))
+    returned = None
+    for key in ("filtered_data", "sample_data", "groups"):
+        if isinstance(result.get(key), list):
+            returned = len(result[key])
+            break
+    return scanned, returned
+
+
+class TraceLogger:
+    """结构化轨迹日志（JSONL），每轮一行，附带 session_id"""
+
+    def __init__(self, path, session_id=None):
+        self.path = path
+        self.session_id = session_id
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def log_round(self, trace_entry):
+        record = {"session_id": self.session_id, **trace_entry}
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + "\n")
+
+
+def summarize_trace(work_trace):
+    """
+    汇总一个或多个会话的轨迹：LLM耗时、解析耗时、各工具耗时、行数、负载字节和token用量
+
+    Args:
+        work_trace: 轨迹条目列表（多个会话可直接拼接）
+
+    Returns:
+        dict: 汇总报告
+    """
+    llm_seconds = []
+    parse_seconds = []
+    serialize_seconds = []
+    tools = {}
+    usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    payload_bytes = 0
+    rows_scanned = 0
+    rows_returned = 0
+
+    for entry in work_trace:
+        timing = entry.get("timing") or {}
+        if timing.get("llm_seconds") is not None:
+            llm_seconds.append(timing["llm_seconds"])
+        if timing.get("parse_seconds") is not None:
+            parse_seconds.append(timing["parse_seconds"])
+        for key in usage:
+            usage[key] += (entry.get("usage") or {}).get(key) or 0
+        for call in entry.get("calls", []):
+            metrics = call.get("metrics") or {}
+            tools.setdefault(call.get("function"), []).append(metrics.get("tool_seconds") or 0.0)
+            if metrics.get("serialize_seconds") is not None:
+                serialize_seconds.append(metrics["serialize_seconds"])
+            payload_bytes += metrics.get("payload_bytes") or 0
+            rows_scanned += metrics.get("rows_scanned") or 0
+            rows_returned += metrics.get("rows_returned") or 0
+
+    tool_seconds = [t for times in tools.values() for t in times]
+    return {
+        "rounds": len(work_trace),
+        "tool_calls": len(tool_seconds),
+        "llm_seconds": _stats(llm_seconds),
+        "parse_seconds": _stats(parse_seconds),
+        "tool_seconds": _stats(tool_seconds),
+        "serialize_seconds": _stats(serialize_seconds),
+        "tools": {name: _stats(times) for name, times in tools.items()},
+        "payload_bytes": payload_bytes,
+        "rows_scanned": rows_scanned,
+        "rows_returned": rows_returned,
+        "usage": usage
+    }
+
+
+def format_summary(summary):
+    """将汇总报告格式化为便于阅读的多行文本"""
+    lines = [
+        f"轮次: {summary['rounds']}，工具调用: {summary['tool_calls']}",
+        f"LLM耗时: 合计 {summary['llm_seconds']['total']}s，p50 {summary['llm_seconds']['p50']}s，"
+        f"p95 {summary['llm_seconds']['p95']}s",
+        f"解析耗时: 合计 {summary['parse_seconds']['total']}s",
+        f"工具耗时: 合计 {summary['tool_seconds']['total']}s，序列化 {summary['serialize_seconds']['total']}s"
+    ]
+    for name, stats in summary["tools"].items():
+        lines.append(f"  {name}: {stats['count']} 次，合计 {stats['total']}s，p95 {stats['p95']}s")
+    lines.append(f"扫描行数: {summary['rows_scanned']}，返回行数: {summary['rows_returned']}，"
+                 f"工具结果负载: {summary['payload_bytes']} 字节")
+    usage = summary["usage"]
+    lines.append(f"token用量: 输入 {usage['prompt_tokens']}，输出 {usage['completion_tokens']}，"
+                 f"合计 {usage['total_tokens']}")
+    return "\n".join(lines)